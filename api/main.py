@@ -2,11 +2,15 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 import sys
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 # --- Ensure project root is on sys.path (same trick as scripts/ask.py) ---
@@ -14,10 +18,63 @@ ROOT = Path(__file__).resolve().parents[1]  # .../Immi
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from rag_llamaindex.query import query  # your existing RAG+Gemini pipeline
+from rag_llamaindex.query import aquery, astream_query  # async RAG+Gemini pipeline (CPU stages off the event loop)
+from rag_llamaindex.engine import get_engine
+from rag_llamaindex.models import is_ready, loaded, warmup
+from rag_llamaindex.serving import Saturated, stats as stage_stats
+from rag_llamaindex.cache import stats as cache_stats
+from rag_llamaindex.answer_cache import current_answer_cache, flush_answer_cache
+from rag_llamaindex.metrics import REQUEST_SECONDS, REQUESTS, collect_timings, render as render_metrics
+from rag_llamaindex.profiling import PROFILE_ENABLED, PROFILE_HEADER, profile, safe_request_id
+from rag_llamaindex.traffic import close_traffic_log, get_traffic_log, recording
 
 
-app = FastAPI(title="AskImmigration RAG Demo")
+def _warmup_all():
+    # BM25 + FAISS artifacts, then embedder / reranker / NLI / LLM client
+    get_engine().warmup()
+    warmup()
+
+
+async def _warmup(app: FastAPI):
+    try:
+        await asyncio.to_thread(_warmup_all)
+        print("[API] Models warm, ready to serve")
+    except Exception as e:
+        app.state.warmup_error = str(e)
+        print(f"[API][WARN] Warmup failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the process answers health checks at once;
+    # /ready reports 503 until every model is loaded.
+    app.state.warmup_error = None
+    app.state.warmup_task = asyncio.create_task(_warmup(app))
+    yield
+    app.state.warmup_task.cancel()
+    flush_answer_cache()
+    close_traffic_log()
+
+
+app = FastAPI(title="AskImmigration RAG Demo", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    # Request counter + latency histogram per route (for streams: time to response start)
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw URL: unmatched paths share one series
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        if path != "/metrics":
+            REQUESTS.inc(path=path, status=str(status))
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, path=path)
 
 
 class Question(BaseModel):
@@ -212,6 +269,30 @@ async def index():
     const spinner = document.getElementById("spinner");
     const btnText = document.getElementById("btnText");
 
+    // Minimal Server-Sent Events reader over fetch (EventSource cannot POST)
+    async function readEvents(resp, onEvent) {
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buf.indexOf("\\n\\n")) >= 0) {
+          const block = buf.slice(0, sep);
+          buf = buf.slice(sep + 2);
+          let event = "message";
+          let data = "";
+          for (const line of block.split("\\n")) {
+            if (line.startsWith("event:")) event = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          onEvent(event, data ? JSON.parse(data) : {});
+        }
+      }
+    }
+
     async function askQuestion() {
       const q = questionEl.value.trim();
       if (!q) return;
@@ -224,32 +305,49 @@ async def index():
       btnText.textContent = "Thinking...";
 
       try {
-        const resp = await fetch("/ask", {
+        const resp = await fetch("/ask/stream", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({ question: q })
         });
 
         if (!resp.ok) {
-          throw new Error("Server error: " + resp.status);
+          throw new Error(resp.status === 503 ? "Server busy, please retry in a moment" : "Server error: " + resp.status);
         }
 
-        const data = await resp.json();
-
-        answerText.textContent = data.answer || "(No answer returned)";
-        const score = data.verification_score !== null ? data.verification_score.toFixed(3) : "N/A";
-        scoreBadge.textContent = "NLI verification score: " + score;
+        answerText.textContent = "";
+        scoreBadge.textContent = "NLI verification score: (pending)";
+        sourcesDiv.textContent = "";
+        let excerpts = "";
 
-        if (Array.isArray(data.sources) && data.sources.length > 0) {
-          const links = data.sources.map(s => {
-            return `[${s.id}] <a href="${s.url}" target="_blank" rel="noopener noreferrer">${s.url}</a>`;
-          });
-          sourcesDiv.innerHTML = "Sources:<br>" + links.join("<br>");
-        } else {
-          sourcesDiv.textContent = "Sources: (none)";
-        }
-
-        answerCard.style.display = "block";
+        await readEvents(resp, (event, data) => {
+          if (event === "sources") {
+            // Sources arrive before generation starts
+            if (Array.isArray(data.sources) && data.sources.length > 0) {
+              const links = data.sources.map(s => {
+                return `[${s.id}] <a href="${s.url}" target="_blank" rel="noopener noreferrer">${s.url}</a>`;
+              });
+              sourcesDiv.innerHTML = "Sources:<br>" + links.join("<br>");
+            } else {
+              sourcesDiv.textContent = "Sources: (none)";
+            }
+            excerpts = data.excerpts || "";
+            answerCard.style.display = "block";
+            btnText.textContent = "Answering...";
+          } else if (event === "token") {
+            answerText.textContent += data.text;
+          } else if (event === "verification") {
+            const score = data.verification_score !== null ? data.verification_score.toFixed(3) : "N/A";
+            scoreBadge.textContent = "NLI verification score: " + score;
+          } else if (event === "done") {
+            if (!answerText.textContent) answerText.textContent = "(No answer returned)";
+            if (excerpts) {
+              answerText.textContent += "\\n\\nHere are the most relevant excerpts from official sources:\\n\\n" + excerpts;
+            }
+          } else if (event === "error") {
+            throw new Error(data.error);
+          }
+        });
       } catch (err) {
         console.error(err);
         errorDiv.textContent = "Error: " + err.message;
@@ -275,24 +373,145 @@ async def index():
     """
 
 
+# ---------- Readiness ----------
+@app.get("/ready")
+async def ready():
+    caches = cache_stats()
+    answers = current_answer_cache()
+    if answers is not None:
+        caches["answers"] = answers.stats()
+    body = {"ready": is_ready(), "models": loaded(), "error": app.state.warmup_error, "stages": stage_stats(), "caches": caches}
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+
+# ---------- Prometheus metrics ----------
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# ---------- Traffic capture (ASKIMMI_CAPTURE=1, see rag_llamaindex/traffic.py) ----------
+def _capture(request_id, endpoint, question, status, started, t0, timings, trace, error=None):
+    log = get_traffic_log()
+    if log is None:
+        return
+    record = {
+        "ts": round(started, 3),
+        "request_id": request_id,
+        "endpoint": endpoint,
+        "question": question,
+        "status": status,
+        "latency_ms": round((time.perf_counter() - t0) * 1000, 2),
+        "timings_ms": {k: round(v, 2) for k, v in timings.items()},
+        "chunk_ids": trace.get("chunk_ids", []),
+        "cache": {"candidates": trace.get("candidate_cache"), "answer": trace.get("answer_cache")},
+    }
+    if error:
+        record["error"] = error
+    log.write(record)
+
+
 # ---------- JSON API at /ask ----------
 @app.post("/ask")
-async def ask(payload: Question):
+async def ask(payload: Question, request: Request, debug: bool = False):
+    # ?debug=true or "X-Debug-Timings: 1" adds a per-stage timing breakdown (ms)
+    debug = debug or request.headers.get("x-debug-timings", "") in ("1", "true")
+    # ASKIMMI_PROFILE=1, or "X-Profile: 1" when ASKIMMI_PROFILE_HEADER=1, writes
+    # <request id>.collapsed (see rag_llamaindex/profiling.py)
+    profiled = PROFILE_ENABLED or (PROFILE_HEADER and request.headers.get("x-profile", "") in ("1", "true"))
+    request_id = safe_request_id(request.headers.get("x-request-id"))
+    started, t0 = time.time(), time.perf_counter()
+    timings, trace = {}, {}
+    status, error = 500, None
     try:
-        answer, score, legend = query(payload.question)
+        with collect_timings(timings), recording(trace), profile(request_id, enabled=profiled) as prof:
+            answer, score, legend = await aquery(payload.question)
         sources = [
             {"id": int(idx), "url": url}
             for (idx, url) in legend
         ]
-        return {
+        body = {
             "question": payload.question,
             "answer": answer,
             "verification_score": score,
             "sources": sources,
         }
+        if debug:
+            body["timings_ms"] = {k: round(v, 2) for k, v in timings.items()}
+        if prof.path is not None:
+            body["profile"] = {"request_id": request_id, "path": str(prof.path)}
+        status = 200
+        return body
+    except Saturated as e:
+        # Stage queues are full: shed load instead of queueing without bound
+        status, error = 503, str(e)
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except Exception as e:
         # You can log this properly; for now, return a 500
+        error = str(e)
         return JSONResponse(
             status_code=500,
             content={"error": str(e)},
         )
+    finally:
+        _capture(request_id, "/ask", payload.question, status, started, t0, timings, trace, error)
+
+
+# ---------- Server-Sent Events at /ask/stream ----------
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(payload: Question, request: Request):
+    """
+    Same pipeline as /ask, streamed: a `sources` event as soon as reranking is
+    done, `token` events as Gemini generates, then `verification`, then `done`.
+    Failures after the stream has started arrive as an `error` event.
+    """
+    request_id = safe_request_id(request.headers.get("x-request-id"))
+    started, t0 = time.time(), time.perf_counter()
+    timings, trace = {}, {}
+    events = astream_query(payload.question)
+    try:
+        # Run retrieval + reranking before committing to a 200, so overload is still a 503
+        with collect_timings(timings), recording(trace):
+            first = await events.__anext__()
+    except Saturated as e:
+        _capture(request_id, "/ask/stream", payload.question, 503, started, t0, timings, trace, str(e))
+        return JSONResponse(
+            status_code=503,
+            content={"error": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except Exception as e:
+        _capture(request_id, "/ask/stream", payload.question, 500, started, t0, timings, trace, str(e))
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    async def body():
+        # The HTTP status is already 200; capture what actually happened to the stream:
+        # 200 done, 500 failed mid-stream (error event), 499 client went away
+        status, error = 499, "client disconnected"
+        try:
+            yield _sse(*first)
+            with collect_timings(timings), recording(trace):
+                async for event, data in events:
+                    yield _sse(event, data)
+            status, error = 200, None
+            yield _sse("done", {})
+        except Exception as e:
+            status, error = 500, str(e)
+            yield _sse("error", {"error": str(e)})
+        finally:
+            await events.aclose()
+            _capture(request_id, "/ask/stream", payload.question, status, started, t0, timings, trace, error)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
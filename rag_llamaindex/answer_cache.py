@@ -0,0 +1,255 @@
+"""
+Semantic answer cache: skip Gemini + NLI for near-duplicate questions.
+
+Past questions are embedded (same model as dense retrieval) into a small
+FAISS inner-product index. A new question is served from the cache when
+
+  - a past question's cosine similarity is >= ASKIMMI_ANSWER_CACHE_THRESHOLD, and
+  - retrieval returned the same top chunks (same node ids, same order),
+
+so a cached answer is only reused over exactly the evidence it was
+generated and verified from.
+
+Entries live in artifacts/answer_cache/ (index.faiss + entries.json) and
+carry the version they were built against: artifact fingerprint, embedding
+model and the answer pipeline (LLM backend + model, prompt, NLI settings).
+A cache written for any other version is discarded on load. Answers from a
+backend that is not `persistent` (the stub) are only kept in memory, and
+fallback answers are never stored. Least recently used entries are evicted
+beyond ASKIMMI_ANSWER_CACHE_SIZE; saves run on a background thread.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from rag_llamaindex.engine import ARTIFACTS_DIR, get_engine
+from rag_llamaindex.metrics import CallbackGauge
+
+ANSWER_CACHE_DIR = Path(os.getenv("ASKIMMI_ANSWER_CACHE_DIR", str(ARTIFACTS_DIR / "answer_cache")))
+ANSWER_CACHE_ENABLED = os.getenv("ASKIMMI_ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ASKIMMI_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_SIZE = int(os.getenv("ASKIMMI_ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_SAVE_EVERY = int(os.getenv("ASKIMMI_ANSWER_CACHE_SAVE_EVERY", "20"))  # inserts between saves
+NEIGHBOURS = 4
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str  # generated answer, without the appended excerpts
+    verification: float
+    legend: List[Tuple[int, str]]
+    node_ids: List[str]
+    created: float = field(default_factory=time.time)
+    last_hit: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        version: str,
+        path: Path = ANSWER_CACHE_DIR,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        maxsize: int = ANSWER_CACHE_SIZE,
+        save_every: int = ANSWER_CACHE_SAVE_EVERY,
+        persist: bool = True,
+    ):
+        """
+        - version: artifacts + embed model + answer pipeline; entries from any other version are dropped.
+        - threshold: minimum cosine similarity between questions.
+        - persist: False keeps entries in memory only (never read from / written to `path`).
+        """
+        self.version = version
+        self.path = Path(path)
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.save_every = save_every
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[int, CachedAnswer] = {}
+        self._index: Optional[faiss.IndexIDMap] = None
+        self._next_id = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saving = False
+        if persist:
+            self._load()
+
+    # ---------- lookup / insert ----------
+    @staticmethod
+    def _unit(vec: np.ndarray) -> np.ndarray:
+        vec = np.asarray(vec, dtype="float32").reshape(1, -1)
+        return vec / max(float(np.linalg.norm(vec)), 1e-12)
+
+    def lookup(self, qvec: np.ndarray, node_ids: List[str]) -> Optional[CachedAnswer]:
+        """Most similar past question above the threshold whose top chunks match `node_ids`."""
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            sims, ids = self._index.search(self._unit(qvec), min(NEIGHBOURS, self._index.ntotal))
+            for sim, i in zip(sims[0], ids[0]):
+                if i < 0 or sim < self.threshold:
+                    break
+                entry = self._entries.get(int(i))
+                if entry is not None and entry.node_ids == list(node_ids):
+                    entry.hits += 1
+                    entry.last_hit = time.time()
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, qvec: np.ndarray, entry: CachedAnswer) -> None:
+        vec = self._unit(qvec)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vec.shape[1]))
+            if vec.shape[1] != self._index.d:
+                return
+            eid = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vec, np.asarray([eid], dtype="int64"))
+            self._entries[eid] = entry
+            self._evict()
+            self._unsaved += 1
+            should_save = self.persist and self._unsaved >= self.save_every and not self._saving
+            if should_save:
+                self._saving = True
+        if should_save:
+            # Off the request path: the caller only pays for the insert
+            threading.Thread(target=self._save_in_background, name="answer-cache-save", daemon=True).start()
+
+    def _save_in_background(self) -> None:
+        try:
+            self.save()
+        except Exception as e:
+            print(f"[AnswerCache][WARN] Could not save {self.path} ({e})")
+        finally:
+            self._saving = False
+
+    def _evict(self) -> None:
+        overflow = len(self._entries) - self.maxsize
+        if overflow <= 0:
+            return
+        stale = sorted(self._entries, key=lambda i: self._entries[i].last_hit)[:overflow]
+        self._index.remove_ids(np.asarray(stale, dtype="int64"))
+        for i in stale:
+            del self._entries[i]
+
+    # ---------- persistence ----------
+    def save(self) -> None:
+        """Write index.faiss + entries.json atomically (temp file, then rename)."""
+        if not self.persist:
+            return
+        with self._save_lock:
+            # Snapshot under the lock, write outside it so lookups are not held up by disk I/O
+            with self._lock:
+                if self._index is None:
+                    return
+                index_bytes = faiss.serialize_index(self._index)
+                meta = {
+                    "version": self.version,
+                    "next_id": self._next_id,
+                    "entries": {str(i): asdict(e) for i, e in self._entries.items()},
+                }
+                self._unsaved = 0
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp_idx, tmp_meta = self.path / "index.faiss.tmp", self.path / "entries.json.tmp"
+            tmp_idx.write_bytes(index_bytes.tobytes())
+            tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_idx, self.path / "index.faiss")
+            os.replace(tmp_meta, self.path / "entries.json")
+
+    def _load(self) -> None:
+        idx_path, meta_path = self.path / "index.faiss", self.path / "entries.json"
+        if not (idx_path.exists() and meta_path.exists()):
+            return
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get("version") != self.version:
+                print(f"[AnswerCache] {self.path} was built for another index version; starting empty.")
+                return
+            self._index = faiss.read_index(str(idx_path))
+            self._entries = {
+                int(i): CachedAnswer(**{**e, "legend": [tuple(x) for x in e["legend"]]})
+                for i, e in meta["entries"].items()
+            }
+            self._next_id = int(meta.get("next_id", len(self._entries)))
+            print(f"[AnswerCache] Loaded {len(self._entries)} cached answers from {self.path}")
+        except (OSError, ValueError, KeyError, TypeError, RuntimeError) as e:
+            print(f"[AnswerCache][WARN] Could not read {self.path} ({e}); starting empty.")
+            self._index, self._entries, self._next_id = None, {}, 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache(pipeline: str, persist: bool = True) -> Optional[AnswerCache]:
+    """
+    Process-wide AnswerCache for the loaded artifacts (None when ASKIMMI_ANSWER_CACHE=0).
+    pipeline: what answers depend on besides retrieval (see query.answer_cache).
+    A call with another pipeline (LLM backend switched, NLI toggled) or `persist`
+    replaces the cache, so answers are never served across versions.
+    """
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    from rag_llamaindex.models import embed_key
+
+    version = f"{get_engine().fingerprint}:{embed_key()}:{pipeline}"
+    cache = _cache
+    if cache is None or cache.version != version or cache.persist != persist:
+        with _cache_lock:
+            if _cache is None or _cache.version != version or _cache.persist != persist:
+                if _cache is not None:
+                    print(f"[AnswerCache] Answer pipeline changed ({pipeline}); switching caches.")
+                _cache = AnswerCache(version=version, persist=persist)
+            cache = _cache
+    return cache
+
+
+def current_answer_cache() -> Optional[AnswerCache]:
+    """The cache if a request has already created it (for stats), else None."""
+    return _cache
+
+
+CallbackGauge(
+    "askimmi_answer_cache_lookups_total",
+    "Semantic answer cache lookups by result.",
+    lambda: {("hit",): _cache.hits, ("miss",): _cache.misses} if _cache is not None else {},
+    ["result"],
+    kind="counter",
+)
+
+
+def flush_answer_cache() -> None:
+    """Persist unsaved entries (call on shutdown)."""
+    if _cache is not None:
+        _cache.save()
@@ -0,0 +1,113 @@
+"""
+Cross-request micro-batching for model calls.
+
+Each request submits its items (e.g. 20 (question, chunk) pairs) and blocks
+on a Future. A single worker thread collects items from every in-flight
+request for up to `max_wait_ms`, or until `max_batch` items are queued,
+sorts the batch by length so padded sub-batches stay tight, runs the model
+once, and hands each caller back its own slice of the outputs.
+
+A lone request pays at most `max_wait_ms` of extra latency; under load the
+model sees a few large forward passes instead of many small ones.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from rag_llamaindex.metrics import BATCH_SIZE
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        length: Optional[Callable[[Any], int]] = None,
+        name: str = "batcher",
+    ):
+        """
+        - fn: runs the model on a list of items, returns one output per item, in order.
+        - max_batch: flush once this many items are queued (a single larger
+          request is still run whole).
+        - max_wait_ms: how long the first queued request waits for company.
+        - length: size proxy used to length-sort the batch (None keeps arrival order).
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.length = length
+        self.name = name
+        self._queue: "queue.Queue[Optional[Tuple[List[Any], Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Sequence[Any]) -> Future:
+        """Queue `items`; the Future resolves to their outputs, in order."""
+        fut: Future = Future()
+        if not items:
+            fut.set_result([])
+        else:
+            self._queue.put((list(items), fut))
+        return fut
+
+    def __call__(self, items: Sequence[Any]) -> List[Any]:
+        return self.submit(items).result()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    # ---------- worker ----------
+    def _collect(self, first: Tuple[List[Any], Future]) -> Tuple[List[Tuple[List[Any], Future]], bool]:
+        """Gather requests behind `first` until the batch is full or the wait runs out."""
+        requests = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                nxt = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if nxt is None:
+                return requests, True
+            requests.append(nxt)
+            size += len(nxt[0])
+        return requests, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                return
+            requests, stop = self._collect(first)
+
+            items = [it for its, _ in requests for it in its]
+            order = list(range(len(items)))
+            BATCH_SIZE.observe(len(items), batcher=self.name)
+            try:
+                if self.length is not None:
+                    order.sort(key=lambda i: self.length(items[i]))
+                outputs = self.fn([items[i] for i in order])
+                if len(outputs) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(outputs)} outputs for {len(items)} items")
+            except BaseException as e:  # hand the failure to every waiting caller
+                for _, fut in requests:
+                    fut.set_exception(e)
+                continue
+
+            results: List[Any] = [None] * len(items)
+            for pos, i in enumerate(order):
+                results[i] = outputs[pos]
+            start = 0
+            for its, fut in requests:
+                fut.set_result(results[start:start + len(its)])
+                start += len(its)
@@ -0,0 +1,383 @@
+"""
+Offline BM25 inverted index, stored as one flat binary file and opened with mmap.
+
+Layout of artifacts/bm25_index.bin (little-endian, every array 8-byte aligned):
+
+    header      magic, version, n_docs, n_terms, nnz, vocab_bytes, avgdl, k1, b,
+                text_hash (sha1 of the indexed texts, engine.corpus_hash)
+    doc_len     int32[n_docs]        tokens per document after stopwords/stemming
+    idf         float32[n_terms]     Lucene IDF, log(1 + (N - df + 0.5) / (df + 0.5))
+    indptr      int64[n_terms + 1]   postings of term t are [indptr[t], indptr[t+1])
+    doc_ids     int32[nnz]           posting document rows (FAISS / node store rows)
+    tf          float32[nnz]         term frequency per posting
+    vocab       utf-8, "\\n"-joined  term t is line t
+
+Tokenization and scoring mirror llama-index's BM25Retriever (bm25s, Lucene
+variant, English stopwords + PyStemmer), so rankings match the in-memory
+retriever while startup is a single mmap.
+
+Two scorers read the file: MmapBM25 (walks postings, bit-for-bit bm25s
+scores) and SparseBM25 (SciPy CSR weights, batched queries, MaxScore top-k).
+"""
+from __future__ import annotations
+
+import mmap
+import re
+import struct
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+import bm25s
+import numpy as np
+import Stemmer
+from bm25s.stopwords import STOPWORDS_EN
+
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from rag_llamaindex.engine import ARTIFACTS_DIR, BM25_STORE, corpus_hash, dedup_hits, embed_text, load_node_store
+
+
+BM25_BIN = ARTIFACTS_DIR / "bm25_index.bin"
+
+MAGIC = b"AIBM25\x00\x00"
+VERSION = 2
+_HEADER = struct.Struct("<8sIIIQQdff20s")  # magic, version, n_docs, n_terms, nnz, vocab_bytes, avgdl, k1, b, text_hash
+
+K1 = 1.5
+B = 0.75
+
+_stemmer = Stemmer.Stemmer("english")
+_split = re.compile(r"(?u)\b\w\w+\b").findall
+_stopwords = frozenset(STOPWORDS_EN)
+
+
+# ---------- Tokenization (same as llama-index BM25Retriever) ----------
+def tokenize(texts: Sequence[str]) -> List[List[str]]:
+    return bm25s.tokenize(
+        list(texts), stopwords="en", stemmer=_stemmer, return_ids=False, show_progress=False
+    )
+
+
+def tokenize_query(question: str) -> List[str]:
+    """Same tokens as `tokenize([question])[0]`, without bm25s's per-call vocab bookkeeping."""
+    return _stemmer.stemWords([t for t in _split(question.lower()) if t not in _stopwords])
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(n_docs: int, n_terms: int, nnz: int) -> List[Tuple[str, str, int, int]]:
+    """(name, dtype, count, byte offset) of every array section, after the header."""
+    sections = [
+        ("doc_len", "<i4", n_docs),
+        ("idf", "<f4", n_terms),
+        ("indptr", "<i8", n_terms + 1),
+        ("doc_ids", "<i4", nnz),
+        ("tf", "<f4", nnz),
+    ]
+    out = []
+    offset = _align(_HEADER.size)
+    for name, dtype, count in sections:
+        out.append((name, dtype, count, offset))
+        offset = _align(offset + count * np.dtype(dtype).itemsize)
+    out.append(("vocab", "u1", 0, offset))
+    return out
+
+
+# ---------- Offline build ----------
+def write_bm25_index(texts: Iterable[str], path: Path = BM25_BIN, k1: float = K1, b: float = B) -> Path:
+    """Tokenize `texts` (one per node store row) and write the binary index."""
+    texts = list(texts)
+    docs = tokenize(texts)
+    n_docs = len(docs)
+
+    vocab = sorted({t for d in docs for t in d})
+    term_id = {t: i for i, t in enumerate(vocab)}
+    n_terms = len(vocab)
+
+    postings: List[List[Tuple[int, int]]] = [[] for _ in range(n_terms)]
+    doc_len = np.zeros(n_docs, dtype="<i4")
+    for row, toks in enumerate(docs):
+        doc_len[row] = len(toks)
+        counts: dict = {}
+        for t in toks:
+            counts[t] = counts.get(t, 0) + 1
+        for t, c in counts.items():
+            postings[term_id[t]].append((row, c))
+
+    indptr = np.zeros(n_terms + 1, dtype="<i8")
+    indptr[1:] = np.cumsum([len(p) for p in postings])
+    nnz = int(indptr[-1])
+    doc_ids = np.fromiter((r for p in postings for r, _ in p), dtype="<i4", count=nnz)
+    tf = np.fromiter((c for p in postings for _, c in p), dtype="<f4", count=nnz)
+
+    df = np.diff(indptr).astype("float64")
+    idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype("<f4")
+    avgdl = float(doc_len.mean()) if n_docs else 0.0
+
+    vocab_blob = "\n".join(vocab).encode("utf-8")
+    arrays = {"doc_len": doc_len, "idf": idf, "indptr": indptr, "doc_ids": doc_ids, "tf": tf}
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as w:
+        w.write(_HEADER.pack(
+            MAGIC, VERSION, n_docs, n_terms, nnz, len(vocab_blob), avgdl, k1, b, bytes.fromhex(corpus_hash(texts))
+        ))
+        for name, _, _, offset in _layout(n_docs, n_terms, nnz):
+            w.write(b"\x00" * (offset - w.tell()))
+            w.write(vocab_blob if name == "vocab" else arrays[name].tobytes())
+    tmp.replace(path)
+    print(f"[BM25] Wrote {path} (docs={n_docs}, terms={n_terms}, postings={nnz})")
+    return path
+
+
+# ---------- Query side ----------
+class MmapBM25:
+    """Read-only BM25 scorer over a memory-mapped bm25_index.bin."""
+
+    def __init__(self, path: Path = BM25_BIN):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = struct.unpack_from("<8sI", self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version-{VERSION} BM25 index; re-run build_index.py.")
+        _, _, n_docs, n_terms, nnz, vocab_bytes, avgdl, k1, b, text_hash = _HEADER.unpack_from(self._mm, 0)
+        self.n_docs, self.n_terms, self.nnz = n_docs, n_terms, nnz
+        self.avgdl, self.k1, self.b = avgdl, k1, b
+        self.text_hash = text_hash.hex()
+
+        for name, dtype, count, offset in _layout(n_docs, n_terms, nnz):
+            if name == "vocab":
+                blob = self._mm[offset:offset + vocab_bytes].decode("utf-8")
+                self.vocab = {t: i for i, t in enumerate(blob.split("\n"))} if blob else {}
+            else:
+                setattr(self, name, np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset))
+
+        # Per-document length normalisation, k1 * (1 - b + b * dl / avgdl)
+        self._norm = (k1 * ((1 - b) + b * self.doc_len / avgdl)).astype("float32") if n_docs else np.zeros(0, "float32")
+
+    def term_ids(self, tokens: Iterable[str]) -> List[int]:
+        """Vocabulary ids for `tokens`; unknown terms dropped, repeats kept (as bm25s does)."""
+        return [self.vocab[t] for t in tokens if t in self.vocab]
+
+    def postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc rows, BM25 weights) for one term."""
+        start, end = self.indptr[term], self.indptr[term + 1]
+        docs = self.doc_ids[start:end]
+        tf = self.tf[start:end]
+        return docs, self.idf[term] * (tf / (self._norm[docs] + tf))
+
+    def get_scores(self, tokens: Iterable[str]) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype="float32")
+        for term in self.term_ids(tokens):
+            docs, w = self.postings(term)
+            np.add.at(scores, docs, w)
+        return scores
+
+    def top_k(self, question: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the k best documents, best first."""
+        scores = self.get_scores(tokenize_query(question))
+        return top_k_rows(scores, k)
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (rows, scores) of the k best entries, best first. Uses the same
+    argpartition/argsort sequence as bm25s so ties come out in the same order.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, dtype="int64"), np.zeros(0, dtype=scores.dtype)
+    part = np.argpartition(scores, -k).take(indices=range(-k, 0))
+    order = np.flip(np.argsort(scores[part]))
+    rows = part[order]
+    return rows, scores[rows]
+
+
+class SparseBM25(MmapBM25):
+    """
+    BM25 over a SciPy CSR term x document weight matrix built from bm25_index.bin.
+
+    - `get_scores` / `score_batch`: a sparse mat-vec (or mat-mat for a batch)
+      of query term counts against the precomputed idf * tf-component weights.
+    - `top_k`: short postings are scored with the same mat-vec; past
+      `prune_min_postings` it switches to MaxScore-style pruning. Terms are
+      visited by decreasing upper bound; once the bounds of the unvisited terms
+      cannot lift an unseen document past the current k-th score, the rest of
+      the terms are only probed for the surviving candidates instead of
+      walking whole postings.
+
+    Unlike bm25s, documents that match no query term are never returned, so a
+    rare-term query can yield fewer than k hits, and equal scores are ordered
+    by lower row rather than by bm25s' argpartition order: rankings only match
+    MmapBM25 / BM25Retriever up to ties (hence opt-in, ASKIMMI_BM25_BACKEND=sparse).
+    """
+
+    def __init__(self, path: Path = BM25_BIN, prune_min_postings: int = 50_000):
+        super().__init__(path)
+        from scipy import sparse
+
+        self.prune_min_postings = prune_min_postings
+
+        rows = np.repeat(np.arange(self.n_terms), np.diff(self.indptr))
+        docs = self.doc_ids.astype("int64")
+        weights = (self.idf[rows] * (self.tf / (self._norm[docs] + self.tf))).astype("float32")
+        self.weights = sparse.csr_matrix(
+            (weights, self.doc_ids, self.indptr), shape=(self.n_terms, self.n_docs)
+        )
+        # Largest weight per term: the MaxScore upper bound
+        self.max_weight = np.zeros(self.n_terms, dtype="float32")
+        nonempty = np.diff(self.indptr) > 0
+        self.max_weight[nonempty] = np.maximum.reduceat(weights, self.indptr[:-1][nonempty])
+
+    def query_terms(self, tokens: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(term ids, counts) of a tokenized query: the non-zeros of its query vector."""
+        terms, counts = np.unique(np.asarray(self.term_ids(tokens), dtype="int64"), return_counts=True)
+        return terms, counts.astype("float32")
+
+    def query_vector(self, tokens: Iterable[str]):
+        """1 x n_terms CSR row of query term counts."""
+        from scipy import sparse
+
+        terms, counts = self.query_terms(tokens)
+        return sparse.csr_matrix((counts, terms, [0, len(terms)]), shape=(1, self.n_terms))
+
+    def matvec(self, terms: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """
+        Dense scores = query vector @ weights, computed straight on the CSR
+        buffers (gather the query rows, scatter-add into documents). Avoids
+        building SciPy objects per query, which costs more than the product
+        itself at our sizes.
+        """
+        starts, ends = self.indptr[terms], self.indptr[terms + 1]
+        lens = ends - starts
+        pos = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+        scores = np.bincount(
+            self.weights.indices[pos],
+            weights=np.repeat(counts, lens) * self.weights.data[pos],
+            minlength=self.n_docs,
+        )
+        return scores.astype("float32")
+
+    def get_scores(self, tokens: Iterable[str]) -> np.ndarray:
+        return self.matvec(*self.query_terms(tokens))
+
+    def score_batch(self, questions: Sequence[str]):
+        """n_questions x n_docs sparse score matrix, one mat-mat product for the batch."""
+        from scipy import sparse
+
+        return sparse.vstack(
+            [self.query_vector(tokenize_query(q)) for q in questions], format="csr"
+        ) @ self.weights
+
+    def top_k_batch(self, questions: Sequence[str], k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        scores = self.score_batch(questions)
+        out = []
+        for i in range(scores.shape[0]):
+            lo, hi = scores.indptr[i], scores.indptr[i + 1]
+            out.append(_top_k_sparse(scores.indices[lo:hi], scores.data[lo:hi], k))
+        return out
+
+    def top_k(self, question: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        terms, counts = self.query_terms(tokenize_query(question))
+        if k <= 0 or len(terms) == 0:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        if int((self.indptr[terms + 1] - self.indptr[terms]).sum()) < self.prune_min_postings:
+            scores = self.matvec(terms, counts)
+            docs = np.flatnonzero(scores)
+            return _top_k_sparse(docs, scores[docs], k)
+
+        bounds = self.max_weight[terms] * counts
+        order = np.argsort(-bounds, kind="stable")
+        terms, counts, bounds = terms[order], counts[order], bounds[order]
+        # remaining[i]: best score an unseen doc could still collect from terms[i:]
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1], 0.0)
+
+        acc = np.zeros(self.n_docs, dtype="float32")
+        seen = np.zeros(self.n_docs, dtype=bool)
+        cand = np.zeros(0, dtype="int64")
+        for i, term in enumerate(terms):
+            if len(cand) >= k:
+                theta = np.partition(acc[cand], -k)[-k]
+                if remaining[i] < theta:
+                    # Unseen docs can no longer reach the top k: only finish candidates
+                    cand = cand[acc[cand] + remaining[i] >= theta]
+                    for t, c in zip(terms[i:], counts[i:]):
+                        self._probe(acc, cand, t, c)
+                    break
+            start, end = self.indptr[term], self.indptr[term + 1]
+            docs = self.weights.indices[start:end]
+            acc[docs] += counts[i] * self.weights.data[start:end]
+            new = docs[~seen[docs]]
+            seen[new] = True
+            cand = np.concatenate([cand, new])
+        return _top_k_sparse(cand, acc[cand], k)
+
+    def _probe(self, acc: np.ndarray, cand: np.ndarray, term: int, count: float) -> None:
+        """Add one term's weights to `acc` for the candidate docs only (postings are sorted by doc)."""
+        start, end = self.indptr[term], self.indptr[term + 1]
+        docs = self.weights.indices[start:end]
+        if len(docs) == 0 or len(cand) == 0:
+            return
+        pos = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+        hit = docs[pos] == cand
+        acc[cand[hit]] += count * self.weights.data[start:end][pos[hit]]
+
+
+def _top_k_sparse(docs: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Top k over (doc, score) pairs, best first, ties broken by lower doc row."""
+    keep = scores > 0
+    docs, scores = docs[keep], scores[keep]
+    if len(docs) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        docs, scores = docs[part], scores[part]
+    order = np.lexsort((docs, -scores))
+    return docs[order].astype("int64"), scores[order]
+
+
+class MmapBM25Retriever:
+    """Drop-in for BM25Retriever.retrieve() backed by MmapBM25 or SparseBM25."""
+
+    def __init__(self, index: MmapBM25, nodes: List[TextNode], similarity_top_k: int = 10):
+        if index.n_docs != len(nodes):
+            raise ValueError(
+                f"{index.path.name} covers {index.n_docs} docs but the node store has {len(nodes)}; "
+                "re-run build_index.py."
+            )
+        if index.text_hash != corpus_hash(embed_text(n) for n in nodes):
+            raise ValueError(
+                f"{index.path.name} was built from other text than the node store now yields; "
+                "re-run build_index.py (or python -m rag_llamaindex.bm25_index)."
+            )
+        self.index = index
+        self.nodes = nodes
+        self.similarity_top_k = similarity_top_k
+
+    def retrieve(self, question: str) -> List[NodeWithScore]:
+        rows, scores = self.index.top_k(question, self.similarity_top_k)
+        return self._to_hits(rows, scores)
+
+    def retrieve_batch(self, questions: Sequence[str]) -> List[List[NodeWithScore]]:
+        """Score several questions together (SparseBM25: one sparse product for the batch)."""
+        if hasattr(self.index, "top_k_batch"):
+            results = self.index.top_k_batch(questions, self.similarity_top_k)
+        else:
+            results = [self.index.top_k(q, self.similarity_top_k) for q in questions]
+        return [self._to_hits(rows, scores) for rows, scores in results]
+
+    def _to_hits(self, rows: np.ndarray, scores: np.ndarray) -> List[NodeWithScore]:
+        return dedup_hits([NodeWithScore(node=self.nodes[int(r)], score=float(s)) for r, s in zip(rows, scores)])
+
+
+if __name__ == "__main__":
+    # Rebuild only the binary index from an existing node store (no re-embedding)
+    write_bm25_index(embed_text(n) for n in load_node_store(BM25_STORE))
@@ -1,52 +1,119 @@
-import json, os, faiss
-from llama_index.core import Document, StorageContext, VectorStoreIndex
-from llama_index.vector_stores.faiss import FaissVectorStore
-from llama_index.retrievers.bm25 import BM25Retriever
-from rag_llamaindex.settings import EMBEDDING
+import filecmp, json, os, sys, time, faiss
+import numpy as np
+from rag_llamaindex.models import embed_key
+from rag_llamaindex.engine import ARTIFACTS_DIR, BM25_STORE, FAISS_IDX, corpus_hash, node_from_record, embed_text
+from rag_llamaindex.bm25_index import write_bm25_index
+from rag_llamaindex.faiss_index import IndexSpec, build as build_ann, read_meta, spec_from_env, supports_removal, write_meta
+from rag_llamaindex import manifest
+from rag_llamaindex.embed_pipeline import embed_cached
 
 IN_CHUNKS = "data/processed/chunks.jsonl"
-FAISS_IDX = "artifacts/faiss_llamaindex.index"
-BM25_STORE = "artifacts/bm25_nodes.jsonl"
 
-def load_docs():
-    docs=[]
+def load_records():
+    """chunks.jsonl -> BM25 store records, dropping repeated chunk ids (re-crawled pages)."""
+    recs=[]; seen=set()
     with open(IN_CHUNKS,"r",encoding="utf-8") as f:
         for ln in f:
-            j=json.loads(ln); txt=j["text"]; meta={k:j[k] for k in j if k!="text"}
-            docs.append(Document(text=txt, metadata=meta))
-    return docs
+            j=json.loads(ln); meta={k:j[k] for k in j if k!="text"}
+            cid=str(meta.get("chunk_id") or meta.get("id"))
+            if cid in seen: continue
+            seen.add(cid); recs.append({"text":j["text"],"metadata":meta})
+    return recs
 
-if __name__=="__main__":
-    os.makedirs("artifacts", exist_ok=True)
-    docs=load_docs(); print(f"[INFO] docs={len(docs)}")
-    # BM25 materialization
-    with open(BM25_STORE,"w",encoding="utf-8") as w:
-        for d in docs:
-            w.write(json.dumps({"text":d.text,"metadata":d.metadata},ensure_ascii=False)+"\n")
-    # FAISS
-    dim = EMBEDDING._model.get_sentence_embedding_dimension()
-    idx = faiss.IndexFlatIP(dim)
-    vs = FaissVectorStore(faiss_index=idx)
-    sc = StorageContext.from_defaults(vector_store=vs)
-    VectorStoreIndex.from_documents(docs, storage_context=sc, embed_model=EMBEDDING, show_progress=True)
-    def _get_faiss_index(store):
-        """
-        Handle different llama-index FaissVectorStore versions.
-
-        Some expose `faiss_index`, others keep `_faiss_index` or `index`.
-            This helper tries them in a safe order.
+def write_bm25_store(recs, path=BM25_STORE, vids=None):
+    """
+    One record per line; with `vids`, each carries its FAISS id (id-mapped builds).
+    Written atomically, and left untouched when identical. Returns True if it changed.
+    """
+    tmp=f"{path}.tmp"
+    with open(tmp,"w",encoding="utf-8") as w:
+        for i,r in enumerate(recs):
+            if vids is not None: r={**r,"vid":int(vids[i])}
+            w.write(json.dumps(r,ensure_ascii=False)+"\n")
+    if os.path.exists(path) and filecmp.cmp(tmp, path, shallow=False):
+        os.remove(tmp); return False
+    os.replace(tmp, path); return True
+
+def embed_texts(texts, embed_model=None):
+    """Default: on-disk cached, length-sorted, optionally multi-process (rag_llamaindex/embed_pipeline.py)."""
+    if not texts: return None
+    if embed_model is None: return embed_cached(list(texts))
+    vecs=embed_model.get_text_embedding_batch(list(texts), show_progress=True)
+    return np.asarray(vecs,dtype="float32")
+
+def build_faiss(nodes, embed_model=None, spec=None, ids=None):
+    """
+    One vector per node, row i <-> line i of the BM25 store (what engine.py expects),
+    or id ids[i] <-> the store line carrying that "vid" when ids are given.
+    spec: faiss_index.IndexSpec (default ASKIMMI_FAISS_INDEX, flat). Returns (index, spec built).
+    """
+    vecs=embed_texts([embed_text(n) for n in nodes], embed_model)
+    return build_ann(vecs, spec or spec_from_env(), ids=ids)
+
+def update_faiss(prev, ids, hashes, texts, spec_text):
     """
-    # Newer versions may store the raw index on `.index`
-        if hasattr(store, "faiss_index"):
-            return store.faiss_index
-        if hasattr(store, "_faiss_index"):
-            return store._faiss_index
-        if hasattr(store, "index"):
-            return store.index
-        raise AttributeError(
-            f"Could not find underlying FAISS index on {type(store).__name__}; "
-        "check llama-index-vector-stores-faiss version or update this helper."
-        )
-    faiss_index = _get_faiss_index(vs)
-    faiss.write_index(faiss_index, FAISS_IDX)
-    print("[OK] BM25+FAISS ready")
+    Patch the existing id-mapped index for the chunks that changed since `prev`.
+    Returns (index, vids, diff, next_vid), or None when a full build is needed.
+    """
+    if not FAISS_IDX.exists(): return None
+    if prev.get("embed_model")!=_model_name() or prev.get("faiss_spec")!=spec_text:
+        print("[INFO] embed model or FAISS spec changed: full rebuild"); return None
+    idx=faiss.read_index(str(FAISS_IDX))
+    if not isinstance(idx,faiss.IndexIDMap) or idx.ntotal!=len(prev["chunks"]): return None
+    d=manifest.diff(prev["chunks"], dict(zip(ids,hashes)))
+    stale=[prev["chunks"][c]["vid"] for c in d.changed+d.removed]
+    if stale:
+        if not supports_removal(idx):
+            print("[INFO] index type cannot remove vectors: full rebuild"); return None
+        idx.remove_ids(np.asarray(stale,dtype="int64"))
+    next_vid=int(prev["next_vid"]); vid_of={c:prev["chunks"][c]["vid"] for c in d.unchanged}
+    todo=set(d.added)|set(d.changed); rows=[i for i,c in enumerate(ids) if c in todo]
+    if rows:
+        new_vids=np.arange(next_vid,next_vid+len(rows),dtype="int64"); next_vid+=len(rows)
+        idx.add_with_ids(embed_texts([texts[i] for i in rows]), new_vids)
+        vid_of.update({ids[i]:int(v) for i,v in zip(rows,new_vids)})
+    return idx, [vid_of[c] for c in ids], d, next_vid
+
+def _model_name():
+    """Embedding model + runtime (int8 ONNX vectors differ from fp32): a change forces a full rebuild."""
+    return embed_key()
+
+def main(full=False):
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    t0=time.perf_counter()
+    recs=load_records(); print(f"[INFO] docs={len(recs)}")
+    nodes=[node_from_record(r) for r in recs]
+    ids=[n.node_id for n in nodes]; texts=[embed_text(n) for n in nodes]
+    hashes=[manifest.content_hash(t) for t in texts]
+    spec=spec_from_env(); spec_text=str(spec)
+
+    # FAISS: patch the previous build when possible (manifest of chunk id -> content hash + vid)
+    prev=None if full else manifest.load_latest()
+    res=update_faiss(prev, ids, hashes, texts, spec_text) if prev else None
+    if res:
+        idx,vids,d,next_vid=res
+        print(f"[INFO] incremental: {d.counts()}")
+        meta=read_meta(FAISS_IDX) or {}
+        if not (d.added or d.changed or d.removed) and ids==list(prev["chunks"]) and meta.get("text_hash")==corpus_hash(texts):
+            # Embedded text is unchanged, but volatile metadata (last_seen) may have moved
+            if write_bm25_store(recs, vids=vids): print("[OK] Node store metadata refreshed; indexes already up to date")
+            else: print("[OK] Artifacts already up to date")
+            return
+        built=IndexSpec(**meta["params"]) if meta else spec
+    else:
+        vids=list(range(len(nodes))); next_vid=len(nodes)
+        idx,built=build_ann(embed_texts(texts), spec, ids=np.asarray(vids,dtype="int64"))
+        d=manifest.diff({}, dict(zip(ids,hashes)))
+        print(f"[INFO] full build: {len(nodes)} chunks embedded")
+
+    # BM25 materialization + binary inverted index (tokenizing only, no embedding)
+    write_bm25_store(recs, vids=vids)
+    write_bm25_index(texts)
+    tmp=f"{FAISS_IDX}.tmp"; faiss.write_index(idx, tmp); os.replace(tmp, FAISS_IDX)  # never a torn index
+    write_meta(FAISS_IDX, idx, built, embed_model=_model_name(), text_hash=corpus_hash(texts), build_seconds=round(time.perf_counter()-t0,2))
+    path=manifest.write({"embed_model":_model_name(),"faiss_spec":spec_text,"next_vid":next_vid,
+        "chunks":{c:{"hash":h,"vid":v} for c,h,v in zip(ids,hashes,vids)},"changes":d.counts()})
+    print(f"[OK] BM25+FAISS ({built}) ready in {time.perf_counter()-t0:.1f}s, manifest {path.name}")
+
+if __name__=="__main__":
+    main(full="--full" in sys.argv[1:])
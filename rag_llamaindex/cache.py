@@ -0,0 +1,116 @@
+"""
+In-process caches for the retrieval path.
+
+    TTLCache               thread-safe LRU with a size bound, per-entry TTL and
+                           hit / miss / eviction counters
+    normalize_question     "  What is OPT? " and "what is opt" share one key
+
+Two process-wide instances are used:
+
+    embedding_cache    (embed model, normalized question) -> query vector
+    candidate_cache    (artifact fingerprint, normalized question, pool) -> top node ids
+
+The artifact fingerprint (RetrievalEngine.fingerprint) changes whenever
+the node store, BM25 index or FAISS index is rebuilt, so stale candidate
+sets are never served after a rebuild.
+
+    ASKIMMI_EMBED_CACHE_SIZE      default 4096 entries
+    ASKIMMI_CANDIDATE_CACHE_SIZE  default 2048 entries
+    ASKIMMI_CACHE_TTL_S           default 3600 (0 disables expiry)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from rag_llamaindex.metrics import CallbackGauge
+
+EMBED_CACHE_SIZE = int(os.getenv("ASKIMMI_EMBED_CACHE_SIZE", "4096"))
+CANDIDATE_CACHE_SIZE = int(os.getenv("ASKIMMI_CANDIDATE_CACHE_SIZE", "2048"))
+CACHE_TTL_S = float(os.getenv("ASKIMMI_CACHE_TTL_S", "3600"))
+
+_WS = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?.!]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace, drop trailing ?/./! -- a cache key, not a model input."""
+    return _TRAILING.sub("", _WS.sub(" ", question.strip().lower()))
+
+
+class TTLCache:
+    """LRU cache bounded by `maxsize` entries; entries older than `ttl` seconds are misses."""
+
+    def __init__(self, maxsize: int, ttl: float = CACHE_TTL_S, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+embedding_cache = TTLCache(EMBED_CACHE_SIZE, name="embedding")
+candidate_cache = TTLCache(CANDIDATE_CACHE_SIZE, name="candidates")
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {c.name: c.stats() for c in (embedding_cache, candidate_cache)}
+
+
+_CACHES = (embedding_cache, candidate_cache)
+CallbackGauge("askimmi_cache_entries", "Entries held by a retrieval cache.", lambda: {(c.name,): len(c) for c in _CACHES}, ["cache"])
+CallbackGauge(
+    "askimmi_cache_lookups_total",
+    "Retrieval cache lookups by result.",
+    lambda: {k: v for c in _CACHES for k, v in (((c.name, "hit"), c.hits), ((c.name, "miss"), c.misses))},
+    ["cache", "result"],
+    kind="counter",
+)
@@ -0,0 +1,203 @@
+"""
+Build-time embedding: cached on disk, length-sorted batches, optional process pool.
+
+    vecs = embed_cached(texts)        # float32 (len(texts), dim), row i <-> texts[i]
+
+Vectors are cached per model in artifacts/embed_cache/<model>/ and keyed by
+the sha1 of the text, so re-runs, incremental builds and model A/B runs
+only embed text the model has not seen:
+
+    meta.json     {"model", "dim", "dtype"}
+    vectors.bin   raw rows (float16 by default, ASKIMMI_EMBED_CACHE_DTYPE=float32)
+    keys.txt      one text hash per row, same order
+
+Both files are append-only; a row only counts once its key is written, and
+vectors beyond the last key (a run stopped between the two writes) are cut
+off before anything else is appended, so an interrupted build leaves a
+usable cache.
+
+Missing texts are de-duplicated, sorted by length (less padding per
+batch) and embedded in ASKIMMI_EMBED_BATCH batches. With
+ASKIMMI_EMBED_WORKERS > 1 and enough work, batches are spread over a spawn
+process pool, each worker loading its own copy of the model with
+cpu_count / workers torch threads; results are appended as batches finish.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_llamaindex.engine import ARTIFACTS_DIR
+from rag_llamaindex.models import EMBED_MODEL_NAME, embed_key, get_embedder
+
+EMBED_CACHE_DIR = Path(os.getenv("ASKIMMI_EMBED_CACHE_DIR", str(ARTIFACTS_DIR / "embed_cache")))
+EMBED_CACHE_DTYPE = os.getenv("ASKIMMI_EMBED_CACHE_DTYPE", "float16")
+EMBED_BATCH = int(os.getenv("ASKIMMI_EMBED_BATCH", "256"))
+EMBED_WORKERS = int(os.getenv("ASKIMMI_EMBED_WORKERS", "1"))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model_name: str = EMBED_MODEL_NAME) -> str:
+    """Cache namespace: the model, plus the runtime when it changes the numbers (int8 ONNX)."""
+    return embed_key(model_name)
+
+
+# ---------- On-disk cache ----------
+class EmbeddingStore:
+    def __init__(self, key: str, root: Path = EMBED_CACHE_DIR, dtype: str = EMBED_CACHE_DTYPE):
+        self.key = key
+        self.path = Path(root) / re.sub(r"[^A-Za-z0-9_.-]+", "__", key)
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("model") != self.key:
+            return
+        self.dtype, self.dim = np.dtype(meta["dtype"]), int(meta["dim"])
+        keys_path, vec_path = self.path / "keys.txt", self.path / "vectors.bin"
+        all_keys = keys_path.read_text(encoding="utf-8").split() if keys_path.exists() else []
+        n_rows = vec_path.stat().st_size // self._row_bytes() if vec_path.exists() else 0
+        keys = all_keys[:n_rows]
+        if len(keys) < len(all_keys):  # keys without a full vector row
+            keys_path.write_text("".join(k + "\n" for k in keys), encoding="utf-8")
+        self._rows = {k: i for i, k in enumerate(keys)}
+        self._trim()
+        print(f"[EmbedCache] {len(self._rows)} cached vectors for {self.key} ({self.dtype.name})")
+
+    def _row_bytes(self) -> int:
+        return int(self.dim) * self.dtype.itemsize
+
+    def _trim(self) -> None:
+        """Cut vectors.bin back to one row per key (drops rows whose key was never written)."""
+        vec_path = self.path / "vectors.bin"
+        size = len(self._rows) * self._row_bytes()
+        if vec_path.exists() and vec_path.stat().st_size > size:
+            with vec_path.open("r+b") as f:
+                f.truncate(size)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, h: str) -> bool:
+        return h in self._rows
+
+    def get(self, hashes: Sequence[str]) -> np.ndarray:
+        """float32 rows for `hashes` (all must be cached)."""
+        rows = np.asarray([self._rows[h] for h in hashes], dtype="int64")
+        if not len(rows):
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        mm = np.memmap(self.path / "vectors.bin", dtype=self.dtype, mode="r").reshape(-1, self.dim)
+        return np.asarray(mm[rows], dtype="float32")
+
+    def add(self, hashes: Sequence[str], vecs: np.ndarray) -> None:
+        vecs = np.asarray(vecs)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vecs.shape[1])
+                self.path.mkdir(parents=True, exist_ok=True)
+                for stale in ("vectors.bin", "keys.txt"):
+                    (self.path / stale).unlink(missing_ok=True)
+                meta = {"model": self.key, "dim": self.dim, "dtype": self.dtype.name}
+                (self.path / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            self._trim()  # a failed earlier write must not shift the new rows
+            start = len(self._rows)
+            with (self.path / "vectors.bin").open("ab") as f:
+                f.write(np.ascontiguousarray(vecs, dtype=self.dtype).tobytes())
+            with (self.path / "keys.txt").open("a", encoding="utf-8") as f:
+                f.write("".join(h + "\n" for h in hashes))
+            for i, h in enumerate(hashes):
+                self._rows[h] = start + i
+
+
+# ---------- Workers ----------
+_worker_model = None
+
+
+def _init_worker(loader: Callable, model_name: str, threads: int) -> None:
+    global _worker_model
+    try:
+        import torch
+
+        torch.set_num_threads(max(1, threads))
+    except ImportError:
+        pass
+    _worker_model = loader(model_name)
+
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.get_text_embedding_batch(texts), dtype="float32")
+
+
+def _batches(texts: Sequence[str], size: int) -> Iterator[Tuple[List[int], List[str]]]:
+    """Indices + texts, longest first, `size` per batch."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    for s in range(0, len(order), size):
+        idx = order[s : s + size]
+        yield idx, [texts[i] for i in idx]
+
+
+# ---------- Entry point ----------
+def embed_cached(
+    texts: Sequence[str],
+    model_name: str = EMBED_MODEL_NAME,
+    workers: int = EMBED_WORKERS,
+    batch_size: int = EMBED_BATCH,
+    loader: Callable = get_embedder,
+    store: Optional[EmbeddingStore] = None,
+) -> np.ndarray:
+    """
+    float32 embeddings for `texts`, embedding only hashes missing from the cache.
+    `loader(model_name)` returns a llama-index embedding model (top-level, picklable).
+    """
+    store = store if store is not None else EmbeddingStore(cache_key(model_name))
+    hashes = [text_hash(t) for t in texts]
+    todo: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in store and h not in todo:
+            todo[h] = t
+    print(f"[Embed] {len(texts)} texts: {len(texts) - len(todo)} cached, {len(todo)} to embed")
+
+    if todo:
+        todo_hashes, todo_texts = list(todo), list(todo.values())
+        batches = list(_batches(todo_texts, batch_size))
+        workers = min(workers, len(batches))
+        done = 0
+        if workers > 1:
+            threads = (os.cpu_count() or 1) // workers
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context("spawn"),  # no forked torch / tokenizer thread state
+                initializer=_init_worker,
+                initargs=(loader, model_name, threads),
+            ) as pool:
+                # map() keeps batch order and streams results back as workers finish them
+                for (idx, _), vecs in zip(batches, pool.map(_embed_batch, [b for _, b in batches])):
+                    store.add([todo_hashes[i] for i in idx], vecs)
+                    done += len(idx)
+                    print(f"[Embed] {done}/{len(todo)}")
+        else:
+            model = loader(model_name)
+            for idx, batch in batches:
+                store.add([todo_hashes[i] for i in idx], model.get_text_embedding_batch(batch))
+                done += len(idx)
+                print(f"[Embed] {done}/{len(todo)}")
+    return store.get(hashes)
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+from llama_index.retrievers.bm25 import BM25Retriever
+
+from rag_llamaindex.cache import embedding_cache, normalize_question
+from rag_llamaindex.faiss_index import load_spec, read_meta, set_search_params
+from rag_llamaindex.fusion import fuse_hits
+from rag_llamaindex.metrics import span
+
+
+# ---------- Artifact paths ----------
+ROOT_DIR = Path(__file__).resolve().parents[1]
+ARTIFACTS_DIR = ROOT_DIR / "artifacts"
+BM25_STORE = ARTIFACTS_DIR / "bm25_nodes.jsonl"
+FAISS_IDX = ARTIFACTS_DIR / "faiss_llamaindex.index"
+
+DEFAULT_TOP_K = 10
+
+# "mmap" (bit-for-bit bm25s scores and tie order, same rankings as BM25Retriever),
+# "sparse" (SciPy CSR + MaxScore: same scores, ties broken by lower row) or
+# "llamaindex" (tokenize the node store at startup, no bm25_index.bin needed)
+BM25_BACKEND = os.getenv("ASKIMMI_BM25_BACKEND", "mmap")
+
+# rrf | minmax | zscore, see rag_llamaindex/fusion.py
+FUSION_METHOD = os.getenv("ASKIMMI_FUSION", "rrf")
+
+
+# ---------- Node store ----------
+DEDUP_METADATA_KEYS = ("urls", "dup_chunk_ids")
+# Rewritten by every crawl without changing the page: kept out of the embedded / BM25
+# text so content hashes (manifest, embedding cache) only move when the content does
+VOLATILE_METADATA_KEYS = ("last_seen",)
+
+
+def node_from_record(rec: dict) -> TextNode:
+    """
+    Build a TextNode from one bm25_nodes.jsonl record.
+
+    build_index.py and the engine both go through this function, so the text
+    that gets tokenized/embedded offline is exactly the text seen at query time.
+    """
+    meta = dict(rec.get("metadata") or {})
+    chunk_id = str(meta.get("chunk_id") or meta.get("id") or "")
+    if not chunk_id:
+        raise ValueError("Each BM25 store record must carry a 'chunk_id' in its metadata.")
+    # Source lists of collapsed near-duplicates (src/dedup.py) are for the legend, not for matching
+    hidden = [k for k in DEDUP_METADATA_KEYS if k in meta]
+    return TextNode(
+        id_=chunk_id,
+        text=rec["text"],
+        metadata=meta,
+        excluded_embed_metadata_keys=hidden + [k for k in VOLATILE_METADATA_KEYS if k in meta],
+        excluded_llm_metadata_keys=hidden,
+    )
+
+
+def read_node_store(path: Path = BM25_STORE) -> Tuple[List[TextNode], Optional[List[int]]]:
+    """
+    Nodes in store order, plus each record's FAISS vector id ("vid") when the
+    store was written by an id-mapped build (None for positional stores).
+    """
+    nodes: List[TextNode] = []
+    vids: List[int] = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                rec = json.loads(line)
+                nodes.append(node_from_record(rec))
+                if "vid" in rec:
+                    vids.append(int(rec["vid"]))
+    return nodes, (vids if len(vids) == len(nodes) and vids else None)
+
+
+def load_node_store(path: Path = BM25_STORE) -> List[TextNode]:
+    """Load the nodes written by build_index.py, in BM25 row order."""
+    return read_node_store(path)[0]
+
+
+def embed_text(node: TextNode) -> str:
+    """Text that gets embedded / BM25-indexed for a node (same as VectorStoreIndex)."""
+    return node.get_content(metadata_mode=MetadataMode.EMBED)
+
+
+def corpus_hash(texts: Iterable[str]) -> str:
+    """
+    sha1 over the indexed texts, in row order. Recorded with bm25_index.bin so an
+    index built from another node store, or from text that `embed_text` no longer
+    produces, is detected at load time instead of silently scoring stale tokens.
+    """
+    h = hashlib.sha1()
+    for t in texts:
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def dedup_hits(hits: List[NodeWithScore]) -> List[NodeWithScore]:
+    """Drop repeated node ids, keeping the best-ranked one (llama-index retrievers do the same)."""
+    seen: set[str] = set()
+    out: List[NodeWithScore] = []
+    for h in hits:
+        if h.node.node_id not in seen:
+            seen.add(h.node.node_id)
+            out.append(h)
+    return out
+
+
+# ---------- Dense retriever over a prebuilt FAISS index ----------
+class FaissRetriever:
+    """
+    Minimal dense retriever: embed the question, search FAISS, map rows to nodes.
+
+    FAISS ids map to nodes through `vids` (vids[i] is the id of nodes[i],
+    id-mapped builds); without it, row i of the index is nodes[i].
+    Exposes the same `.retrieve(question)` / `.similarity_top_k` surface as the
+    llama-index retrievers it replaces.
+    """
+
+    def __init__(
+        self,
+        index,
+        nodes: List[TextNode],
+        embed_model,
+        similarity_top_k: int = DEFAULT_TOP_K,
+        vids: Optional[List[int]] = None,
+    ):
+        self.index = index
+        self.nodes = nodes
+        self.embed_model = embed_model
+        self.similarity_top_k = similarity_top_k
+        self.row_of_vid = {v: i for i, v in enumerate(vids)} if vids is not None else None
+
+    def embed_query(self, question: str) -> np.ndarray:
+        # Query vectors depend only on the model and the question: cached across requests
+        key = (getattr(self.embed_model, "model_name", type(self.embed_model).__name__), normalize_question(question))
+        vec = embedding_cache.get(key)
+        if vec is None:
+            vec = np.asarray(self.embed_model.get_query_embedding(question), dtype="float32").reshape(1, -1)
+            embedding_cache.put(key, vec)
+        return vec
+
+    def search(self, query_vec: np.ndarray, k: Optional[int] = None) -> List[NodeWithScore]:
+        k = k or self.similarity_top_k
+        scores, rows = self.index.search(query_vec, k)
+        hits: List[NodeWithScore] = []
+        for score, row in zip(scores[0], rows[0]):
+            if row < 0:
+                continue
+            if self.row_of_vid is not None:
+                row = self.row_of_vid.get(int(row), -1)
+                if row < 0:
+                    continue
+            hits.append(NodeWithScore(node=self.nodes[int(row)], score=float(score)))
+        return dedup_hits(hits)
+
+    def retrieve(self, question: str) -> List[NodeWithScore]:
+        return self.search(self.embed_query(question))
+
+
+# ---------- Engine ----------
+class RetrievalEngine:
+    """
+    Long-lived retrieval state: node store, BM25 and FAISS loaded once.
+
+    Use `get_engine()` to share one instance per process instead of
+    constructing this directly.
+    """
+
+    def __init__(
+        self,
+        nodes_path: Path = BM25_STORE,
+        faiss_path: Path = FAISS_IDX,
+        bm25_path: Optional[Path] = None,
+        bm25_backend: str = BM25_BACKEND,
+        similarity_top_k: int = DEFAULT_TOP_K,
+        embed_model=None,
+    ):
+        self.nodes_path = Path(nodes_path)
+        self.faiss_path = Path(faiss_path)
+        self.bm25_path = Path(bm25_path) if bm25_path else self.nodes_path.parent / "bm25_index.bin"
+        self.bm25_backend = bm25_backend
+        self.similarity_top_k = similarity_top_k
+        self._embed_model = embed_model
+
+        with span("load"):
+            self.nodes, self.vids = read_node_store(self.nodes_path)
+        self.node_by_id = {}
+        for n in self.nodes:
+            self.node_by_id.setdefault(n.node_id, n)
+        self.fingerprint = self._fingerprint()
+        print(f"[Engine] Loaded {len(self.nodes)} nodes from {self.nodes_path} (artifacts {self.fingerprint})")
+
+        self.bm25 = self._load_bm25()
+        # FAISS + the embedder load on first dense use, so BM25-only tools stay light
+        self._dense: Optional[FaissRetriever] = None
+        self._dense_lock = threading.Lock()
+
+    @property
+    def dense(self) -> FaissRetriever:
+        if self._dense is None:
+            with self._dense_lock:
+                if self._dense is None:
+                    index = self._load_faiss()
+                    self._dense = FaissRetriever(
+                        index,
+                        self.nodes,
+                        self.embed_model,
+                        similarity_top_k=self.similarity_top_k,
+                        vids=self.vids if isinstance(index, faiss.IndexIDMap) else None,
+                    )
+        return self._dense
+
+    def warmup(self) -> "RetrievalEngine":
+        """Load the dense side (FAISS + embedder) now rather than on the first query."""
+        _ = self.dense
+        return self
+
+    def _fingerprint(self) -> str:
+        """
+        Short hash of the artifact files (path, size, mtime) and the query
+        embedding runtime; changes on every rebuild or ASKIMMI_ONNX switch.
+        """
+        from rag_llamaindex.models import embed_key
+
+        h = hashlib.sha1(f"{self.bm25_backend}|{embed_key()}".encode())
+        for path in (self.nodes_path, self.bm25_path, self.faiss_path):
+            st = path.stat() if path.exists() else None
+            h.update(f"{path.name}:{st.st_size}:{st.st_mtime_ns}|".encode() if st else f"{path.name}:-|".encode())
+        return h.hexdigest()[:12]
+
+    @property
+    def embed_model(self):
+        if self._embed_model is None:
+            from rag_llamaindex.models import get_embedder
+
+            self._embed_model = get_embedder()
+        return self._embed_model
+
+    def _load_bm25(self):
+        """
+        Prefer the mmap'd inverted index written by build_index.py (scored by
+        `bm25_backend`); fall back to tokenizing the node store with
+        llama-index's BM25Retriever.
+        """
+        from rag_llamaindex.bm25_index import MmapBM25, MmapBM25Retriever, SparseBM25
+
+        backends = {"sparse": SparseBM25, "mmap": MmapBM25}
+        if self.bm25_backend in backends and self.bm25_path.exists():
+            try:
+                index = backends[self.bm25_backend](self.bm25_path)
+                retriever = MmapBM25Retriever(index, self.nodes, self.similarity_top_k)
+                print(f"[Engine] Mapped BM25 index ({index.n_terms} terms, {self.bm25_backend}) from {self.bm25_path}")
+                return retriever
+            except ValueError as e:
+                print(f"[Engine][WARN] {e} Falling back to in-memory BM25.")
+        return BM25Retriever.from_defaults(nodes=self.nodes, similarity_top_k=self.similarity_top_k)
+
+    def _load_faiss(self):
+        """
+        Read the prebuilt FAISS index. If it is missing, its rows do not line up
+        with the node store (older build_index.py output), it was built with
+        another embedding runtime (fp32 vs int8 ONNX) or from other text than
+        the node store now yields (sidecar text_hash), embed the nodes once in
+        memory so the process can still serve, and say so.
+        """
+        from rag_llamaindex.models import embed_key
+
+        texts = [embed_text(n) for n in self.nodes]
+        if self.faiss_path.exists():
+            index = faiss.read_index(str(self.faiss_path))
+            id_mapped = isinstance(index, faiss.IndexIDMap)
+            meta = read_meta(self.faiss_path) or {}
+            built_with = meta.get("embed_model")
+            if built_with and built_with != embed_key():
+                # e.g. an fp32 index queried with int8 ONNX vectors: scores would be silently off
+                print(
+                    f"[Engine][WARN] {self.faiss_path.name} was built with {built_with} but queries are "
+                    f"embedded with {embed_key()}; re-run rag_llamaindex/build_index.py with the same "
+                    "ASKIMMI_ONNX setting. Embedding nodes in memory for this process."
+                )
+            elif index.ntotal != len(self.nodes) or (id_mapped and self.vids is None):
+                print(
+                    f"[Engine][WARN] {self.faiss_path.name} has {index.ntotal} vectors but the node store "
+                    f"has {len(self.nodes)} nodes; re-run rag_llamaindex/build_index.py. "
+                    "Embedding nodes in memory for this process."
+                )
+            elif meta.get("text_hash") != corpus_hash(texts):
+                # Built before text hashes were recorded, or from text embed_text no longer produces
+                print(
+                    f"[Engine][WARN] {self.faiss_path.name} was not built from the text the node store now "
+                    "yields; re-run rag_llamaindex/build_index.py. Embedding nodes in memory for this process."
+                )
+            else:
+                # nprobe / efSearch are not stored in the index file: re-apply them from the sidecar
+                spec = load_spec(self.faiss_path)
+                set_search_params(index, spec)
+                print(f"[Engine] Loaded FAISS index ({index.ntotal} vectors, {spec}) from {self.faiss_path}")
+                return index
+        else:
+            print(f"[Engine][WARN] {self.faiss_path} not found; embedding nodes in memory.")
+
+        vecs = self.embed_model.get_text_embedding_batch(texts)
+        vecs = np.asarray(vecs, dtype="float32")
+        index = faiss.IndexFlatIP(vecs.shape[1])
+        index.add(vecs)
+        return index
+
+    def retrieve_bm25(self, question: str) -> List[NodeWithScore]:
+        with span("bm25"):
+            return self.bm25.retrieve(question)
+
+    def retrieve_dense(self, question: str) -> List[NodeWithScore]:
+        dense = self.dense  # first use loads FAISS + embedder outside the span
+        with span("dense"):
+            return dense.retrieve(question)
+
+    def retrieve_both(self, question: str) -> Tuple[List[NodeWithScore], List[NodeWithScore]]:
+        """
+        BM25 and dense retrieval side by side: the query embedding (torch) and
+        the FAISS search release the GIL, so they overlap with BM25 tokenizing
+        and scoring on the calling thread.
+        """
+        # copy_context: the dense span lands in the caller's per-request timings
+        dense_future = _pool.submit(contextvars.copy_context().run, self.retrieve_dense, question)
+        bm25_hits = self.retrieve_bm25(question)
+        return bm25_hits, dense_future.result()
+
+    def retrieve_hybrid(self, question: str, method: str = FUSION_METHOD) -> List[NodeWithScore]:
+        """Concurrent BM25 + dense retrieval, fused with `method` (best first)."""
+        hit_lists = self.retrieve_both(question)
+        with span("fusion"):
+            return fuse_hits(hit_lists, method=method)
+
+
+# Shared by every engine in the process; sized for the dense leg of a few concurrent requests
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("ASKIMMI_RETRIEVAL_THREADS", "4")), thread_name_prefix="retrieval")
+
+
+_engine: Optional[RetrievalEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RetrievalEngine:
+    """Process-wide RetrievalEngine, created on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RetrievalEngine()
+    return _engine
@@ -0,0 +1,189 @@
+"""
+FAISS index types for the dense side (all inner product over normalized vectors).
+
+    flat       exact brute force (default); cost grows linearly with the corpus
+    ivf_flat   inverted lists: search `nprobe` of `nlist` k-means cells
+    ivf_pq     IVF + product quantization (`pq_m` sub-vectors x `nbits`): ~d*4/pq_m x smaller
+    hnsw       graph search (`hnsw_m` links per node, `ef_construction`, `ef_search`)
+
+A spec is written as "kind:key=value,...", e.g.
+
+    ivf_flat:nlist=256,nprobe=16
+    ivf_pq:nlist=256,pq_m=48,nbits=8,nprobe=32
+    hnsw:hnsw_m=32,ef_construction=200,ef_search=64
+
+build_index.py reads it from ASKIMMI_FAISS_INDEX and records it in a sidecar
+(faiss_llamaindex.meta.json) next to the index. At load time the engine
+re-applies the recorded search parameters; ASKIMMI_FAISS_NPROBE and
+ASKIMMI_FAISS_EF_SEARCH override them without a rebuild.
+
+With `ids`, the index is wrapped in an IndexIDMap2 so vectors carry stable
+ids (see rag_llamaindex/manifest.py) and can be removed for incremental
+builds; flat and IVF support removal, HNSW only additions.
+
+Training sizes are clipped to the corpus: k-means wants ~39 points per
+centroid, so nlist <= n/39 and 2**nbits <= n/39 (with a printed note).
+scripts/sweep_faiss.py measures recall@k vs flat and latency per setting.
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import faiss
+import numpy as np
+
+KINDS = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+MIN_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexSpec:
+    kind: str = "flat"
+    nlist: int = 256
+    nprobe: int = 16
+    pq_m: int = 48
+    nbits: int = 8
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Unknown FAISS index kind {self.kind!r}; choose from {', '.join(KINDS)}.")
+
+    @classmethod
+    def parse(cls, text: str) -> "IndexSpec":
+        """'ivf_pq:nlist=256,pq_m=48' -> IndexSpec (unspecified fields keep their defaults)."""
+        kind, _, params = text.strip().partition(":")
+        known = {f.name for f in fields(cls)} - {"kind"}
+        values: Dict[str, int] = {}
+        for item in filter(None, (p.strip() for p in params.split(","))):
+            key, _, value = item.partition("=")
+            if key not in known:
+                raise ValueError(f"Unknown FAISS index parameter {key!r} in {text!r}.")
+            values[key] = int(value)
+        return cls(kind=kind or "flat", **values)
+
+    def __str__(self) -> str:
+        keys = {
+            "flat": (),
+            "ivf_flat": ("nlist", "nprobe"),
+            "ivf_pq": ("nlist", "pq_m", "nbits", "nprobe"),
+            "hnsw": ("hnsw_m", "ef_construction", "ef_search"),
+        }[self.kind]
+        params = ",".join(f"{k}={getattr(self, k)}" for k in keys)
+        return f"{self.kind}:{params}" if params else self.kind
+
+
+def spec_from_env() -> IndexSpec:
+    return IndexSpec.parse(os.getenv("ASKIMMI_FAISS_INDEX", "flat"))
+
+
+def _fit_to_corpus(spec: IndexSpec, n: int, d: int) -> IndexSpec:
+    """Shrink training-dependent sizes so k-means has enough points; returns the spec actually built."""
+    spec = IndexSpec(**asdict(spec))
+    max_centroids = max(1, n // MIN_POINTS_PER_CENTROID)
+    if spec.kind in ("ivf_flat", "ivf_pq") and spec.nlist > max_centroids:
+        print(f"[FAISS] nlist {spec.nlist} -> {max_centroids} for {n} vectors")
+        spec.nlist = max_centroids
+    if spec.kind == "ivf_pq":
+        if d % spec.pq_m:
+            raise ValueError(f"pq_m={spec.pq_m} must divide the embedding dimension {d}.")
+        max_bits = max(4, min(16, int(math.log2(max_centroids))))
+        if spec.nbits > max_bits:
+            print(f"[FAISS] nbits {spec.nbits} -> {max_bits} for {n} vectors")
+            spec.nbits = max_bits
+    spec.nprobe = min(spec.nprobe, spec.nlist)
+    return spec
+
+
+def build(vecs: np.ndarray, spec: IndexSpec, ids: Optional[np.ndarray] = None) -> "tuple[faiss.Index, IndexSpec]":
+    """Train (if needed) and fill an index with `vecs`; row i <-> vecs[i], or id ids[i] when given."""
+    vecs = np.ascontiguousarray(vecs, dtype="float32")
+    n, d = vecs.shape
+    spec = _fit_to_corpus(spec, n, d)
+    if spec.kind == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif spec.kind == "hnsw":
+        index = faiss.IndexHNSWFlat(d, spec.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = spec.ef_construction
+    else:
+        quantizer = faiss.IndexFlatIP(d)
+        if spec.kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, spec.nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, spec.nlist, spec.pq_m, spec.nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(vecs)
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vecs, np.asarray(ids, dtype="int64"))
+    else:
+        index.add(vecs)
+    set_search_params(index, spec)
+    return index, spec
+
+
+def base_index(index: faiss.Index) -> faiss.Index:
+    """The index inside an IndexIDMap / IndexIDMap2 wrapper (or `index` itself)."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    return isinstance(index, faiss.IndexIDMap) and not isinstance(base_index(index), faiss.IndexHNSW)
+
+
+def set_search_params(index: faiss.Index, spec: IndexSpec) -> None:
+    """Apply query-time knobs (nprobe / efSearch); no-op for flat."""
+    if spec.kind in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(base_index(index)).nprobe = spec.nprobe
+    elif spec.kind == "hnsw":
+        base_index(index).hnsw.efSearch = spec.ef_search
+
+
+# ---------- Metadata sidecar ----------
+def meta_path(index_path: Path) -> Path:
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.stem + ".meta.json")
+
+
+def write_meta(index_path: Path, index: faiss.Index, spec: IndexSpec, **extra: Any) -> Path:
+    path = meta_path(index_path)
+    meta = {
+        "spec": str(spec),
+        "params": asdict(spec),
+        "ntotal": int(index.ntotal),
+        "dim": int(index.d),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **extra,
+    }
+    path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return path
+
+
+def read_meta(index_path: Path) -> Optional[Dict[str, Any]]:
+    path = meta_path(index_path)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def load_spec(index_path: Path) -> IndexSpec:
+    """Spec recorded at build time (flat if there is no sidecar), with env overrides for search params."""
+    meta = read_meta(index_path)
+    spec = IndexSpec(**meta["params"]) if meta and "params" in meta else IndexSpec()
+    if os.getenv("ASKIMMI_FAISS_NPROBE"):
+        spec.nprobe = int(os.environ["ASKIMMI_FAISS_NPROBE"])
+    if os.getenv("ASKIMMI_FAISS_EF_SEARCH"):
+        spec.ef_search = int(os.environ["ASKIMMI_FAISS_EF_SEARCH"])
+    return spec
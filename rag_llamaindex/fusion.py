@@ -0,0 +1,121 @@
+"""
+Rank fusion for hybrid retrieval.
+
+BM25 scores are unbounded sums of IDF weights while dense scores are cosine
+similarities, so adding them raw lets BM25 dominate. Every method here first
+puts each result list on a common scale, then sums per key:
+
+    rrf     1 / (rrf_k + rank)             rank-only, scale-free
+    minmax  (s - min) / (max - min)        per list, into [0, 1]
+    zscore  (s - mean) / std               per list; keys missing from a
+                                           list get that list's lowest z
+
+Keys are whatever identifies a result (node ids in query.py, URLs in
+scripts/eval_retrievers.py). New methods can be added with `register`.
+"""
+from __future__ import annotations
+
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from llama_index.core.schema import NodeWithScore
+
+Ranked = Sequence[Tuple[Hashable, float]]  # (key, score), best first
+Normalizer = Callable[[np.ndarray], Tuple[np.ndarray, float]]  # scores -> (normalized, missing value)
+
+RRF_K = 60
+DEFAULT_METHOD = "rrf"
+
+
+def _rrf(scores: np.ndarray, rrf_k: int = RRF_K) -> Tuple[np.ndarray, float]:
+    return 1.0 / (rrf_k + np.arange(1, len(scores) + 1)), 0.0
+
+
+def _minmax(scores: np.ndarray) -> Tuple[np.ndarray, float]:
+    lo, hi = scores.min(), scores.max()
+    if hi - lo <= 1e-12:
+        return np.ones_like(scores), 0.0
+    return (scores - lo) / (hi - lo), 0.0
+
+
+def _zscore(scores: np.ndarray) -> Tuple[np.ndarray, float]:
+    std = scores.std()
+    if std <= 1e-12:
+        return np.zeros_like(scores), 0.0
+    z = (scores - scores.mean()) / std
+    return z, float(z.min())
+
+
+METHODS: Dict[str, Normalizer] = {
+    "rrf": _rrf,
+    "minmax": _minmax,
+    "zscore": _zscore,
+}
+
+
+def register(name: str, normalizer: Normalizer) -> None:
+    """Add a fusion method: `normalizer(scores) -> (normalized scores, value for missing keys)`."""
+    METHODS[name] = normalizer
+
+
+def fuse(
+    ranked_lists: Sequence[Ranked],
+    method: str = DEFAULT_METHOD,
+    weights: Optional[Sequence[float]] = None,
+) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse several best-first (key, score) lists into one, best first.
+
+    A key repeated within one list only counts at its best position.
+    `weights` scales each list's contribution (default 1.0 each).
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}; choose from {sorted(METHODS)}.")
+    normalize = METHODS[method]
+    weights = list(weights) if weights is not None else [1.0] * len(ranked_lists)
+
+    per_list: List[Tuple[Dict[Hashable, float], float, float]] = []
+    for ranked, w in zip(ranked_lists, weights):
+        keys: List[Hashable] = []
+        raw: List[float] = []
+        seen = set()
+        for key, score in ranked:
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+                raw.append(float(score))
+        if not keys:
+            continue
+        norm, missing = normalize(np.asarray(raw, dtype="float64"))
+        per_list.append((dict(zip(keys, norm.tolist())), missing, w))
+
+    order: Dict[Hashable, None] = {}
+    for ranked in ranked_lists:
+        for key, _ in ranked:
+            order.setdefault(key, None)
+
+    fused = {
+        key: sum(w * scores.get(key, missing) for scores, missing, w in per_list)
+        for key in order
+    }
+    # sorted() is stable: ties keep first-seen order (BM25 list first)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def fuse_hits(
+    hit_lists: Sequence[Sequence[NodeWithScore]],
+    method: str = DEFAULT_METHOD,
+    weights: Optional[Sequence[float]] = None,
+) -> List[NodeWithScore]:
+    """`fuse` over retriever outputs, keyed by node id; returns NodeWithScore with fused scores."""
+    nodes = {}
+    for hits in hit_lists:
+        for h in hits:
+            nodes.setdefault(h.node.node_id, h.node)
+    fused = fuse(
+        [[(h.node.node_id, h.score or 0.0) for h in hits] for hits in hit_lists],
+        method=method,
+        weights=weights,
+    )
+    return [NodeWithScore(node=nodes[key], score=score) for key, score in fused]
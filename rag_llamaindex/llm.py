@@ -0,0 +1,484 @@
+"""
+LLM client: one async interface in front of interchangeable backends.
+
+    client = get_llm()
+    text = await client.agenerate(prompt)          # one shot
+    async for piece in client.astream(prompt):     # streamed
+        ...
+    text = client.generate(prompt)                 # sync callers (CLI, worker threads)
+
+Every call gets
+  - a deadline (ASKIMMI_LLM_TIMEOUT_S) covering retries and backoff,
+  - bounded concurrency (ASKIMMI_LLM_MAX_CONCURRENCY in flight per event loop;
+    sync callers all share one background loop),
+  - retries on transient failures (timeouts, 429/5xx) with full-jitter
+    exponential backoff (ASKIMMI_LLM_RETRIES),
+  - optional hedging: a second attempt starts if the first has not
+    answered after ASKIMMI_LLM_HEDGE_MS, first one back wins,
+  - latency / token / error metrics (LLMClient.metrics).
+
+Backends (ASKIMMI_LLM_BACKEND):
+  gemini   google-generativeai, needs GEMINI_API_KEY (checked on first call)
+  stub     deterministic, offline: echoes the first context sentences; for
+           load tests and CI (ASKIMMI_STUB_LATENCY_MS simulates latency)
+  local    flan-t5 on CPU, no network (rag_llamaindex/local_llm.py)
+More can be added with `register`.
+
+ASKIMMI_LLM_FALLBACK=local switches to another backend for a call when the
+primary fails or has not answered within ASKIMMI_LLM_FALLBACK_AFTER_S.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from rag_llamaindex.metrics import CallbackGauge
+
+LLM_BACKEND = os.getenv("ASKIMMI_LLM_BACKEND", "gemini")
+LLM_TIMEOUT_S = float(os.getenv("ASKIMMI_LLM_TIMEOUT_S", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("ASKIMMI_LLM_MAX_CONCURRENCY", "16"))
+LLM_RETRIES = int(os.getenv("ASKIMMI_LLM_RETRIES", "2"))
+LLM_BACKOFF_S = float(os.getenv("ASKIMMI_LLM_BACKOFF_S", "0.5"))
+LLM_HEDGE_MS = float(os.getenv("ASKIMMI_LLM_HEDGE_MS", "0"))  # 0 = no hedging
+STUB_LATENCY_MS = float(os.getenv("ASKIMMI_STUB_LATENCY_MS", "0"))
+LLM_FALLBACK = os.getenv("ASKIMMI_LLM_FALLBACK", "")
+LLM_FALLBACK_AFTER_S = float(os.getenv("ASKIMMI_LLM_FALLBACK_AFTER_S", "8"))
+
+# google.api_core exception names worth retrying (matched by name: no hard import)
+_TRANSIENT_NAMES = {
+    "ServiceUnavailable",
+    "ResourceExhausted",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "TooManyRequests",
+    "GatewayTimeout",
+    "BadGateway",
+}
+
+
+def is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)) or type(exc).__name__ in _TRANSIENT_NAMES
+
+
+# Per-request flags set by backends (shared dict: visible across copied contexts / tasks)
+_call_flags: ContextVar[Optional[Dict[str, bool]]] = ContextVar("askimmi_llm_call", default=None)
+
+
+@contextmanager
+def track_call() -> Iterator[Dict[str, bool]]:
+    """
+    Flags for the LLM calls made inside the block: "fallback" is True once any
+    of them was answered by the fallback backend instead of the primary.
+    """
+    token = _call_flags.set({"fallback": False})
+    try:
+        yield _call_flags.get()
+    finally:
+        _call_flags.reset(token)
+
+
+def split_prompt(prompt: str) -> Tuple[str, str]:
+    """(context, question) out of a prompt built by query._build_prompt."""
+    head, _, rest = prompt.partition("Context:")
+    context, _, rest = (rest or head).partition("User question:")
+    question = rest.strip().split("\n\n", 1)[0].strip()
+    return context.strip(), question
+
+
+# ---------- Backends ----------
+class LLMBackend:
+    """A backend returns (text, prompt_tokens, output_tokens) and can stream text pieces."""
+
+    name = "base"
+    # Answers worth keeping across runs (persisted by the semantic answer cache)
+    persistent = True
+
+    @property
+    def identity(self) -> str:
+        """Backend + model: what produced an answer (part of the answer cache version)."""
+        model = getattr(self, "model_name", None)
+        return f"{self.name}:{model}" if model else self.name
+
+    def warmup(self) -> None:
+        """Create clients / check credentials up front (called by models.warmup)."""
+
+    async def generate(self, prompt: str) -> Tuple[str, int, int]:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        text, _, _ = await self.generate(prompt)
+        yield text
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model_name: Optional[str] = None):
+        from rag_llamaindex.models import GEMINI_MODEL_NAME
+
+        self.model_name = model_name or GEMINI_MODEL_NAME
+
+    def _model(self):
+        from rag_llamaindex.models import get_gemini
+
+        return get_gemini(self.model_name)
+
+    def warmup(self) -> None:
+        self._model()
+
+    @staticmethod
+    def _usage(resp) -> Tuple[int, int]:
+        usage = getattr(resp, "usage_metadata", None)
+        return (
+            int(getattr(usage, "prompt_token_count", 0) or 0),
+            int(getattr(usage, "candidates_token_count", 0) or 0),
+        )
+
+    async def generate(self, prompt: str) -> Tuple[str, int, int]:
+        resp = await self._model().generate_content_async(prompt)
+        return (resp.text or "").strip(), *self._usage(resp)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        resp = await self._model().generate_content_async(prompt, stream=True)
+        async for chunk in resp:
+            try:
+                text = chunk.text
+            except ValueError:  # chunk without text parts (e.g. finish / safety metadata)
+                continue
+            if text:
+                yield text
+
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic offline stand-in: answers with the first sentences of the
+    prompt's context section, so NLI and the UI see plausible, grounded text.
+    """
+
+    name = "stub"
+    persistent = False
+    _SENT = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS, sentences: int = 2):
+        self.latency = latency_ms / 1000.0
+        self.sentences = sentences
+
+    def _answer(self, prompt: str) -> str:
+        context, _ = split_prompt(prompt)
+        sents = [s.strip() for s in self._SENT.split(context) if s.strip()][: self.sentences]
+        return " ".join(sents) if sents else "I cannot answer with certainty from the provided context."
+
+    async def generate(self, prompt: str) -> Tuple[str, int, int]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._answer(prompt)
+        return text, len(prompt.split()), len(text.split())
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        words = self._answer(prompt).split(" ")
+        step = max(1, len(words) // 8)
+        for i in range(0, len(words), step):
+            if self.latency:
+                await asyncio.sleep(self.latency / 8)
+            yield (" " if i else "") + " ".join(words[i:i + step])
+
+
+class FallbackBackend(LLMBackend):
+    """`primary`, or `secondary` when primary errors or is slower than `after_s` (to answer / to first piece)."""
+
+    def __init__(self, primary: LLMBackend, secondary: LLMBackend, after_s: float = LLM_FALLBACK_AFTER_S):
+        self.primary = primary
+        self.secondary = secondary
+        self.after_s = after_s
+        self.name = f"{primary.name}+{secondary.name}"
+        self.fallbacks = 0
+        self.persistent = primary.persistent
+
+    @property
+    def identity(self) -> str:
+        # Answers are attributed to the primary; fallback answers are flagged per call (track_call)
+        return self.primary.identity
+
+    def warmup(self) -> None:
+        self.primary.warmup()
+        self.secondary.warmup()
+
+    def _fell_back(self, e: BaseException) -> None:
+        self.fallbacks += 1
+        flags = _call_flags.get()
+        if flags is not None:
+            flags["fallback"] = True
+        print(f"[LLM][WARN] {self.primary.name} failed ({type(e).__name__}: {e}); using {self.secondary.name}")
+
+    async def generate(self, prompt: str) -> Tuple[str, int, int]:
+        try:
+            return await asyncio.wait_for(self.primary.generate(prompt), self.after_s)
+        except Exception as e:
+            self._fell_back(e)
+            return await self.secondary.generate(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        pieces = self.primary.stream(prompt)
+        try:
+            first = await asyncio.wait_for(pieces.__anext__(), self.after_s)
+        except StopAsyncIteration:
+            return
+        except Exception as e:
+            await pieces.aclose()
+            self._fell_back(e)
+            async for piece in self.secondary.stream(prompt):
+                yield piece
+            return
+        yield first
+        async for piece in pieces:
+            yield piece
+
+
+def _local_backend() -> LLMBackend:
+    # torch / transformers only load when this backend is selected
+    from rag_llamaindex.local_llm import LocalT5Backend
+
+    return LocalT5Backend()
+
+
+BACKENDS: Dict[str, Callable[[], LLMBackend]] = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+    "local": _local_backend,
+}
+
+
+def register(name: str, factory: Callable[[], LLMBackend]) -> None:
+    """Add a backend selectable with ASKIMMI_LLM_BACKEND=name."""
+    BACKENDS[name] = factory
+
+
+# ---------- Metrics ----------
+class LLMMetrics:
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, prompt_tokens: int = 0, output_tokens: int = 0) -> None:
+        with self._lock:
+            self.calls += 1
+            self.latencies.append(seconds)
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            lat = sorted(self.latencies)
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0  # noqa: E731
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "p50_s": pct(0.50),
+            "p95_s": pct(0.95),
+        }
+
+
+# ---------- Client ----------
+class LLMClient:
+    def __init__(
+        self,
+        backend: LLMBackend,
+        timeout_s: float = LLM_TIMEOUT_S,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        retries: int = LLM_RETRIES,
+        backoff_s: float = LLM_BACKOFF_S,
+        hedge_ms: float = LLM_HEDGE_MS,
+    ):
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.hedge_s = hedge_ms / 1000.0
+        self.metrics = LLMMetrics()
+        # asyncio semaphores belong to one loop: one per loop that calls us
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    async def _backoff(self, attempt: int, deadline: float) -> None:
+        delay = random.uniform(0, self.backoff_s * (2 ** attempt))  # full jitter
+        await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    async def _attempt(self, prompt: str, remaining: float) -> Tuple[str, int, int]:
+        """One attempt, hedged with a second identical request if it is slow."""
+        first = asyncio.ensure_future(self.backend.generate(prompt))
+        if not self.hedge_s or remaining <= self.hedge_s:
+            return await asyncio.wait_for(first, remaining)
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_s)
+        if done:
+            return first.result()
+        self.metrics.count("hedges")
+        second = asyncio.ensure_future(self.backend.generate(prompt))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining - self.hedge_s, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise done.pop().exception()
+        finally:
+            for task in (first, second):
+                task.cancel()
+
+    async def agenerate(self, prompt: str, timeout_s: Optional[float] = None) -> str:
+        deadline = time.monotonic() + (timeout_s or self.timeout_s)
+        async with self._semaphore():
+            for attempt in range(self.retries + 1):
+                t0 = time.monotonic()
+                try:
+                    text, p_tok, o_tok = await self._attempt(prompt, max(0.01, deadline - t0))
+                    self.metrics.record(time.monotonic() - t0, p_tok, o_tok)
+                    return text
+                except Exception as e:
+                    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                        self.metrics.count("timeouts")
+                    if attempt == self.retries or not is_transient(e) or time.monotonic() >= deadline:
+                        self.metrics.count("errors")
+                        raise
+                    self.metrics.count("retries")
+                    await self._backoff(attempt, deadline)
+        raise RuntimeError("unreachable")
+
+    async def astream(self, prompt: str, timeout_s: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream text pieces. Retries only happen before the first piece (nothing
+        has reached the caller yet); the deadline covers the whole stream.
+        """
+        deadline = time.monotonic() + (timeout_s or self.timeout_s)
+        async with self._semaphore():
+            for attempt in range(self.retries + 1):
+                t0 = time.monotonic()
+                pieces = self.backend.stream(prompt)
+                try:
+                    first = await asyncio.wait_for(pieces.__anext__(), max(0.01, deadline - t0))
+                except StopAsyncIteration:
+                    self.metrics.record(time.monotonic() - t0)
+                    return
+                except Exception as e:
+                    await pieces.aclose()
+                    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                        self.metrics.count("timeouts")
+                    if attempt == self.retries or not is_transient(e) or time.monotonic() >= deadline:
+                        self.metrics.count("errors")
+                        raise
+                    self.metrics.count("retries")
+                    await self._backoff(attempt, deadline)
+                    continue
+
+                n_words = len(first.split())
+                yield first
+                try:
+                    while True:
+                        try:
+                            piece = await asyncio.wait_for(pieces.__anext__(), max(0.01, deadline - time.monotonic()))
+                        except StopAsyncIteration:
+                            break
+                        n_words += len(piece.split())
+                        yield piece
+                except Exception as e:
+                    if isinstance(e, (asyncio.TimeoutError, TimeoutError)):
+                        self.metrics.count("timeouts")
+                    self.metrics.count("errors")
+                    raise
+                finally:
+                    await pieces.aclose()
+                # Streams do not report usage per chunk: count output words
+                self.metrics.record(time.monotonic() - t0, len(prompt.split()), n_words)
+                return
+
+    def generate(self, prompt: str, timeout_s: Optional[float] = None) -> str:
+        """
+        Blocking `agenerate` for sync callers (must not be called from a running loop).
+        Every sync caller shares one background loop, so the concurrency limit
+        holds across threads and loop-bound clients (Gemini's grpc aio) stay valid.
+        """
+        # Scheduled from this thread, so the task runs in a copy of the caller's context
+        return asyncio.run_coroutine_threadsafe(self.agenerate(prompt, timeout_s), _sync_loop()).result()
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _sync_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop on a daemon thread, for LLMClient.generate."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def _llm_totals() -> Dict[Tuple[str, ...], float]:
+    if _client is None:
+        return {}
+    snap = _client.metrics.snapshot()
+    return {(k,): snap[k] for k in ("calls", "errors", "retries", "timeouts", "hedges", "prompt_tokens", "output_tokens")}
+
+
+CallbackGauge("askimmi_llm_events_total", "LLM client calls, failures and tokens.", _llm_totals, ["event"], kind="counter")
+
+
+def get_llm() -> LLMClient:
+    """Process-wide client for ASKIMMI_LLM_BACKEND."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                for name in filter(None, (LLM_BACKEND, LLM_FALLBACK)):
+                    if name not in BACKENDS:
+                        raise ValueError(f"Unknown LLM backend {name!r}; choose from {sorted(BACKENDS)}.")
+                backend = BACKENDS[LLM_BACKEND]()
+                if LLM_FALLBACK and LLM_FALLBACK != LLM_BACKEND:
+                    backend = FallbackBackend(backend, BACKENDS[LLM_FALLBACK]())
+                _client = LLMClient(backend)
+                print(f"[LLM] Using {backend.name} backend")
+    return _client
@@ -0,0 +1,134 @@
+"""
+Local answer generation with flan-t5 (settings.GEN_NAME via get_hf_llm).
+
+Zero network, CPU only, predictable latency: for air-gapped deployments or
+as ASKIMMI_LLM_FALLBACK=local behind the hosted model.
+
+  - Context packing: flan-t5 sees 512 input tokens. The instruction and the
+    question are always kept; reranked chunks are added best-first,
+    sentence by sentence, until the token budget is spent.
+  - Batching: concurrent requests share one `generate` call through a
+    MicroBatcher (prompts length-sorted, padded together).
+  - Decoding: greedy by default, beam search with ASKIMMI_LOCAL_NUM_BEAMS > 1.
+  - Linear layers get torch dynamic int8 quantization on CPU by default;
+    ASKIMMI_LOCAL_QUANTIZE=0 keeps them fp32.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from rag_llamaindex.batching import MicroBatcher
+from rag_llamaindex.llm import LLMBackend, split_prompt
+from rag_llamaindex.settings import GEN_NAME, get_hf_llm
+
+LOCAL_MAX_INPUT = int(os.getenv("ASKIMMI_LOCAL_MAX_INPUT", "512"))
+LOCAL_MAX_NEW_TOKENS = int(os.getenv("ASKIMMI_LOCAL_MAX_NEW_TOKENS", "192"))
+LOCAL_NUM_BEAMS = int(os.getenv("ASKIMMI_LOCAL_NUM_BEAMS", "1"))  # 1 = greedy
+LOCAL_QUANTIZE = os.getenv("ASKIMMI_LOCAL_QUANTIZE", "1") != "0"
+LOCAL_MAX_BATCH = int(os.getenv("ASKIMMI_LOCAL_MAX_BATCH", "8"))
+LOCAL_MAX_WAIT_MS = float(os.getenv("ASKIMMI_LOCAL_WAIT_MS", "10"))
+
+INSTRUCTION = (
+    "Answer the question using only the context from official U.S. government sources. "
+    "If the context does not contain the answer, say you cannot answer with certainty."
+)
+
+_SENT = re.compile(r"(?<=[.!?])\s+")
+
+
+class LocalT5Backend(LLMBackend):
+    name = "local"
+
+    def __init__(
+        self,
+        model_name: str = GEN_NAME,
+        max_input: int = LOCAL_MAX_INPUT,
+        max_new_tokens: int = LOCAL_MAX_NEW_TOKENS,
+        num_beams: int = LOCAL_NUM_BEAMS,
+        quantize: bool = LOCAL_QUANTIZE,
+    ):
+        self.model_name = model_name
+        self.max_input = max_input
+        self.max_new_tokens = max_new_tokens
+        self.num_beams = num_beams
+        self.quantize = quantize
+        self._tok = None
+        self._model = None
+        self._batcher: Optional[MicroBatcher] = None
+        self._lock = threading.Lock()
+
+    # ---------- model ----------
+    def warmup(self) -> None:
+        with self._lock:
+            if self._model is not None:
+                return
+            import torch
+
+            tok, model = get_hf_llm()
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self._tok, self._model = tok, model
+            self._batcher = MicroBatcher(
+                self._generate_batch,
+                max_batch=LOCAL_MAX_BATCH,
+                max_wait_ms=LOCAL_MAX_WAIT_MS,
+                length=len,
+                name=f"generate[{self.model_name}]",
+            )
+            print(f"[LLM] Loaded {self.model_name} (int8={self.quantize}, beams={self.num_beams})")
+
+    def _generate_batch(self, prompts: List[str]) -> List[Tuple[str, int, int]]:
+        import torch
+
+        enc = self._tok(prompts, padding=True, truncation=True, max_length=self.max_input, return_tensors="pt")
+        with torch.inference_mode():
+            out = self._model.generate(
+                **enc,
+                max_new_tokens=self.max_new_tokens,
+                num_beams=self.num_beams,
+                do_sample=False,
+                early_stopping=self.num_beams > 1,
+            )
+        texts = self._tok.batch_decode(out, skip_special_tokens=True)
+        in_lens = enc["attention_mask"].sum(dim=1).tolist()
+        out_lens = (out != self._tok.pad_token_id).sum(dim=1).tolist()
+        return [(t.strip(), int(i), int(o)) for t, i, o in zip(texts, in_lens, out_lens)]
+
+    # ---------- context packing ----------
+    def _n_tokens(self, text: str) -> int:
+        return len(self._tok(text, add_special_tokens=False)["input_ids"])
+
+    def pack(self, context: str, question: str) -> str:
+        """flan-t5 prompt that fits max_input: instruction + question always, then as much context as fits."""
+        head = f"{INSTRUCTION}\n\nQuestion: {question}\n\nContext:"
+        tail = "\n\nAnswer:"
+        budget = self.max_input - self._n_tokens(head + tail) - 1  # </s>
+        picked: List[str] = []
+        for chunk in context.split("\n\n"):  # chunks arrive best-first
+            sents = [s for s in _SENT.split(chunk.strip()) if s]
+            kept: List[str] = []
+            for s in sents:
+                cost = self._n_tokens(" " + s)
+                if cost > budget:
+                    break
+                kept.append(s)
+                budget -= cost
+            if kept:
+                picked.append(" ".join(kept))
+            if len(kept) < len(sents):
+                break
+        return head + " " + "\n".join(picked) + tail
+
+    # ---------- LLMBackend ----------
+    async def generate(self, prompt: str) -> Tuple[str, int, int]:
+        if self._model is None:
+            await asyncio.to_thread(self.warmup)
+        context, question = split_prompt(prompt)
+        packed = await asyncio.to_thread(self.pack, context, question)
+        outputs = await asyncio.wrap_future(self._batcher.submit([packed]))
+        return outputs[0]
@@ -0,0 +1,105 @@
+"""
+Build manifests: which chunks the current artifacts were built from.
+
+    artifacts/manifests/manifest-00007.json
+    {
+      "version": 7, "previous": 6, "created": "...",
+      "embed_model": "...", "faiss_spec": "flat",
+      "next_vid": 1420,
+      "chunks": {"<chunk_id>": {"hash": "<sha1 of embed text>", "vid": 17}, ...},
+      "changes": {"added": 3, "changed": 1, "removed": 2, "unchanged": 759}
+    }
+
+`vid` is the chunk's stable FAISS id (IndexIDMap2). A chunk keeps its vid
+while its text is unchanged, so an incremental build only removes the vids
+of changed / deleted chunks and adds vectors for new / changed ones.
+The hash covers `embed_text(node)`, i.e. exactly what is embedded and
+BM25-tokenized: text plus stable metadata (volatile keys such as
+`last_seen` are excluded, engine.VOLATILE_METADATA_KEYS).
+
+Each build writes a new version; the last ASKIMMI_MANIFEST_KEEP are kept.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from rag_llamaindex.engine import ARTIFACTS_DIR
+
+MANIFEST_DIR = ARTIFACTS_DIR / "manifests"
+MANIFEST_KEEP = int(os.getenv("ASKIMMI_MANIFEST_KEEP", "10"))
+_NAME = re.compile(r"manifest-(\d+)\.json$")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Diff:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    def counts(self) -> Dict[str, int]:
+        return {k: len(getattr(self, k)) for k in ("added", "changed", "removed", "unchanged")}
+
+
+def diff(previous: Dict[str, Dict[str, Any]], current: Dict[str, str]) -> Diff:
+    """previous: manifest chunks {id: {"hash", "vid"}}; current: {id: hash}."""
+    d = Diff()
+    for cid, h in current.items():
+        old = previous.get(cid)
+        if old is None:
+            d.added.append(cid)
+        elif old["hash"] != h:
+            d.changed.append(cid)
+        else:
+            d.unchanged.append(cid)
+    d.removed = [cid for cid in previous if cid not in current]
+    return d
+
+
+def _versions(root: Path) -> List[int]:
+    if not root.exists():
+        return []
+    return sorted(int(m.group(1)) for p in root.iterdir() if (m := _NAME.match(p.name)))
+
+
+def load_latest(root: Path = MANIFEST_DIR) -> Optional[Dict[str, Any]]:
+    versions = _versions(root)
+    if not versions:
+        return None
+    path = root / f"manifest-{versions[-1]:05d}.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"[Manifest][WARN] Could not read {path} ({e}); treating as a fresh build.")
+        return None
+
+
+def write(manifest: Dict[str, Any], root: Path = MANIFEST_DIR, keep: int = MANIFEST_KEEP) -> Path:
+    """Write the next version (atomically) and prune old ones; returns its path."""
+    root.mkdir(parents=True, exist_ok=True)
+    versions = _versions(root)
+    version = (versions[-1] + 1) if versions else 1
+    manifest = {
+        "version": version,
+        "previous": versions[-1] if versions else None,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **manifest,
+    }
+    path = root / f"manifest-{version:05d}.json"
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+    for old in (versions + [version])[:-keep] if keep > 0 else []:
+        (root / f"manifest-{old:05d}.json").unlink(missing_ok=True)
+    return path
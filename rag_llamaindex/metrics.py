@@ -0,0 +1,181 @@
+"""
+Dependency-free metrics with Prometheus text exposition.
+
+    with span("rerank"):            # stage latency histogram + error counter
+        ...
+    with collect_timings() as t:    # per-request breakdown, {stage: ms}
+        answer = query(q)
+
+Metric types: Counter, Histogram and CallbackGauge (value read at scrape
+time, e.g. stage queue depth or cache sizes). `render()` returns the text
+format served at GET /metrics.
+
+Spans record into the request's timing dict through a ContextVar; code
+that hands work to other threads must copy the context
+(`contextvars.copy_context().run`) for the breakdown to include it.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+LabelValues = Tuple[str, ...]
+
+_registry: List["_Metric"] = []
+_registry_lock = threading.Lock()
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(head + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}  # counts per bucket (+Inf last), [sum]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[idx] += 1
+            total[0] += value
+
+    def samples(self) -> List[str]:
+        out: List[str] = []
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _fmt_labels(self.labelnames, key, 'le="' + le + '"')
+                out.append(f"{self.name}_bucket{labels} {cumulative}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return out
+
+
+class CallbackGauge(_Metric):
+    """
+    Values read from `fn() -> {label values tuple: value}` at scrape time.
+    `kind="counter"` exposes running totals kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Dict[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:  # a broken callback must not take /metrics down
+            return []
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {float(v)}" for k, v in values.items()]
+
+
+def render() -> str:
+    with _registry_lock:
+        metrics = list(_registry)
+    return "\n".join(m.render() for m in metrics) + "\n"
+
+
+# ---------- Pipeline metrics ----------
+STAGE_SECONDS = Histogram("askimmi_stage_seconds", "Latency of one pipeline stage.", ["stage"])
+STAGE_ERRORS = Counter("askimmi_stage_errors_total", "Exceptions raised inside a pipeline stage.", ["stage"])
+REQUESTS = Counter("askimmi_requests_total", "HTTP requests by path and status code.", ["path", "status"])
+REQUEST_SECONDS = Histogram("askimmi_request_seconds", "HTTP request latency (to response start for streams).", ["path"])
+BATCH_SIZE = Histogram("askimmi_batch_size", "Items per model call in a micro-batcher.", ["batcher"], buckets=SIZE_BUCKETS)
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("askimmi_timings", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the block as `stage`: histogram, error counter, and the current request's breakdown."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + dt * 1000.0
+
+
+@contextmanager
+def collect_timings(timings: Optional[Dict[str, float]] = None) -> Iterator[Dict[str, float]]:
+    """Collect {stage: milliseconds} for spans run in this context (and copies of it)."""
+    timings = {} if timings is None else timings
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
@@ -0,0 +1,167 @@
+"""
+Process-wide model registry.
+
+Every model (embedder, cross-encoders, Gemini client) is loaded at most once
+per process: on first use, or up front via `warmup()`. Nothing heavy is
+imported at module scope, so tools that only need BM25 start instantly.
+
+    from rag_llamaindex.models import get_embedder, get_nli
+    emb = get_embedder()    # bge-small, shared
+    nli = get_nli()         # loaded on first call
+
+ASKIMMI_ONNX switches models to the int8 ONNX Runtime backend (onnx_backend.py).
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from rag_llamaindex.settings import CROSS_ENC, ENCODER_NAME
+
+EMBED_MODEL_NAME = ENCODER_NAME
+RERANK_MODEL = CROSS_ENC
+NLI_MODEL_NAME = "cross-encoder/nli-deberta-v3-base"
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+
+_models: Dict[str, Any] = {}
+_load_seconds: Dict[str, float] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+_ready = threading.Event()
+
+
+def _get(key: str, loader: Callable[[], Any]) -> Any:
+    """Return the cached model for `key`, loading it once (concurrent callers wait for the first)."""
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _models:
+            t0 = time.perf_counter()
+            _models[key] = loader()
+            _load_seconds[key] = time.perf_counter() - t0
+            print(f"[Models] Loaded {key} in {_load_seconds[key]:.1f}s")
+        return _models[key]
+
+
+# ---------- Loaders ----------
+def _onnx(kind: str) -> bool:
+    from rag_llamaindex.onnx_backend import use_onnx
+
+    return use_onnx(kind)
+
+
+def embed_key(model_name: str = EMBED_MODEL_NAME) -> str:
+    """
+    Model + runtime behind get_embedder(model_name). int8 ONNX vectors are not
+    interchangeable with fp32 ones, so indexes and caches are keyed on this.
+    """
+    return model_name + (":onnx" if _onnx("embedder") else "")
+
+
+def get_embedder(model_name: str = EMBED_MODEL_NAME):
+    """
+    HuggingFace embedding model (ONNX Runtime int8 when ASKIMMI_ONNX selects
+    "embedder"); the first one loaded also becomes Settings.embed_model.
+    """
+
+    def load():
+        from llama_index.core import Settings
+
+        if _onnx("embedder"):
+            from rag_llamaindex.onnx_backend import OnnxEmbedding
+
+            model = OnnxEmbedding(model_name)
+        else:
+            from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+            model = HuggingFaceEmbedding(model_name=model_name)
+        if Settings._embed_model is None:
+            Settings.embed_model = model
+        return model
+
+    return _get(f"embed:{model_name}", load)
+
+
+def get_cross_encoder(model_name: str, max_length: Optional[int] = None, kind: str = "reranker"):
+    """sentence-transformers CrossEncoder, or its ONNX stand-in when ASKIMMI_ONNX selects `kind`."""
+    onnx = _onnx(kind)
+
+    def load():
+        if onnx:
+            from rag_llamaindex.onnx_backend import OnnxCrossEncoder
+
+            return OnnxCrossEncoder(model_name, kind=kind, max_length=max_length)
+        from sentence_transformers import CrossEncoder
+
+        return CrossEncoder(model_name, max_length=max_length)
+
+    return _get(f"cross:{model_name}{':onnx' if onnx else ''}", load)
+
+
+def get_nli(model_name: str = NLI_MODEL_NAME):
+    return get_cross_encoder(model_name, kind="nli")
+
+
+def get_gemini(model_name: str = GEMINI_MODEL_NAME):
+    """Configured Gemini GenerativeModel; raises if GEMINI_API_KEY is missing."""
+
+    def load():
+        import google.generativeai as genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "GEMINI_API_KEY environment variable not set. "
+                "Create a Gemini key in Google AI Studio and export GEMINI_API_KEY."
+            )
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(model_name)
+
+    return _get(f"gemini:{model_name}", load)
+
+
+# ---------- Warmup / readiness ----------
+def _default_warmup() -> Dict[str, Callable[[], Any]]:
+    from rag_llamaindex.llm import get_llm
+    from rag_llamaindex.reranker import get_rerank_batcher
+
+    return {
+        "embedder": get_embedder,
+        "reranker": get_rerank_batcher,
+        "nli": get_nli,
+        "llm": lambda: get_llm().backend.warmup(),
+    }
+
+
+def warmup(names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Load the query-time models now instead of on the first request.
+    `names` picks a subset of: embedder, reranker, nli, llm.
+    Returns {name: seconds}; marks the registry ready once everything loaded.
+    """
+    loaders = _default_warmup()
+    selected = list(names) if names is not None else list(loaders)
+    timings: Dict[str, float] = {}
+    for name in selected:
+        if name not in loaders:
+            raise ValueError(f"Unknown model {name!r}; choose from {sorted(loaders)}.")
+        t0 = time.perf_counter()
+        loaders[name]()
+        timings[name] = time.perf_counter() - t0
+    if names is None:
+        _ready.set()
+    return timings
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def loaded() -> Dict[str, float]:
+    """{registry key: load seconds} for every model loaded so far."""
+    return dict(_load_seconds)
@@ -0,0 +1,139 @@
+"""
+Claim-level NLI verification.
+
+Scoring (whole context, whole answer) as one NLI pair silently truncates
+everything past the model's 512-token window and makes DeBERTa run one
+very long sequence. Instead:
+
+  1. split the answer into claims (sentences),
+  2. split each context chunk into overlapping sentence windows that fit
+     the window next to a claim,
+  3. keep the few windows that share the most (IDF-weighted) terms with
+     each claim,
+  4. score every (window, claim) pair in one length-sorted batched
+     forward pass,
+  5. take each claim's best entailment and aggregate over claims.
+"""
+from __future__ import annotations
+
+import math
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from rag_llamaindex.bm25_index import tokenize_query
+
+WINDOW_WORDS = 150      # ~200 DeBERTa tokens, leaves room for the claim
+WINDOWS_PER_CLAIM = 3
+MAX_CLAIMS = 12
+MIN_CLAIM_WORDS = 4
+BATCH_SIZE = 16
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])|\n+")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for s in _SENT_SPLIT.split(text or ""):
+        s = _BULLET.sub("", s).strip()
+        if s:
+            out.append(s)
+    return out
+
+
+def split_claims(answer: str, max_claims: int = MAX_CLAIMS) -> List[str]:
+    """Answer sentences worth checking (very short fragments and headings are dropped)."""
+    claims = [s for s in split_sentences(answer) if len(s.split()) >= MIN_CLAIM_WORDS]
+    return claims[:max_claims]
+
+
+def split_windows(chunks: Sequence[str], window_words: int = WINDOW_WORDS) -> List[str]:
+    """Pack consecutive sentences of each chunk into windows of <= window_words, overlapping by one sentence."""
+    windows: List[str] = []
+    for chunk in chunks:
+        sents = split_sentences(chunk)
+        i = 0
+        while i < len(sents):
+            words = 0
+            j = i
+            while j < len(sents) and (j == i or words + len(sents[j].split()) <= window_words):
+                words += len(sents[j].split())
+                j += 1
+            win = " ".join(sents[i:j])
+            toks = win.split()
+            windows.append(" ".join(toks[:window_words]) if len(toks) > window_words else win)
+            i = j if j - i <= 1 or j >= len(sents) else j - 1
+    return windows
+
+
+def select_windows(claims: Sequence[str], windows: Sequence[str], k: int = WINDOWS_PER_CLAIM) -> List[List[int]]:
+    """For each claim, indices of the k windows sharing the most IDF-weighted terms."""
+    win_terms = [set(tokenize_query(w)) for w in windows]
+    df: Dict[str, int] = {}
+    for terms in win_terms:
+        for t in terms:
+            df[t] = df.get(t, 0) + 1
+    n = len(windows)
+    idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+    picks = []
+    for claim in claims:
+        terms = set(tokenize_query(claim))
+        scores = [sum(idf[t] for t in terms & wt) for wt in win_terms]
+        order = sorted(range(n), key=lambda i: (-scores[i], i))
+        picks.append(order[:k])
+    return picks
+
+
+def entailment_index(model, default: int = 2) -> int:
+    """Position of the 'entailment' logit, read from the model's label map when it has one."""
+    id2label = getattr(getattr(model, "config", None), "id2label", None) or {}
+    for idx, label in id2label.items():
+        if "entail" in str(label).lower():
+            return int(idx)
+    return default
+
+
+def claim_scores(
+    model,
+    answer: str,
+    chunks: Sequence[str],
+    windows_per_claim: int = WINDOWS_PER_CLAIM,
+    window_words: int = WINDOW_WORDS,
+    batch_size: int = BATCH_SIZE,
+) -> List[Tuple[str, float]]:
+    """(claim, best entailment probability over its windows) for each answer claim."""
+    claims = split_claims(answer)
+    windows = split_windows(chunks, window_words)
+    if not claims or not windows:
+        return []
+
+    picks = select_windows(claims, windows, windows_per_claim)
+    pairs: List[Tuple[str, str]] = []
+    owner: List[int] = []
+    for ci, wins in enumerate(picks):
+        for wi in wins:
+            pairs.append((windows[wi], claims[ci]))
+            owner.append(ci)
+
+    # Length-sorted so each padded batch wastes little compute
+    order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+    logits = model.predict([pairs[i] for i in order], batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    logits = np.asarray(logits, dtype="float32").reshape(len(pairs), -1)
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs = exp / exp.sum(axis=1, keepdims=True)
+    entail = probs[:, entailment_index(model)]
+
+    best = np.zeros(len(claims), dtype="float32")
+    for pos, i in enumerate(order):
+        best[owner[i]] = max(best[owner[i]], entail[pos])
+    return list(zip(claims, best.tolist()))
+
+
+def aggregate(scores: Sequence[float], how: str = "mean") -> float:
+    """Collapse per-claim scores: 'mean' (default) or 'min' (every claim must be supported)."""
+    if not scores:
+        return 0.0
+    return float(min(scores) if how == "min" else np.mean(scores))
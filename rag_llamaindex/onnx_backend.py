@@ -0,0 +1,254 @@
+"""
+Optional ONNX Runtime backend for the CPU-bound transformer models.
+
+Each HuggingFace model is exported once to ONNX, quantized to dynamic int8
+(weights int8, activations quantized on the fly), and cached under
+artifacts/onnx/. The wrappers keep the interfaces the rest of the code
+already calls:
+
+    OnnxEmbedding       llama-index BaseEmbedding (get_query_embedding, ...)
+    OnnxCrossEncoder    CrossEncoder.predict(pairs, batch_size=...) + .config
+
+Pick models with ASKIMMI_ONNX=embedder,reranker,nli (or "all"); see
+rag_llamaindex/models.py. scripts/compare_onnx.py checks accuracy and
+latency against the PyTorch models before switching one over.
+
+Requires: onnxruntime (plus torch/transformers for the one-time export).
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from rag_llamaindex.engine import ARTIFACTS_DIR
+
+ONNX_DIR = ARTIFACTS_DIR / "onnx"
+OPSET = 14
+KINDS = ("embedder", "reranker", "nli")
+
+# Which models run on ONNX Runtime, e.g. "embedder,reranker" or "all"
+ONNX_MODELS = os.getenv("ASKIMMI_ONNX", "")
+ONNX_QUANTIZE = os.getenv("ASKIMMI_ONNX_QUANTIZE", "1") != "0"
+ONNX_THREADS = int(os.getenv("ASKIMMI_ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+_export_lock = threading.Lock()
+
+
+def use_onnx(kind: str) -> bool:
+    """True if `kind` (embedder / reranker / nli) is switched to ONNX Runtime."""
+    selected = {k.strip() for k in ONNX_MODELS.split(",") if k.strip()}
+    return "all" in selected or kind in selected
+
+
+def onnx_path(model_name: str, quantize: bool = ONNX_QUANTIZE) -> Path:
+    safe = re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name)
+    return ONNX_DIR / f"{safe}{'.int8' if quantize else ''}.onnx"
+
+
+# ---------- Export ----------
+def export_onnx(model_name: str, kind: str, quantize: bool = ONNX_QUANTIZE, force: bool = False) -> Path:
+    """
+    Export `model_name` to ONNX (dynamic batch + sequence axes) and optionally
+    quantize it to int8. Returns the cached path; a no-op when it exists.
+    """
+    out = onnx_path(model_name, quantize)
+    with _export_lock:
+        if out.exists() and not force:
+            return out
+        import torch
+        from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+        ONNX_DIR.mkdir(parents=True, exist_ok=True)
+        tok = AutoTokenizer.from_pretrained(model_name)
+        loader = AutoModel if kind == "embedder" else AutoModelForSequenceClassification
+        model = loader.from_pretrained(model_name).eval()
+
+        if kind == "embedder":
+            dummy = tok(["a short example sentence"], return_tensors="pt")
+        else:
+            dummy = tok(["a short question"], ["a short passage to score"], return_tensors="pt")
+        names = list(dummy.keys())
+        output = "last_hidden_state" if kind == "embedder" else "logits"
+
+        class _Positional(torch.nn.Module):
+            # torch.onnx.export passes inputs positionally; map them back to kwargs
+            def __init__(self, inner):
+                super().__init__()
+                self.inner = inner
+
+            def forward(self, *tensors):
+                return self.inner(**dict(zip(names, tensors)))[0]
+
+        fp32 = onnx_path(model_name, quantize=False)
+        axes = {n: {0: "batch", 1: "seq"} for n in names}
+        axes[output] = {0: "batch"} if kind != "embedder" else {0: "batch", 1: "seq"}
+        with torch.no_grad():
+            torch.onnx.export(
+                _Positional(model),
+                tuple(dummy[n] for n in names),
+                str(fp32),
+                input_names=names,
+                output_names=[output],
+                dynamic_axes=axes,
+                opset_version=OPSET,
+            )
+        print(f"[ONNX] Exported {model_name} -> {fp32}")
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(str(fp32), str(out), weight_type=QuantType.QInt8)
+            print(f"[ONNX] Quantized int8 -> {out}")
+        return out
+
+
+def _session(path: Path):
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_THREADS:
+        opts.intra_op_num_threads = ONNX_THREADS
+    return ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def _feed(session, encoded) -> dict:
+    wanted = {i.name for i in session.get_inputs()}
+    return {k: np.asarray(v, dtype="int64") for k, v in encoded.items() if k in wanted}
+
+
+# ---------- Cross-encoder ----------
+class OnnxCrossEncoder:
+    """
+    Drop-in for sentence_transformers.CrossEncoder.predict: single-logit
+    models (rerankers) return sigmoid scores, multi-label heads (NLI) return
+    raw logits, as CrossEncoder does by default.
+    """
+
+    def __init__(self, model_name: str, kind: str = "reranker", max_length: Optional[int] = None, quantize: bool = ONNX_QUANTIZE):
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_name = model_name
+        self.config = AutoConfig.from_pretrained(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = max_length or min(self.tokenizer.model_max_length, 512)
+        self.path = export_onnx(model_name, kind, quantize)
+        self.session = _session(self.path)
+
+    def predict(
+        self,
+        pairs: Sequence[Tuple[str, str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        show_progress_bar: bool = False,
+        **_: Any,
+    ):
+        if not pairs:
+            return np.zeros((0,), dtype="float32")
+        outs = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            enc = self.tokenizer(
+                [a for a, _ in batch],
+                [b for _, b in batch],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            outs.append(self.session.run(None, _feed(self.session, enc))[0])
+        logits = np.concatenate(outs).astype("float32")
+        if logits.shape[1] == 1:
+            return 1.0 / (1.0 + np.exp(-logits[:, 0]))
+        return logits
+
+
+# ---------- Embedder ----------
+class OnnxEmbedding(BaseEmbedding):
+    """
+    llama-index embedding backed by ONNX Runtime. Mirrors HuggingFaceEmbedding
+    for sentence-transformers models: same query/text instructions, CLS (BGE)
+    or mean pooling, L2-normalized.
+    """
+
+    max_length: int = 512
+    pooling: str = "cls"
+    normalize: bool = True
+
+    _tokenizer: Any = PrivateAttr()
+    _session: Any = PrivateAttr()
+
+    def __init__(self, model_name: str, quantize: bool = ONNX_QUANTIZE, pooling: Optional[str] = None, **kwargs: Any):
+        super().__init__(
+            model_name=model_name,
+            pooling=pooling or ("cls" if "bge" in model_name.lower() else "mean"),
+            **kwargs,
+        )
+        from transformers import AutoTokenizer
+
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._session = _session(export_onnx(model_name, "embedder", quantize))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vecs = []
+        for start in range(0, len(texts), self.embed_batch_size):
+            enc = self._tokenizer(
+                texts[start:start + self.embed_batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            hidden = self._session.run(None, _feed(self._session, enc))[0]
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = enc["attention_mask"][..., None].astype("float32")
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vecs.append(pooled.astype("float32"))
+        return np.concatenate(vecs).tolist() if vecs else []
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        from llama_index.embeddings.huggingface.utils import format_query
+
+        return self._embed([format_query(query, self.model_name)])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        from llama_index.embeddings.huggingface.utils import format_text
+
+        return self._embed([format_text(t, self.model_name) for t in texts])
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embedding(text)
+
+
+if __name__ == "__main__":
+    # Export (and quantize) every model the pipeline uses
+    from rag_llamaindex.models import EMBED_MODEL_NAME, NLI_MODEL_NAME, RERANK_MODEL
+    from rag_llamaindex.settings import NLI_MODEL
+
+    export_onnx(EMBED_MODEL_NAME, "embedder")
+    export_onnx(RERANK_MODEL, "reranker")
+    for name in {NLI_MODEL_NAME, NLI_MODEL}:
+        export_onnx(name, "nli")
+    print(f"[ONNX] Models cached in {ONNX_DIR}")
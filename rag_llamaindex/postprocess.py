@@ -1,20 +1,27 @@
 from typing import List
-from sentence_transformers import CrossEncoder
 import numpy as np
 from rag_llamaindex.settings import CROSS_ENC, NLI_MODEL, NLI_THRESHOLD
+from rag_llamaindex.reranker import get_rerank_batcher
+from rag_llamaindex.nli import aggregate, claim_scores, entailment_index
+from rag_llamaindex.models import get_nli
 
 class CrossEncoderReranker:
+    # scores go through the process-wide micro-batcher (see reranker.py)
     def __init__(self, model_name=CROSS_ENC, top_k=10):
-        self.m = CrossEncoder(model_name); self.top_k=top_k
+        self.batcher = get_rerank_batcher(model_name); self.top_k=top_k
     def __call__(self, q:str, texts:List[str]):
-        pairs=[(q,t) for t in texts]; s=self.m.predict(pairs, convert_to_numpy=True)
+        pairs=[(q,t) for t in texts]; s=np.asarray(self.batcher(pairs), dtype="float32")
         order=np.argsort(-s)[:self.top_k]
         return [texts[i] for i in order], s[order], order
 
 class NliVerifier:
     def __init__(self, model_name=NLI_MODEL, thr=NLI_THRESHOLD):
-        self.m=CrossEncoder(model_name); self.thr=thr
+        self.m=get_nli(model_name); self.thr=thr
     def verify(self, context:str, answer:str):
         logits=self.m.predict([(context,answer)], convert_to_numpy=True)[0]
         p=np.exp(logits-logits.max()); p/=p.sum()
-        entail=float(p[-1]); return entail>=self.thr, entail
+        entail=float(p[entailment_index(self.m)]); return entail>=self.thr, entail
+    def verify_claims(self, chunks:List[str], answer:str, how:str="mean"):
+        # per-sentence check against the best windows of each chunk, one batched pass
+        scores=claim_scores(self.m, answer, chunks)
+        entail=aggregate([s for _,s in scores], how); return entail>=self.thr, entail, scores
@@ -0,0 +1,144 @@
+"""
+Opt-in sampling profiler for a single question.
+
+    with profile(request_id) as prof:      # no-op unless enabled
+        answer = query(q)
+    prof.path                               # artifacts/profiles/<request_id>.collapsed
+
+A background thread snapshots every thread's Python stack each
+ASKIMMI_PROFILE_INTERVAL_MS (sys._current_frames), so work handed to the
+stage pool, the micro-batchers (tokenizer + torch forward passes) and
+llama-index all shows up, not only the calling thread. Idle threads
+(blocked in a queue, lock, condition or selector) are skipped.
+
+Output is the collapsed-stack format ("frame;frame;frame count" per line)
+read by flamegraph.pl, speedscope and inferno. Other requests in flight
+during the profile are sampled too -- profile on a quiet instance.
+
+    ASKIMMI_PROFILE=1                profile every /ask and scripts/ask.py call
+    X-Profile: 1 (header)            profile one /ask request, only honored when
+                                     ASKIMMI_PROFILE_HEADER=1 (off by default)
+    ASKIMMI_PROFILE_DIR              default artifacts/profiles
+    ASKIMMI_PROFILE_INTERVAL_MS      default 5
+
+When profiling is off, `profile()` yields a disabled Profiler without
+starting a thread or touching the interpreter.
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+PROFILE_ENABLED = os.getenv("ASKIMMI_PROFILE", "0") != "0"
+# The sampler is not free: any client could load the server with it, so the header is opt-in
+PROFILE_HEADER = os.getenv("ASKIMMI_PROFILE_HEADER", "0") != "0"
+PROFILE_DIR = Path(os.getenv("ASKIMMI_PROFILE_DIR", str(ROOT / "artifacts" / "profiles")))
+PROFILE_INTERVAL_MS = float(os.getenv("ASKIMMI_PROFILE_INTERVAL_MS", "5"))
+
+# (file basename, function) of frames where a thread is waiting, not working
+_IDLE = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def safe_request_id(raw: Optional[str]) -> str:
+    """A client-supplied id reduced to [A-Za-z0-9_-] (at most 64 chars), or a new id; safe as a file name."""
+    cleaned = re.sub(r"[^A-Za-z0-9_-]", "", raw or "")[:64]
+    return cleaned or new_request_id()
+
+
+def _label(code) -> str:
+    """`function (package/module.py)`: site-packages and repo paths shortened."""
+    path = code.co_filename
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep, str(ROOT) + os.sep):
+        i = path.rfind(marker)
+        if i >= 0:
+            path = path[i + len(marker):]
+            break
+    else:
+        path = os.path.basename(path)
+    return f"{code.co_name} ({path})".replace(";", ":")
+
+
+class Profiler:
+    def __init__(self, request_id: str, out_dir: Path = PROFILE_DIR, interval_ms: float = PROFILE_INTERVAL_MS, enabled: bool = True):
+        self.request_id = safe_request_id(request_id)
+        self.out_dir = Path(out_dir)
+        self.interval = interval_ms / 1000.0
+        self.enabled = enabled
+        self.path: Optional[Path] = None
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            top = frame.f_code
+            if (os.path.basename(top.co_filename), top.co_name) in _IDLE:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(f"thread {names.get(ident, ident)}".replace(";", ":"))
+            self._stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        if self.enabled:
+            self._thread = threading.Thread(target=self._run, name=f"profiler-{self.request_id}", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> Optional[Path]:
+        """Stop sampling and write <request_id>.collapsed; returns its path."""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.out_dir / f"{self.request_id}.collapsed"
+        lines = [f"{stack} {n}" for stack, n in self._stacks.most_common()]
+        self.path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"[Profile] {self.samples} samples ({len(self._stacks)} stacks) -> {self.path}")
+        return self.path
+
+
+@contextmanager
+def profile(request_id: Optional[str] = None, enabled: Optional[bool] = None) -> Iterator[Profiler]:
+    """Sample all threads while the block runs (enabled defaults to ASKIMMI_PROFILE)."""
+    enabled = PROFILE_ENABLED if enabled is None else enabled
+    prof = Profiler(request_id or new_request_id(), enabled=enabled)
+    if not enabled:
+        yield prof
+        return
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
@@ -2,122 +2,79 @@ from __future__ import annotations
 from dotenv import load_dotenv
 load_dotenv()
 
+import hashlib
 import os
-import json
-from pathlib import Path
-from typing import List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import numpy as np
 
-from llama_index.retrievers.bm25 import BM25Retriever
-from llama_index.core.schema import TextNode
+from llama_index.core.schema import NodeWithScore, TextNode
 
-# Modern llama-index import
-try:
-    from llama_index.core import VectorStoreIndex, Settings
-except ImportError:
-    from llama_index import VectorStoreIndex, Settings
+from rag_llamaindex.answer_cache import AnswerCache, CachedAnswer, get_answer_cache
+from rag_llamaindex.cache import candidate_cache, normalize_question
+from rag_llamaindex.engine import FUSION_METHOD, get_engine
+from rag_llamaindex.llm import get_llm, track_call
+from rag_llamaindex.metrics import span
+from rag_llamaindex.models import NLI_MODEL_NAME, RERANK_MODEL, get_nli
+from rag_llamaindex.nli import aggregate, claim_scores, entailment_index
+from rag_llamaindex.reranker import BatchedRerank
+from rag_llamaindex.serving import stage
+from rag_llamaindex.traffic import note
 
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core.postprocessor import SentenceTransformerRerank
-
-from sentence_transformers import CrossEncoder
-import google.generativeai as genai
 
+# ---------- Model config ----------
+# Model names live in rag_llamaindex/models.py (EMBED_MODEL_NAME, NLI_MODEL_NAME,
+# RERANK_MODEL, GEMINI_MODEL_NAME); nothing is loaded at import time.
+NLI_THRESHOLD = 0.8
 
-# ---------- Paths & model config ----------
-ROOT_DIR = Path(__file__).resolve().parents[1]
-CORPUS_PATH = ROOT_DIR / "data" / "processed" / "corpus.jsonl"
+# "claims": per-sentence NLI against the best context windows (batched)
+# "full":   one (whole context, whole answer) pair, truncated at 512 tokens
+NLI_MODE = os.getenv("ASKIMMI_NLI_MODE", "claims")
+NLI_AGGREGATE = os.getenv("ASKIMMI_NLI_AGGREGATE", "mean")  # or "min"
 
-EMBED_MODEL_NAME = "BAAI/bge-small-en-v1.5"
-NLI_MODEL_NAME = "cross-encoder/nli-deberta-v3-base"
-RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+# Fused candidates sent to the cross-encoder (its cost is linear in this)
+RERANK_POOL = int(os.getenv("ASKIMMI_RERANK_POOL", "20"))
 
-NLI_THRESHOLD = 0.8
-
-# Gemini
-GEMINI_MODEL_NAME = "gemini-2.5-flash"  # or "gemini-1.5-flash" if you prefer
+# Source links shown per (deduplicated) chunk in the answer legend
+LEGEND_URLS_PER_CHUNK = int(os.getenv("ASKIMMI_LEGEND_URLS_PER_CHUNK", "5"))
 
 
 # ---------- Global models ----------
-# Embeddings for dense retrieval
-Settings.embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
-
-# NLI verifier
-_nli = CrossEncoder(NLI_MODEL_NAME)
+# Loaded once per process by the model registry, on first use or via
+# rag_llamaindex.models.warmup() (the API does this at startup).
 
-# Reranker (cross-encoder)
-_reranker = SentenceTransformerRerank(
-    model=RERANK_MODEL,
+# Reranker (cross-encoder), micro-batched across concurrent requests
+_reranker = BatchedRerank(
+    model_name=RERANK_MODEL,
     top_n=5,  # keep 5 best chunks
 )
 
-# Gemini setup
-_gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not _gemini_api_key:
-    raise RuntimeError(
-        "GEMINI_API_KEY environment variable not set. "
-        "Create a Gemini key in Google AI Studio and export GEMINI_API_KEY."
-    )
-
-genai.configure(api_key=_gemini_api_key)
-_gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
-
 
 # ---------- Helpers ----------
-def _load_nodes() -> List[TextNode]:
-    """Load TextNodes from corpus.jsonl with stable IDs."""
-    nodes: List[TextNode] = []
-    with CORPUS_PATH.open("r", encoding="utf-8") as f:
-        for line in f:
-            rec = json.loads(line)
-            text = rec.get("text", "").strip()
-            if not text:
-                continue
-
-            chunk_id = str(rec.get("id") or rec.get("chunk_id") or "")
-            if not chunk_id:
-                raise ValueError("Each corpus record must have an 'id' (stable chunk id).")
-
-            meta = {k: rec[k] for k in ("url", "agency", "title") if k in rec}
-            meta["chunk_id"] = chunk_id  # keep it in metadata too
-
-            # IMPORTANT: give TextNode a stable id
-            nodes.append(TextNode(id_=chunk_id, text=text, metadata=meta))
-
-    print(f"[Corpus] Loaded {len(nodes)} nodes from {CORPUS_PATH}")
-    return nodes
-
-
-def _load_bm25(nodes: List[TextNode]):
-    """BM25 retriever over the nodes."""
-    return BM25Retriever.from_defaults(nodes=nodes, similarity_top_k=10)
-
-
-def _load_dense(nodes: List[TextNode]):
-    """Dense retriever using the configured embed model."""
-    index = VectorStoreIndex(nodes)
-    return index.as_retriever(similarity_top_k=10)
-
-
-def _nli_verify(answer: str, context: str) -> float:
+def _nli_verify(answer: str, context: str, chunks: List[str] | None = None) -> float:
     """
     Use NLI CrossEncoder to compute entailment probability
     that context -> answer.
+
+    In "claims" mode each answer sentence is checked against its best
+    context windows in one batched pass (see rag_llamaindex/nli.py) and
+    the per-claim scores are aggregated.
     """
-    logits = _nli.predict([(context, answer)], convert_to_numpy=True)
+    if NLI_MODE == "claims":
+        scores = claim_scores(get_nli(), answer, chunks if chunks is not None else [context])
+        if scores:
+            return aggregate([s for _, s in scores], NLI_AGGREGATE)
+
+    model = get_nli()
+    logits = model.predict([(context, answer)], convert_to_numpy=True)
     logits = np.asarray(logits, dtype="float32").reshape(1, -1)
     exp = np.exp(logits - logits.max(axis=1, keepdims=True))
     probs = exp / exp.sum(axis=1, keepdims=True)
-    # index 2 corresponds to 'entailment' in most NLI heads
-    return float(probs[0, 2])
+    return float(probs[0, entailment_index(model)])
 
 
-def _generate_answer_with_gemini(question: str, context: str) -> str:
-    """
-    Use Gemini to generate an answer strictly based on the provided context.
-    """
-    prompt = (
+def _build_prompt(question: str, context: str) -> str:
+    return (
         "You are an immigration assistant. Answer the user's question ONLY using "
         "the provided context from official U.S. government sources. "
         "If the answer is not clearly supported by the context, say that you "
@@ -130,84 +87,248 @@ def _generate_answer_with_gemini(question: str, context: str) -> str:
         "then provide a brief explanation."
     )
 
-    resp = _gemini_model.generate_content(prompt)
-    # Simple usage: resp.text
-    return (resp.text or "").strip()
 
-
-# ---------- Main Query Function ----------
-def query(question: str) -> Tuple[str, float, List[Tuple[int, str]]]:
+def _generate_answer_with_gemini(question: str, context: str) -> str:
     """
-    Main RAG pipeline:
-      1. Load corpus
-      2. Hybrid retrieval (BM25 + dense)
-      3. Cross-encoder reranking
-      4. Answer generation with Gemini using top chunks
-      5. NLI verification score
-      6. Legend of source URLs
+    Use the LLM client (Gemini by default, see rag_llamaindex/llm.py) to
+    generate an answer strictly based on the provided context.
     """
+    with span("generate"):
+        return get_llm().generate(_build_prompt(question, context)).strip()
 
-    # LOAD CORPUS ---------------------------------------------------
-    nodes = _load_nodes()
 
-    # RETRIEVAL -----------------------------------------------------
-    bm25 = _load_bm25(nodes)
-    dense = _load_dense(nodes)
+async def _agenerate_answer_with_gemini(question: str, context: str) -> str:
+    """Same as `_generate_answer_with_gemini`, awaited on the event loop (no thread held)."""
+    with span("generate"):
+        return (await get_llm().agenerate(_build_prompt(question, context))).strip()
 
-    bm25_hits = bm25.retrieve(question)   # list[NodeWithScore]
-    dense_hits = dense.retrieve(question) # list[NodeWithScore]
 
-    # Hybrid score fusion: sum normalized scores by node_id
-    combined: dict[str, list] = {}
-    for hit in bm25_hits:
-        combined[hit.node.node_id] = [hit, hit.score]
+async def _astream_answer_with_gemini(question: str, context: str) -> AsyncIterator[str]:
+    """LLM answer as it is generated: yields text pieces in order."""
+    with span("generate"):
+        async for text in get_llm().astream(_build_prompt(question, context)):
+            yield text
 
-    for hit in dense_hits:
-        if hit.node.node_id in combined:
-            combined[hit.node.node_id][1] += hit.score
-        else:
-            combined[hit.node.node_id] = [hit, hit.score]
 
-    # Sort by fused score (descending)
-    hybrid_ranked = sorted(combined.values(), key=lambda x: x[1], reverse=True)
-    hybrid_hits = [h[0] for h in hybrid_ranked]  # NodeWithScore objects
+# ---------- Pipeline stages ----------
+def _candidate_key(question: str) -> tuple:
+    # The artifact fingerprint changes on every index rebuild, invalidating old entries
+    return (get_engine().fingerprint, FUSION_METHOD, RERANK_MODEL, RERANK_POOL, normalize_question(question))
 
-    # RERANKING -----------------------------------------------------
-    # Take top 20 from hybrid and rerank with cross-encoder
-    initial_candidates = hybrid_hits[:20]
 
-    reranked_hits = _reranker.postprocess_nodes(
-        initial_candidates,
-        query_str=question,
-    )
+def cached_top_nodes(question: str) -> Optional[List[TextNode]]:
+    """Reranked top nodes from an earlier identical (normalized) question, if still cached."""
+    ids = candidate_cache.get(_candidate_key(question))
+    if ids is None:
+        return None
+    by_id = get_engine().node_by_id
+    return [by_id[i] for i in ids]
+
 
+def remember_top_nodes(question: str, top_nodes: List[TextNode]) -> None:
+    candidate_cache.put(_candidate_key(question), [n.node_id for n in top_nodes])
+
+
+def retrieve_top_nodes(question: str) -> List[TextNode]:
+    """
+    Hybrid retrieval (BM25 + dense, concurrent, fused) from the shared engine,
+    then cross-encoder reranking of the top RERANK_POOL; returns the 5 best nodes.
+    Repeated questions are served from the candidate cache.
+    """
+    top_nodes = cached_top_nodes(question)
+    note(candidate_cache="miss" if top_nodes is None else "hit")
+    if top_nodes is None:
+        # BM25 and dense run concurrently; scores are normalized before fusion
+        # (RRF by default, see rag_llamaindex/fusion.py)
+        hybrid_hits = get_engine().retrieve_hybrid(question)  # list[NodeWithScore]
+        top_nodes = rerank(question, hybrid_hits)
+        remember_top_nodes(question, top_nodes)
+    note(chunk_ids=[n.node_id for n in top_nodes])
+    return top_nodes
+
+
+async def _aretrieve_top_nodes(question: str) -> List[TextNode]:
+    """`retrieve_top_nodes` with retrieval and reranking on the CPU pool, each within its stage limit."""
+    top_nodes = cached_top_nodes(question)
+    note(candidate_cache="miss" if top_nodes is None else "hit")
+    if top_nodes is None:
+        hybrid_hits = await stage("retrieve").run(get_engine().retrieve_hybrid, question)
+        top_nodes = await stage("rerank").run(rerank, question, hybrid_hits)
+        remember_top_nodes(question, top_nodes)
+    note(chunk_ids=[n.node_id for n in top_nodes])
+    return top_nodes
+
+
+def rerank(question: str, hybrid_hits: List[NodeWithScore]) -> List[TextNode]:
+    # Take the top RERANK_POOL from hybrid and rerank with cross-encoder
+    with span("rerank"):
+        reranked_hits = _reranker.postprocess_nodes(
+            hybrid_hits[:RERANK_POOL],
+            query_str=question,
+        )
     # Keep top 5 final nodes (TextNode objects)
-    top_nodes = [hit.node for hit in reranked_hits[:5]]
+    return [hit.node for hit in reranked_hits[:5]]
 
-    # ANSWER GENERATION ---------------------------------------------
-    context = "\n\n".join(n.text for n in top_nodes)
 
-    generated_answer = _generate_answer_with_gemini(question, context)
+def build_context(top_nodes: List[TextNode]) -> str:
+    return "\n\n".join(n.text for n in top_nodes)
 
+
+def verify(generated_answer: str, context: str, top_nodes: List[TextNode]) -> float:
+    with span("nli"):
+        return _nli_verify(generated_answer, context, [n.text for n in top_nodes])
+
+
+def build_legend(top_nodes: List[TextNode]) -> List[Tuple[int, str]]:
+    legend: List[Tuple[int, str]] = []
+    seen: set[str] = set()
+    i = 1
+    with span("legend"):
+        for n in top_nodes:
+            meta = n.metadata or {}
+            # A collapsed near-duplicate chunk carries every page it appeared on (src/dedup.py)
+            urls = meta.get("urls") or [meta.get("url")]
+            for url in urls[:LEGEND_URLS_PER_CHUNK]:
+                if url and url not in seen:
+                    legend.append((i, url))
+                    seen.add(url)
+                    i += 1
+    return legend
+
+
+# ---------- Semantic answer cache ----------
+def answer_cache() -> Optional[AnswerCache]:
+    """
+    The semantic answer cache, versioned on everything an answer depends on
+    besides retrieval: LLM backend + model, prompt template and NLI settings.
+    """
+    llm = get_llm().backend
+    prompt = hashlib.sha1(_build_prompt("{question}", "{context}").encode("utf-8")).hexdigest()[:8]
+    pipeline = f"{llm.identity}:prompt-{prompt}:{NLI_MODEL_NAME}:{NLI_MODE}:{NLI_AGGREGATE}"
+    return get_answer_cache(pipeline, persist=llm.persistent)
+
+
+def cached_answer(question: str, top_nodes: List[TextNode]) -> Optional[CachedAnswer]:
+    """
+    A past answer for a near-duplicate question (cosine >= threshold) that was
+    generated from these exact top chunks; None on a miss or when disabled.
+    """
+    cache = answer_cache()
+    if cache is None or not top_nodes:
+        return None
+    with span("answer_cache"):
+        hit = cache.lookup(get_engine().dense.embed_query(question), [n.node_id for n in top_nodes])
+    note(answer_cache="miss" if hit is None else "hit")
+    return hit
+
+
+def verify_and_remember(
+    question: str, generated_answer: str, context: str, top_nodes: List[TextNode], remember: bool = True
+) -> float:
+    """
+    `verify`, then store the verified answer in the semantic answer cache
+    (unless `remember` is False, e.g. the answer came from the fallback LLM).
+    """
+    verification = verify(generated_answer, context, top_nodes)
+    cache = answer_cache() if remember else None
+    if cache is not None and generated_answer and top_nodes:
+        cache.store(
+            get_engine().dense.embed_query(question),
+            CachedAnswer(
+                question=question,
+                answer=generated_answer,
+                verification=verification,
+                legend=build_legend(top_nodes),
+                node_ids=[n.node_id for n in top_nodes],
+            ),
+        )
+    return verification
+
+
+def format_answer(generated_answer: str, context: str) -> str:
     # Optionally append raw excerpts below the generated answer
-    answer = (
+    return (
         generated_answer
         + "\n\nHere are the most relevant excerpts from official sources:\n\n"
         + context
     )
 
-    # VERIFICATION --------------------------------------------------
-    verification = _nli_verify(generated_answer, context)
 
-    # LEGEND --------------------------------------------------------
-    legend: List[Tuple[int, str]] = []
-    seen: set[str] = set()
-    i = 1
-    for n in top_nodes:
-        url = n.metadata.get("url") if n.metadata else None
-        if url and url not in seen:
-            legend.append((i, url))
-            seen.add(url)
-            i += 1
-
-    return answer, verification, legend
+# ---------- Main Query Function ----------
+def query(question: str) -> Tuple[str, float, List[Tuple[int, str]]]:
+    """
+    Main RAG pipeline:
+      1. Shared retrieval engine (artifacts loaded once per process)
+      2. Hybrid retrieval (BM25 + dense)
+      3. Cross-encoder reranking
+      4. Answer generation with Gemini using top chunks
+      5. NLI verification score
+      6. Legend of source URLs
+    """
+    top_nodes = retrieve_top_nodes(question)
+    context = build_context(top_nodes)
+
+    # Near-duplicate question over the same chunks: skip Gemini + NLI
+    hit = cached_answer(question, top_nodes)
+    if hit is not None:
+        return format_answer(hit.answer, context), hit.verification, build_legend(top_nodes)
+
+    with track_call() as llm_call:
+        generated_answer = _generate_answer_with_gemini(question, context)
+    remember = not llm_call["fallback"]
+    verification = verify_and_remember(question, generated_answer, context, top_nodes, remember)
+    return format_answer(generated_answer, context), verification, build_legend(top_nodes)
+
+
+async def aquery(question: str) -> Tuple[str, float, List[Tuple[int, str]]]:
+    """
+    `query` for async servers: retrieval, reranking and NLI run on the bounded
+    CPU pool under per-stage limits, the Gemini call is awaited. Raises
+    serving.Saturated when a stage's queue is full.
+    """
+    top_nodes = await _aretrieve_top_nodes(question)
+    context = build_context(top_nodes)
+
+    hit = await stage("retrieve").run(cached_answer, question, top_nodes)
+    if hit is not None:
+        return format_answer(hit.answer, context), hit.verification, build_legend(top_nodes)
+
+    with track_call() as llm_call:
+        generated_answer = await stage("llm").run_async(_agenerate_answer_with_gemini, question, context)
+    remember = not llm_call["fallback"]
+    verification = await stage("verify").run(verify_and_remember, question, generated_answer, context, top_nodes, remember)
+    return format_answer(generated_answer, context), verification, build_legend(top_nodes)
+
+
+async def astream_query(question: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming `aquery`, as (event, payload) pairs in this order:
+      sources       {"sources": [{"id", "url"}], "excerpts": context}, before generation
+      token         {"text": piece}, one per Gemini chunk
+      verification  {"verification_score": float}, after the answer is complete
+    A semantic-cache hit sends the whole cached answer as one token event.
+    """
+    top_nodes = await _aretrieve_top_nodes(question)
+    context = build_context(top_nodes)
+    yield "sources", {
+        "sources": [{"id": int(idx), "url": url} for idx, url in build_legend(top_nodes)],
+        "excerpts": context,
+    }
+
+    hit = await stage("retrieve").run(cached_answer, question, top_nodes)
+    if hit is not None:
+        yield "token", {"text": hit.answer}
+        yield "verification", {"verification_score": hit.verification, "cached": True}
+        return
+
+    parts: List[str] = []
+    with track_call() as llm_call:
+        async with stage("llm").slot():
+            async for text in _astream_answer_with_gemini(question, context):
+                parts.append(text)
+                yield "token", {"text": text}
+
+    generated_answer = "".join(parts).strip()
+    remember = not llm_call["fallback"]
+    verification = await stage("verify").run(verify_and_remember, question, generated_answer, context, top_nodes, remember)
+    yield "verification", {"verification_score": verification}
@@ -1,15 +1,28 @@
 # rag_llamaindex/reranker.py
 
-from typing import Optional
+import os
+import threading
+from typing import Dict, List, Optional
 
 from llama_index.core.postprocessor import SentenceTransformerRerank
 
 # If the above import fails with ImportError, try this instead:
 # from llama_index.indices.postprocessor import SentenceTransformerRerank
 
+from llama_index.core.schema import MetadataMode, NodeWithScore
+
+from rag_llamaindex.batching import MicroBatcher
+from rag_llamaindex.models import RERANK_MODEL, get_cross_encoder
+
+# Micro-batching knobs: how long a request waits for others, and the flush size
+RERANK_MAX_WAIT_MS = float(os.getenv("ASKIMMI_RERANK_WAIT_MS", "5"))
+RERANK_MAX_BATCH = int(os.getenv("ASKIMMI_RERANK_MAX_BATCH", "128"))
+RERANK_BATCH_SIZE = 32  # padded forward-pass size inside one micro-batch
+MAX_LENGTH = 512
+
 
 def get_reranker(
-    model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+    model_name: str = RERANK_MODEL,
     top_n: int = 5,
 ) -> SentenceTransformerRerank:
     """
@@ -23,3 +36,63 @@ def get_reranker(
         top_n=top_n,
     )
     return reranker
+
+
+# ---------- Cross-request micro-batching ----------
+_batchers: Dict[str, MicroBatcher] = {}
+_batchers_lock = threading.Lock()
+
+
+def _pair_length(pair) -> int:
+    q, t = pair
+    return len(q) + len(t)
+
+
+def get_rerank_batcher(model_name: str = RERANK_MODEL) -> MicroBatcher:
+    """
+    One CrossEncoder + MicroBatcher per model per process, shared by every
+    caller (BatchedRerank here, CrossEncoderReranker in postprocess.py).
+    Pairs are length-sorted so each padded sub-batch of RERANK_BATCH_SIZE
+    holds similar lengths.
+    """
+    with _batchers_lock:
+        if model_name not in _batchers:
+            model = get_cross_encoder(model_name, max_length=MAX_LENGTH)
+            _batchers[model_name] = MicroBatcher(
+                lambda pairs: model.predict(
+                    pairs, batch_size=RERANK_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False
+                ),
+                max_batch=RERANK_MAX_BATCH,
+                max_wait_ms=RERANK_MAX_WAIT_MS,
+                length=_pair_length,
+                name=f"rerank[{model_name}]",
+            )
+        return _batchers[model_name]
+
+
+class BatchedRerank:
+    """
+    Same `postprocess_nodes(nodes, query_str=...)` contract as
+    SentenceTransformerRerank, with scoring routed through the shared
+    micro-batcher so concurrent requests share forward passes.
+    """
+
+    def __init__(self, model_name: str = RERANK_MODEL, top_n: int = 5, batcher: Optional[MicroBatcher] = None):
+        self.model_name = model_name
+        self.top_n = top_n
+        self._batcher = batcher
+
+    @property
+    def batcher(self) -> MicroBatcher:
+        # resolved on first use so constructing a reranker loads nothing
+        if self._batcher is None:
+            self._batcher = get_rerank_batcher(self.model_name)
+        return self._batcher
+
+    def postprocess_nodes(self, nodes: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        if not nodes:
+            return []
+        pairs = [(query_str, n.node.get_content(metadata_mode=MetadataMode.EMBED)) for n in nodes]
+        scores = self.batcher(pairs)
+        rescored = [NodeWithScore(node=n.node, score=float(s)) for n, s in zip(nodes, scores)]
+        return sorted(rescored, key=lambda x: -x.score)[: self.top_n]
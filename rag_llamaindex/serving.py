@@ -0,0 +1,152 @@
+"""
+Async serving primitives: keep the event loop free, bound every stage.
+
+CPU-bound pipeline stages (retrieval, reranking, NLI) run on one bounded
+thread pool; the LLM call is awaited directly. Each stage has its own
+concurrency limit and a maximum number of waiters: when a stage's queue
+is full, `Stage.run` raises `Saturated` right away so the API can answer
+503 + Retry-After instead of letting latency grow without bound.
+
+    ASKIMMI_CPU_WORKERS     threads for CPU stages (default 8)
+    ASKIMMI_STAGE_LIMITS    e.g. "retrieve=8,rerank=8,llm=16,verify=4"
+    ASKIMMI_STAGE_QUEUE     waiters allowed per stage before 503 (default 32)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+
+from rag_llamaindex.metrics import CallbackGauge
+
+CPU_WORKERS = int(os.getenv("ASKIMMI_CPU_WORKERS", "8"))
+STAGE_QUEUE = int(os.getenv("ASKIMMI_STAGE_QUEUE", "32"))
+RETRY_AFTER_S = 1
+
+DEFAULT_LIMITS = {"retrieve": 8, "rerank": 8, "llm": 16, "verify": 4}
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = dict(DEFAULT_LIMITS)
+    for part in spec.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = int(value)
+    return limits
+
+
+STAGE_LIMITS = _parse_limits(os.getenv("ASKIMMI_STAGE_LIMITS", ""))
+
+_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="askimmi-cpu")
+
+
+class Saturated(RuntimeError):
+    """A stage's wait queue is full; the request should be rejected (503)."""
+
+    def __init__(self, stage: str, retry_after: int = RETRY_AFTER_S):
+        super().__init__(f"Server busy ({stage} stage saturated), retry shortly.")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class Stage:
+    """Concurrency limit + bounded wait queue for one pipeline stage."""
+
+    def __init__(self, name: str, limit: int, max_queue: int = STAGE_QUEUE):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        # asyncio semaphores belong to one loop: one per loop that calls us (as in LLMClient)
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(self.limit)
+        return sem
+
+    async def _enter(self) -> asyncio.Semaphore:
+        sem = self._semaphore()
+        if sem.locked() and self.waiting >= self.max_queue:
+            raise Saturated(self.name)
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return sem
+
+    def _exit(self, sem: asyncio.Semaphore) -> None:
+        self.active -= 1
+        sem.release()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run blocking `fn(*args)` on the CPU pool within this stage's limit.
+        The slot is held until the thread finishes, even if the caller is
+        cancelled (a cancelled await cannot stop a running thread).
+        """
+        sem = await self._enter()
+        loop = asyncio.get_running_loop()
+
+        def release(_: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._exit, sem)
+            except RuntimeError:  # loop already closed; its semaphore went with it
+                self.active -= 1
+
+        try:
+            # Run in a copy of this context so stage spans reach the request's timings
+            call = functools.partial(contextvars.copy_context().run, fn, *args)
+            fut = _executor.submit(call)
+        except BaseException:
+            self._exit(sem)
+            raise
+        fut.add_done_callback(release)
+        return await asyncio.wrap_future(fut)
+
+    async def run_async(self, make_coro: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+        """Await `make_coro(*args)` (e.g. the LLM call) within this stage's limit."""
+        async with self.slot():
+            return await make_coro(*args)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of this stage's slots for the block (e.g. a whole token stream)."""
+        sem = await self._enter()
+        try:
+            yield
+        finally:
+            self._exit(sem)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting}
+
+
+STAGES: Dict[str, Stage] = {name: Stage(name, limit) for name, limit in STAGE_LIMITS.items()}
+
+
+def stage(name: str) -> Stage:
+    return STAGES[name]
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Per-stage limit / active / waiting, for health endpoints."""
+    return {name: s.snapshot() for name, s in STAGES.items()}
+
+
+CallbackGauge(
+    "askimmi_stage_active", "Requests running in a stage.", lambda: {(n,): s.active for n, s in STAGES.items()}, ["stage"]
+)
+CallbackGauge(
+    "askimmi_stage_waiting", "Requests queued for a stage (queue depth).", lambda: {(n,): s.waiting for n, s in STAGES.items()}, ["stage"]
+)
@@ -0,0 +1,132 @@
+"""
+Traffic capture: one JSON line per API request, for scripts/replay.py.
+
+    with recording() as trace:               # per request (api/main.py)
+        answer = await aquery(q)             # pipeline calls note(chunk_ids=..., ...)
+    get_traffic_log().write({...trace})
+
+Records hold the question, timestamp, endpoint, status, latency, per-stage
+timings, the reranked chunk ids and candidate / answer cache hits.
+
+Writes never block a request: `write()` only enqueues, and a daemon thread
+serializes and appends records in batches (gathered for up to
+ASKIMMI_CAPTURE_FLUSH_S, at most 256). When the queue is full (disk slower
+than traffic) records are dropped and counted instead of applying
+backpressure.
+
+    ASKIMMI_CAPTURE=1           enable capture (off by default)
+    ASKIMMI_CAPTURE_PATH        default artifacts/traffic/requests.jsonl
+    ASKIMMI_CAPTURE_QUEUE       default 10000 pending records
+    ASKIMMI_CAPTURE_FLUSH_S     default 1.0
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+CAPTURE_ENABLED = os.getenv("ASKIMMI_CAPTURE", "0") != "0"
+CAPTURE_PATH = Path(os.getenv("ASKIMMI_CAPTURE_PATH", str(ROOT / "artifacts" / "traffic" / "requests.jsonl")))
+CAPTURE_QUEUE = int(os.getenv("ASKIMMI_CAPTURE_QUEUE", "10000"))
+CAPTURE_FLUSH_S = float(os.getenv("ASKIMMI_CAPTURE_FLUSH_S", "1.0"))
+BATCH = 256
+
+_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar("askimmi_trace", default=None)
+
+
+# ---------- Per-request trace ----------
+def note(**fields: Any) -> None:
+    """Attach fields to the current request's trace (no-op outside `recording()`)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+
+@contextmanager
+def recording(trace: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """Collect `note()` fields from this context (and copies of it) into `trace`."""
+    trace = {} if trace is None else trace
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+# ---------- Buffered writer ----------
+class TrafficLog:
+    def __init__(self, path: Path = CAPTURE_PATH, maxsize: int = CAPTURE_QUEUE, flush_s: float = CAPTURE_FLUSH_S):
+        self.path = Path(path)
+        self.flush_s = flush_s
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="traffic-log", daemon=True)
+        self._thread.start()
+        print(f"[Traffic] Capturing requests to {self.path}")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """Flush everything queued so far and stop the writer."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            done = False
+            while not done:
+                batch: List[Optional[Dict[str, Any]]] = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_s
+                while len(batch) < BATCH and batch[-1] is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                records = [r for r in batch if r is not None]
+                done = len(records) < len(batch)
+                if records:
+                    f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+                    f.flush()
+                    self.written += len(records)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": str(self.path), "written": self.written, "dropped": self.dropped, "pending": self._queue.qsize()}
+
+
+_log: Optional[TrafficLog] = None
+_log_lock = threading.Lock()
+
+
+def get_traffic_log() -> Optional[TrafficLog]:
+    """Process-wide TrafficLog (None unless ASKIMMI_CAPTURE=1)."""
+    global _log
+    if not CAPTURE_ENABLED:
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = TrafficLog()
+    return _log
+
+
+def close_traffic_log() -> None:
+    global _log
+    if _log is not None:
+        _log.close()
+        _log = None
@@ -8,6 +8,7 @@ ROOT = Path(__file__).resolve().parents[1]  # .../Immi
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from rag_llamaindex.profiling import PROFILE_ENABLED, profile
 from rag_llamaindex.query import query
 
 
@@ -18,9 +19,16 @@ def main():
         type=str,
         help="User question about visas/immigration",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Sample this query and write a collapsed-stack flame graph (or set ASKIMMI_PROFILE=1)",
+    )
+    parser.add_argument("--request-id", default=None, help="Profile file name (default: random)")
     args = parser.parse_args()
 
-    ans, score, legend = query(args.question)
+    with profile(args.request_id, enabled=args.profile or PROFILE_ENABLED):
+        ans, score, legend = query(args.question)
 
     print(f"\nQ: {args.question}\n")
     print("Answer:\n", ans)
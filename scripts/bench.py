@@ -0,0 +1,379 @@
+# scripts/bench.py
+"""
+Load + latency benchmark for the RAG pipeline (quality lives in eval_retrievers.py).
+
+Targets:
+  query   rag_llamaindex.query.query() in-process, one thread per concurrent client
+  asgi    POST /ask in-process through the FastAPI app (httpx ASGITransport)
+  http    POST /ask over HTTP against a local uvicorn started by this script
+
+The LLM is the stub backend (ASKIMMI_LLM_BACKEND=stub, ASKIMMI_STUB_LATENCY_MS
+to mimic Gemini) and the semantic answer cache is off unless --answer-cache,
+so runs measure retrieval, reranking and NLI, not network or cache luck.
+
+Questions come from data/eval/eval.jsonl (scripts/make_eval_synthetic.py):
+--mix uniform samples them evenly, --mix zipf repeats a few hot questions.
+
+Per target and concurrency level the report has throughput, client latency
+p50/p95/p99, per-stage p50/p95/p99 (from the /metrics spans, via
+?debug=true over HTTP), errors, peak RSS and startup time. --out writes it
+as JSON; --baseline compares against an earlier run and exits 1 when
+throughput, p95/p99 latency, RSS or startup regress by more than --tolerance.
+
+Run: python scripts/bench.py --targets query http --concurrency 1 4 16 --requests 64 --out bench.json
+"""
+from __future__ import annotations
+
+import os
+import time
+
+_T0 = time.perf_counter()  # startup time counts imports
+
+import argparse
+import asyncio
+import json
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+DEFAULT_EVAL_PATH = ROOT_DIR / "data" / "eval" / "eval.jsonl"
+TARGETS = ("query", "asgi", "http")
+PERCENTILES = (50, 95, 99)
+
+# (report key, higher is better) checked against --baseline
+REGRESSION_KEYS = (
+    ("throughput_rps", True),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("peak_rss_mb", False),
+    ("startup_s", False),
+)
+
+
+# ---------- Inputs ----------
+
+def load_questions(path: Path) -> List[str]:
+    if not path.exists():
+        sys.exit(f"[Bench] {path} not found; run scripts/make_eval_synthetic.py first.")
+    with path.open(encoding="utf-8") as f:
+        questions = [json.loads(ln)["question"] for ln in f if ln.strip()]
+    if not questions:
+        sys.exit(f"[Bench] {path} has no questions.")
+    return questions
+
+
+def question_mix(questions: Sequence[str], n: int, mix: str, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    if mix == "zipf":
+        weights = [1.0 / (rank + 1) for rank in range(len(questions))]
+        return rng.choices(list(questions), weights=weights, k=n)
+    return [questions[rng.randrange(len(questions))] for _ in range(n)]
+
+
+# ---------- Stats ----------
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {f"p{p}": float("nan") for p in PERCENTILES}
+    arr = np.asarray(values, dtype=float)
+    return {f"p{p}": round(float(np.percentile(arr, p)), 2) for p in PERCENTILES}
+
+
+def summarize(latencies: List[float], timings: List[Dict[str, float]], errors: int, wall_s: float) -> Dict[str, Any]:
+    stages: Dict[str, List[float]] = {}
+    for t in timings:
+        for stage, ms in t.items():
+            stages.setdefault(stage, []).append(ms)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(len(latencies) / wall_s, 3) if wall_s else 0.0,
+        "latency_ms": percentiles(latencies),
+        "stages_ms": {s: percentiles(v) for s, v in sorted(stages.items())},
+    }
+
+
+def self_peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # KiB on Linux
+
+
+def proc_peak_rss_mb(pid: int) -> float:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return float("nan")
+
+
+# ---------- Targets ----------
+
+def warmup_in_process() -> float:
+    """Load artifacts + models in this process; returns seconds since the script started."""
+    from rag_llamaindex.engine import get_engine
+    from rag_llamaindex.models import warmup
+
+    get_engine().warmup()
+    warmup()
+    return time.perf_counter() - _T0
+
+
+def reset_caches() -> None:
+    from rag_llamaindex import cache
+
+    cache.embedding_cache.clear()
+    cache.candidate_cache.clear()
+
+
+def run_query(questions: List[str], concurrency: int) -> Dict[str, Any]:
+    from rag_llamaindex.metrics import collect_timings
+    from rag_llamaindex.query import query
+
+    latencies: List[float] = []
+    timings: List[Dict[str, float]] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(q: str) -> None:
+        nonlocal errors
+        t0 = time.perf_counter()
+        try:
+            with collect_timings() as t:
+                query(q)
+        except Exception as e:
+            print(f"[Bench][WARN] query failed: {e}")
+            with lock:
+                errors += 1
+            return
+        dt = (time.perf_counter() - t0) * 1000
+        with lock:
+            latencies.append(dt)
+            timings.append(dict(t))
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, questions))
+    return summarize(latencies, timings, errors, time.perf_counter() - t0)
+
+
+async def _drive(client, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """POST /ask?debug=true for every question, at most `concurrency` in flight."""
+    latencies: List[float] = []
+    timings: List[Dict[str, float]] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(q: str) -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/ask", params={"debug": "true"}, json={"question": q})
+            except Exception as e:
+                print(f"[Bench][WARN] request failed: {e}")
+                errors += 1
+                return
+            dt = (time.perf_counter() - t0) * 1000
+            if r.status_code != 200:
+                errors += 1
+                return
+            latencies.append(dt)
+            timings.append(r.json().get("timings_ms", {}))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return summarize(latencies, timings, errors, time.perf_counter() - t0)
+
+
+def run_asgi(questions: List[str], concurrency: int) -> Dict[str, Any]:
+    import httpx
+    from api.main import app
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await _drive(client, questions, concurrency)
+
+    return asyncio.run(go())
+
+
+class UvicornServer:
+    """`uvicorn api.main:app` in a child process; startup = spawn until /ready answers 200."""
+
+    def __init__(self, timeout_s: float = 600.0):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        t0 = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=str(ROOT_DIR),
+            env=os.environ.copy(),
+        )
+        self.startup_s = self._wait_ready(timeout_s) - t0
+
+    def _wait_ready(self, timeout_s: float) -> float:
+        import httpx
+
+        deadline = time.perf_counter() + timeout_s
+        while time.perf_counter() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(self.url + "/ready", timeout=2).status_code == 200:
+                    return time.perf_counter()
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.close()
+        raise RuntimeError(f"server not ready after {timeout_s:.0f}s")
+
+    def run(self, questions: List[str], concurrency: int) -> Dict[str, Any]:
+        import httpx
+
+        async def go():
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(base_url=self.url, timeout=120, limits=limits) as client:
+                return await _drive(client, questions, concurrency)
+
+        return asyncio.run(go())
+
+    def close(self) -> None:
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+# ---------- Regression check ----------
+
+def _get(d: Dict[str, Any], dotted: str) -> Optional[float]:
+    for part in dotted.split("."):
+        if not isinstance(d, dict) or part not in d:
+            return None
+        d = d[part]
+    return float(d)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of `current` vs `baseline` beyond `tolerance` (relative)."""
+    problems: List[str] = []
+    for target, levels in current["results"].items():
+        for level, cur in levels.items():
+            base = baseline.get("results", {}).get(target, {}).get(level)
+            if base is None:
+                continue
+            for key, higher_is_better in REGRESSION_KEYS:
+                a, b = _get(cur, key), _get(base, key)
+                if a is None or b is None or not b or np.isnan(a) or np.isnan(b):
+                    continue
+                change = (a - b) / b
+                if (change < -tolerance) if higher_is_better else (change > tolerance):
+                    problems.append(f"{target} c={level} {key}: {b:g} -> {a:g} ({change:+.0%})")
+    return problems
+
+
+# ---------- Main ----------
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n=== Benchmark ===")
+    for target, levels in report["results"].items():
+        for level, r in levels.items():
+            lat = r["latency_ms"]
+            print(
+                f"  {target:5s} c={level:>3}  {r['throughput_rps']:8.2f} req/s  "
+                f"p50 {lat['p50']:8.1f}  p95 {lat['p95']:8.1f}  p99 {lat['p99']:8.1f} ms  "
+                f"errors {r['errors']}  rss {r['peak_rss_mb']:.0f} MB  startup {r['startup_s']:.1f} s"
+            )
+            for stage, p in r["stages_ms"].items():
+                print(f"        {stage:12s} p50 {p['p50']:8.1f}  p95 {p['p95']:8.1f}  p99 {p['p99']:8.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--targets", nargs="+", choices=TARGETS, default=["query", "asgi"])
+    ap.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    ap.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    ap.add_argument("--eval-file", type=str, default=str(DEFAULT_EVAL_PATH))
+    ap.add_argument("--mix", choices=["uniform", "zipf"], default="uniform")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stub-latency-ms", type=float, default=None, help="simulated LLM latency")
+    ap.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    ap.add_argument("--out", type=str, default=None, help="write the JSON report here")
+    ap.add_argument("--baseline", type=str, default=None, help="earlier --out report to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = ap.parse_args()
+
+    # Before anything reads them (rag_llamaindex modules read env at import; uvicorn inherits it)
+    os.environ["ASKIMMI_LLM_BACKEND"] = "stub"
+    if args.stub_latency_ms is not None:
+        os.environ["ASKIMMI_STUB_LATENCY_MS"] = str(args.stub_latency_ms)
+    if not args.answer_cache:
+        os.environ["ASKIMMI_ANSWER_CACHE"] = "0"
+
+    pool = load_questions(Path(args.eval_file))
+    report: Dict[str, Any] = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "results": {},
+    }
+
+    startup_in_process = None
+    for target in args.targets:
+        server = UvicornServer() if target == "http" else None
+        if server is None and startup_in_process is None:
+            startup_in_process = warmup_in_process()
+        report["results"][target] = {}
+        try:
+            for level in args.concurrency:
+                questions = question_mix(pool, args.requests, args.mix, args.seed)
+                if server is not None:
+                    result = server.run(questions, level)
+                    result["peak_rss_mb"] = round(proc_peak_rss_mb(server.proc.pid), 1)
+                    result["startup_s"] = round(server.startup_s, 2)
+                else:
+                    reset_caches()
+                    result = (run_query if target == "query" else run_asgi)(questions, level)
+                    result["peak_rss_mb"] = round(self_peak_rss_mb(), 1)
+                    result["startup_s"] = round(startup_in_process, 2)
+                report["results"][target][str(level)] = result
+                print(f"[Bench] {target} c={level}: {result['throughput_rps']} req/s, p95 {result['latency_ms']['p95']} ms")
+        finally:
+            if server is not None:
+                server.close()
+
+    print_report(report)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\n[Bench] Wrote {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        problems = compare(report, baseline, args.tolerance)
+        if problems:
+            print(f"\n[Bench] Regressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for p in problems:
+                print("  " + p)
+            sys.exit(1)
+        print(f"\n[Bench] No regressions vs {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
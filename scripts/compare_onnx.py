@@ -0,0 +1,151 @@
+# scripts/compare_onnx.py
+"""
+Accuracy + latency of the ONNX Runtime (int8) models against PyTorch.
+
+For each model the same inputs, drawn from the node store, go through both
+backends:
+  embedder  cosine(onnx, torch) per text, and top-10 dense overlap per question
+  reranker  Spearman correlation of scores per question, top-5 agreement
+  nli       label agreement and max |entailment prob| difference
+
+Run: python scripts/compare_onnx.py --models embedder reranker nli --n 64
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from rag_llamaindex.engine import BM25_STORE, embed_text, load_node_store  # noqa: E402
+from rag_llamaindex.models import EMBED_MODEL_NAME, NLI_MODEL_NAME, RERANK_MODEL  # noqa: E402
+from rag_llamaindex.nli import entailment_index, split_sentences  # noqa: E402
+from rag_llamaindex.onnx_backend import KINDS, OnnxCrossEncoder, OnnxEmbedding  # noqa: E402
+
+DEFAULT_EVAL_PATH = ROOT_DIR / "data" / "eval" / "eval.jsonl"
+
+
+def _timed(fn, repeat: int = 3):
+    """(result, best wall-clock ms over `repeat` runs); the first call warms caches."""
+    fn()
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return out, best * 1000
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(ra, rb)[0, 1]) if len(a) > 1 else 1.0
+
+
+def _questions(n: int, texts):
+    path = DEFAULT_EVAL_PATH
+    if path.exists():
+        with path.open(encoding="utf-8") as f:
+            qs = [json.loads(ln)["question"] for ln in f if ln.strip()]
+        if qs:
+            return qs[:n]
+    # No eval set: use the first sentence of random chunks as pseudo-questions
+    return [split_sentences(t)[0][:200] for t in texts[:n] if t.strip()]
+
+
+def compare_embedder(texts, questions):
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    torch_m, onnx_m = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME), OnnxEmbedding(EMBED_MODEL_NAME)
+    a, t_ms = _timed(lambda: np.asarray(torch_m.get_text_embedding_batch(texts), dtype="float32"))
+    b, o_ms = _timed(lambda: np.asarray(onnx_m.get_text_embedding_batch(texts), dtype="float32"))
+    cos = (a * b).sum(1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    overlap = []
+    for q in questions:
+        qa = np.asarray(torch_m.get_query_embedding(q), dtype="float32")
+        qb = np.asarray(onnx_m.get_query_embedding(q), dtype="float32")
+        top_a, top_b = set(np.argsort(-(a @ qa))[:10]), set(np.argsort(-(b @ qb))[:10])
+        overlap.append(len(top_a & top_b) / 10)
+    return {
+        "min_cosine": float(cos.min()),
+        "mean_cosine": float(cos.mean()),
+        "top10_overlap": float(np.mean(overlap)),
+        "torch_ms": t_ms,
+        "onnx_ms": o_ms,
+    }
+
+
+def compare_cross(name, kind, pairs_per_q):
+    from sentence_transformers import CrossEncoder
+
+    torch_m, onnx_m = CrossEncoder(name), OnnxCrossEncoder(name, kind=kind)
+    flat = [p for pairs in pairs_per_q for p in pairs]
+    a, t_ms = _timed(lambda: np.asarray(torch_m.predict(flat, batch_size=32, show_progress_bar=False), dtype="float32"))
+    b, o_ms = _timed(lambda: np.asarray(onnx_m.predict(flat, batch_size=32), dtype="float32"))
+    out = {"torch_ms": t_ms, "onnx_ms": o_ms, "max_abs_diff": float(np.abs(a - b).max())}
+
+    if kind == "nli":
+        def probs(x):
+            e = np.exp(x - x.max(1, keepdims=True))
+            return e / e.sum(1, keepdims=True)
+
+        ent = entailment_index(onnx_m)
+        out["label_agreement"] = float((a.argmax(1) == b.argmax(1)).mean())
+        out["max_entail_diff"] = float(np.abs(probs(a)[:, ent] - probs(b)[:, ent]).max())
+        return out
+
+    rhos, top5 = [], []
+    start = 0
+    for pairs in pairs_per_q:
+        sa, sb = a[start:start + len(pairs)], b[start:start + len(pairs)]
+        start += len(pairs)
+        rhos.append(_spearman(sa, sb))
+        top5.append(len(set(np.argsort(-sa)[:5]) & set(np.argsort(-sb)[:5])) / 5)
+    out["mean_spearman"] = float(np.mean(rhos))
+    out["top5_agreement"] = float(np.mean(top5))
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", nargs="+", choices=KINDS, default=list(KINDS))
+    ap.add_argument("--n", type=int, default=64, help="texts sampled from the node store")
+    ap.add_argument("--questions", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    nodes = load_node_store(BM25_STORE)
+    random.Random(args.seed).shuffle(nodes)
+    texts = [embed_text(n) for n in nodes[: args.n]]
+    questions = _questions(args.questions, texts)
+    pairs_per_q = [[(q, t) for t in texts[:20]] for q in questions]
+
+    results = {}
+    if "embedder" in args.models:
+        results["embedder"] = compare_embedder(texts, questions)
+    if "reranker" in args.models:
+        results["reranker"] = compare_cross(RERANK_MODEL, "reranker", pairs_per_q)
+    if "nli" in args.models:
+        # (premise window, hypothesis sentence) pairs like rag_llamaindex/nli.py builds
+        sents = [s for t in texts for s in split_sentences(t) if len(s.split()) >= 4][: len(texts)]
+        nli_pairs = [[(texts[i], sents[(i + 1) % len(sents)]) for i in range(len(sents))]]
+        results["nli"] = compare_cross(NLI_MODEL_NAME, "nli", nli_pairs)
+
+    print("\n[ONNX] ONNX Runtime (int8) vs PyTorch:")
+    for kind, r in results.items():
+        speedup = r["torch_ms"] / r["onnx_ms"] if r["onnx_ms"] else float("nan")
+        metrics = "  ".join(f"{k}={v:.4f}" for k, v in r.items() if not k.endswith("_ms"))
+        print(f"  {kind:8s}  torch {r['torch_ms']:8.1f} ms  onnx {r['onnx_ms']:8.1f} ms  x{speedup:.2f}  {metrics}")
+    print("[ONNX] Enable per model with ASKIMMI_ONNX=embedder,reranker,nli (or all).")
+
+
+if __name__ == "__main__":
+    main()
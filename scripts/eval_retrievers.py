@@ -14,8 +14,9 @@ ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
-# Reuse your query helpers and global settings
-from rag_llamaindex import query as rag_q  # noqa: E402
+# Reuse the query pipeline's retrieval engine (models load lazily)
+from rag_llamaindex.engine import FUSION_METHOD, get_engine  # noqa: E402
+from rag_llamaindex.fusion import METHODS as FUSION_METHODS, fuse  # noqa: E402
 
 DEFAULT_EVAL_PATH = ROOT_DIR / "data" / "eval" / "eval.jsonl"
 
@@ -84,18 +85,15 @@ def load_eval(path: Path) -> List[EvalItem]:
     return items
 
 
-# ---------- Build retrievers (reuse query.py helpers) ----------
+# ---------- Build retrievers (reuse the shared engine) ----------
 
 def build_retrievers(k_dense: int = 10):
     """
-    Use the same corpus + models as query.py:
-      - _load_nodes
-      - _load_bm25
-      - _load_dense
+    Use the same artifacts + models as query.py, via the shared RetrievalEngine
+    (node store, BM25 and FAISS are loaded once per process).
     """
-    nodes = rag_q._load_nodes()
-    bm25 = rag_q._load_bm25(nodes)
-    dense = rag_q._load_dense(nodes)
+    engine = get_engine()
+    nodes, bm25, dense = engine.nodes, engine.bm25, engine.dense
 
     # If retriever supports changing top_k, set it
     if hasattr(dense, "similarity_top_k"):
@@ -121,17 +119,6 @@ def _node_to_url(node) -> Optional[str]:
 
 def retrieve_bm25_urls(bm25, question: str, k: int) -> List[str]:
     hits = bm25.retrieve(question)
-
-    print("\n[DEBUG] First BM25 hit node fields:")
-    if hits:
-        n = hits[0].node
-        print("node.id_        =", getattr(n, "id_", None))
-        print("node.node_id    =", getattr(n, "node_id", None))
-        print("node.ref_doc_id =", getattr(n, "ref_doc_id", None))
-        print("metadata keys   =", list((getattr(n, "metadata", None) or {}).keys()))
-        print("metadata        =", (getattr(n, "metadata", None) or {}))
-        print("resolved url    =", _node_to_url(n))
-
     urls: List[str] = []
     for h in hits[:k]:
         u = _node_to_url(h.node)
@@ -150,29 +137,22 @@ def retrieve_dense_urls(dense, question: str, k: int) -> List[str]:
     return urls
 
 
-def retrieve_hybrid_urls(bm25, dense, question: str, k: int) -> List[str]:
+def retrieve_hybrid_urls(bm25, dense, question: str, k: int, method: str = FUSION_METHOD) -> List[str]:
     """
-    Simple hybrid: BM25 + dense scores summed over shared URLs.
+    Hybrid: BM25 + dense fused over URLs with the same fusion code as query.py.
     (Doc-level fusion; perfect match for URL-based evaluation.)
+    Each URL counts at its best-ranked chunk in each list.
     """
     bm25_hits = bm25.retrieve(question)
     dense_hits = dense.retrieve(question)
 
-    combined: Dict[str, float] = {}
-
-    for h in bm25_hits:
-        u = _node_to_url(h.node)
-        if not u:
-            continue
-        combined[u] = combined.get(u, 0.0) + float(h.score)
-
-    for h in dense_hits:
-        u = _node_to_url(h.node)
-        if not u:
-            continue
-        combined[u] = combined.get(u, 0.0) + float(h.score)
+    ranked_lists = []
+    for hits in (bm25_hits, dense_hits):
+        ranked_lists.append(
+            [(u, float(h.score)) for h in hits if (u := _node_to_url(h.node))]
+        )
 
-    ranked = sorted(combined.items(), key=lambda x: x[1], reverse=True)
+    ranked = fuse(ranked_lists, method=method)
     return [u for u, _ in ranked[:k]]
 
 
@@ -256,6 +236,7 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--eval-file", type=str, default=str(DEFAULT_EVAL_PATH))
     ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--fusion", choices=sorted(FUSION_METHODS), default=FUSION_METHOD)
     args = ap.parse_args()
 
     eval_path = Path(args.eval_file)
@@ -283,7 +264,7 @@ def main():
         "Hybrid",
         eval_items,
         args.k,
-        lambda q, k: retrieve_hybrid_urls(bm25, dense, q, k),
+        lambda q, k: retrieve_hybrid_urls(bm25, dense, q, k, method=args.fusion),
     )
 
     print("\nSummary:")
@@ -6,7 +6,7 @@ import sys
 ROOT_DIR = Path(__file__).resolve().parents[1]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
-from rag_llamaindex import query as rag_q  # uses your existing query.py
+from rag_llamaindex.engine import get_engine  # same BM25 artifacts as query.py
 
 
 OUT_PATH = Path("data/eval/eval.jsonl")
@@ -23,13 +23,13 @@ def main():
         "What is SEVIS and what fee do I need to pay?"
     ]
 
-    # ❷ Load nodes and BM25 retriever from your query module
-    nodes = rag_q._load_nodes()
-    bm25 = rag_q._load_bm25(nodes)
+    # ❷ BM25 leg of the shared retrieval engine: never loads FAISS or the
+    # embedder, so Settings.embed_model is never resolved (no OpenAI default)
+    engine = get_engine()
 
     with OUT_PATH.open("w", encoding="utf-8") as f:
         for i, q in enumerate(questions, start=1):
-            hits = bm25.retrieve(q)
+            hits = engine.retrieve_bm25(q)
 
             # Take top 3 as "relevant" for this synthetic eval
             relevant_ids = [h.node.node_id for h in hits[:3]]
@@ -0,0 +1,177 @@
+# scripts/replay.py
+"""
+Replay captured traffic (ASKIMMI_CAPTURE=1, rag_llamaindex/traffic.py) against a running server.
+
+Requests are re-issued open-loop at their original offsets from the first
+record, divided by --speed (2 = twice as fast, same burst shape), or as
+fast as --concurrency allows with --asap. Each goes to its captured
+endpoint (/ask or /ask/stream, which is read to the end); /ask is called
+with ?debug=true so per-stage timings can be compared.
+
+The report compares captured vs replayed latency (p50/p95/p99), per-stage
+p50/p95, status codes, and how late requests were sent relative to
+schedule (client-side lag means the replayer, not the server, was the
+bottleneck). --out writes it as JSON.
+
+Run: python scripts/replay.py artifacts/traffic/requests.jsonl --url http://127.0.0.1:8000 --speed 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_LOG_PATH = ROOT_DIR / "artifacts" / "traffic" / "requests.jsonl"
+PERCENTILES = (50, 95, 99)
+
+
+def load_log(path: Path, endpoint: Optional[str], limit: Optional[int]) -> List[Dict[str, Any]]:
+    if not path.exists():
+        sys.exit(f"[Replay] {path} not found; capture traffic with ASKIMMI_CAPTURE=1 first.")
+    with path.open(encoding="utf-8") as f:
+        records = [json.loads(ln) for ln in f if ln.strip()]
+    records = [r for r in records if r.get("question")]
+    records.sort(key=lambda r: r["ts"])
+    if endpoint:
+        for r in records:
+            r["endpoint"] = endpoint
+    return records[:limit] if limit else records
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {f"p{p}": float("nan") for p in PERCENTILES}
+    arr = np.asarray(values, dtype=float)
+    return {f"p{p}": round(float(np.percentile(arr, p)), 2) for p in PERCENTILES}
+
+
+async def send(client: httpx.AsyncClient, record: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-issue one captured request; returns status, latency_ms and timings_ms."""
+    body = {"question": record["question"]}
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+    try:
+        if record.get("endpoint") == "/ask/stream":
+            async with client.stream("POST", "/ask/stream", json=body) as r:
+                failed = False
+                async for chunk in r.aiter_bytes():
+                    failed = failed or b"event: error" in chunk
+                # A stream that fails after its 200 is captured as 500 (api/main.py): compare like for like
+                status = 500 if failed and r.status_code == 200 else r.status_code
+        else:
+            r = await client.post("/ask", params={"debug": "true"}, json=body)
+            status = r.status_code
+            if status == 200:
+                timings = r.json().get("timings_ms", {})
+    except httpx.HTTPError as e:
+        print(f"[Replay][WARN] {record.get('request_id')}: {e}")
+        status = 0
+    return {"status": status, "latency_ms": (time.perf_counter() - t0) * 1000, "timings_ms": timings}
+
+
+async def replay(records: List[Dict[str, Any]], url: str, speed: float, asap: bool, concurrency: int) -> List[Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=concurrency)
+    sem = asyncio.Semaphore(concurrency)
+    ts0 = records[0]["ts"]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+
+        async def one(i: int, record: Dict[str, Any]) -> None:
+            due = 0.0 if asap else (record["ts"] - ts0) / speed
+            delay = due - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with sem:
+                lag = (time.perf_counter() - start - due) * 1000
+                res = await send(client, record)
+            res["lag_ms"] = lag
+            results[i] = res
+
+        await asyncio.gather(*(one(i, r) for i, r in enumerate(records)))
+        wall = time.perf_counter() - start
+    print(f"[Replay] {len(records)} requests in {wall:.1f}s ({len(records) / wall:.2f} req/s)")
+    return results
+
+
+def _stages(timings: Sequence[Dict[str, float]]) -> Dict[str, List[float]]:
+    out: Dict[str, List[float]] = {}
+    for t in timings:
+        for stage, ms in t.items():
+            out.setdefault(stage, []).append(ms)
+    return out
+
+
+def compare(records: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [(rec, res) for rec, res in zip(records, results) if rec.get("status") == 200 and res["status"] == 200]
+    orig_stages = _stages([rec.get("timings_ms", {}) for rec, _ in ok])
+    new_stages = _stages([res["timings_ms"] for _, res in ok if res["timings_ms"]])
+    span_s = (records[-1]["ts"] - records[0]["ts"]) if len(records) > 1 else 0.0
+    return {
+        "requests": len(records),
+        "captured_span_s": round(span_s, 3),
+        "status": {
+            "captured": dict(Counter(str(r.get("status")) for r in records)),
+            "replayed": dict(Counter(str(r["status"]) for r in results)),
+        },
+        "latency_ms": {
+            "captured": percentiles([rec["latency_ms"] for rec, _ in ok]),
+            "replayed": percentiles([res["latency_ms"] for _, res in ok]),
+        },
+        "stages_ms": {
+            stage: {"captured": percentiles(orig_stages.get(stage, [])), "replayed": percentiles(new_stages.get(stage, []))}
+            for stage in sorted(set(orig_stages) | set(new_stages))
+        },
+        "send_lag_ms": percentiles([res["lag_ms"] for res in results]),
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n=== Replay: captured vs replayed ===")
+    print(f"  status   captured {report['status']['captured']}  replayed {report['status']['replayed']}")
+    rows = [("total", report["latency_ms"])] + list(report["stages_ms"].items())
+    for name, r in rows:
+        a, b = r["captured"], r["replayed"]
+        print(
+            f"  {name:12s} p50 {a['p50']:8.1f} -> {b['p50']:8.1f}  "
+            f"p95 {a['p95']:8.1f} -> {b['p95']:8.1f}  p99 {a['p99']:8.1f} -> {b['p99']:8.1f} ms"
+        )
+    lag = report["send_lag_ms"]
+    print(f"  send lag     p50 {lag['p50']:.1f}  p95 {lag['p95']:.1f}  p99 {lag['p99']:.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("log", nargs="?", default=str(DEFAULT_LOG_PATH), help="captured requests.jsonl")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--speed", type=float, default=1.0, help="pacing multiplier (2 = twice as fast)")
+    ap.add_argument("--asap", action="store_true", help="ignore captured pacing")
+    ap.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    ap.add_argument("--endpoint", choices=["/ask", "/ask/stream"], default=None, help="send everything here")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--out", type=str, default=None)
+    args = ap.parse_args()
+
+    records = load_log(Path(args.log), args.endpoint, args.limit)
+    if not records:
+        sys.exit("[Replay] No requests in the log.")
+    results = asyncio.run(replay(records, args.url, args.speed, args.asap, args.concurrency))
+    report = compare(records, results)
+    print_report(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\n[Replay] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# scripts/sweep_faiss.py
+"""
+Recall@k vs exact search and query latency for FAISS index settings.
+
+Base vectors come from the current artifacts/faiss_llamaindex.index when it
+is a flat index (no re-embedding), otherwise the node store is embedded.
+Queries are the eval questions (data/eval/eval.jsonl), embedded with the
+serving embedder, or --node-queries N random chunk vectors when there is
+no eval set. Ground truth is IndexFlatIP top-k over the same vectors.
+
+For every spec (rag_llamaindex/faiss_index.py syntax) the index is built
+once, then each nprobe (IVF) or ef_search (HNSW) value is measured:
+recall@k, single-query latency p50/p95 (--threads, default 1 like one
+request), build time and serialized size.
+
+Run: python scripts/sweep_faiss.py --specs ivf_flat:nlist=64 ivf_pq:nlist=64,pq_m=48 hnsw:hnsw_m=32 \
+         --nprobe 1 4 16 --ef-search 16 64 128 --k 10 --out sweep.json
+
+Pick a setting, then rebuild with ASKIMMI_FAISS_INDEX="<spec>" python rag_llamaindex/build_index.py.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+import faiss
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from rag_llamaindex.engine import BM25_STORE, FAISS_IDX, embed_text, load_node_store  # noqa: E402
+from rag_llamaindex.faiss_index import IndexSpec, base_index, build, set_search_params  # noqa: E402
+
+DEFAULT_EVAL_PATH = ROOT_DIR / "data" / "eval" / "eval.jsonl"
+DEFAULT_SPECS = ["ivf_flat:nlist=256", "ivf_pq:nlist=256,pq_m=48,nbits=8", "hnsw:hnsw_m=32,ef_construction=200"]
+
+
+def base_vectors(reembed: bool) -> np.ndarray:
+    if not reembed and FAISS_IDX.exists():
+        loaded = faiss.read_index(str(FAISS_IDX))
+        index = base_index(loaded)  # id-mapped builds: vector order is irrelevant here
+        if isinstance(index, faiss.IndexFlat):
+            print(f"[Sweep] Using {index.ntotal} vectors from {FAISS_IDX}")
+            return index.reconstruct_n(0, index.ntotal)
+        print(f"[Sweep] {FAISS_IDX.name} is not flat; re-embedding the node store.")
+    from rag_llamaindex.models import get_embedder
+
+    nodes = load_node_store(BM25_STORE)
+    vecs = get_embedder().get_text_embedding_batch([embed_text(n) for n in nodes], show_progress=True)
+    return np.asarray(vecs, dtype="float32")
+
+
+def query_vectors(base: np.ndarray, eval_path: Path, node_queries: int, seed: int) -> np.ndarray:
+    if not node_queries and eval_path.exists():
+        from rag_llamaindex.models import get_embedder
+
+        with eval_path.open(encoding="utf-8") as f:
+            questions = [json.loads(ln)["question"] for ln in f if ln.strip()]
+        embedder = get_embedder()
+        print(f"[Sweep] Embedding {len(questions)} eval questions")
+        return np.asarray([embedder.get_query_embedding(q) for q in questions], dtype="float32")
+    n = node_queries or 200
+    rows = random.Random(seed).sample(range(len(base)), min(n, len(base)))
+    print(f"[Sweep] Using {len(rows)} random chunk vectors as queries")
+    return base[rows]
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    found = np.empty_like(truth)
+    for i in range(len(queries)):
+        t0 = time.perf_counter()
+        _, rows = index.search(queries[i : i + 1], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found[i] = rows[0]
+    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+    return {
+        "recall": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--specs", nargs="+", default=DEFAULT_SPECS)
+    ap.add_argument("--nprobe", nargs="+", type=int, default=[1, 2, 4, 8, 16, 32, 64])
+    ap.add_argument("--ef-search", nargs="+", type=int, default=[16, 32, 64, 128, 256])
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--eval-file", type=str, default=str(DEFAULT_EVAL_PATH))
+    ap.add_argument("--node-queries", type=int, default=0, help="use N random chunk vectors as queries")
+    ap.add_argument("--reembed", action="store_true", help="embed the node store even if the index is flat")
+    ap.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads during search")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=str, default=None)
+    args = ap.parse_args()
+
+    base = base_vectors(args.reembed)
+    queries = query_vectors(base, Path(args.eval_file), args.node_queries, args.seed)
+    faiss.omp_set_num_threads(args.threads)
+
+    flat, _ = build(base, IndexSpec("flat"))
+    _, truth = flat.search(queries, args.k)
+    results: List[Dict[str, Any]] = [{"spec": "flat", "build_s": 0.0, "size_mb": round(len(faiss.serialize_index(flat)) / 2**20, 2), **measure(flat, queries, truth, args.k)}]
+
+    for text in args.specs:
+        t0 = time.perf_counter()
+        index, spec = build(base, IndexSpec.parse(text))
+        build_s = round(time.perf_counter() - t0, 2)
+        size_mb = round(len(faiss.serialize_index(index)) / 2**20, 2)
+        if spec.kind in ("ivf_flat", "ivf_pq"):
+            variants = [replace(spec, nprobe=p) for p in sorted(set(min(p, spec.nlist) for p in args.nprobe))]
+        elif spec.kind == "hnsw":
+            variants = [replace(spec, ef_search=e) for e in args.ef_search]
+        else:
+            variants = [spec]
+        for v in variants:
+            set_search_params(index, v)
+            results.append({"spec": str(v), "build_s": build_s, "size_mb": size_mb, **measure(index, queries, truth, args.k)})
+            print(f"[Sweep] {results[-1]}")
+
+    print(f"\n=== FAISS sweep: {len(base)} vectors, {len(queries)} queries, recall@{args.k} vs flat ===")
+    print(f"  {'spec':52s} {'recall':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'build s':>8s} {'MB':>7s}")
+    for r in results:
+        print(f"  {r['spec']:52s} {r['recall']:7.3f} {r['p50_ms']:8.3f} {r['p95_ms']:8.3f} {r['build_s']:8.2f} {r['size_mb']:7.2f}")
+
+    if args.out:
+        report = {"vectors": len(base), "queries": len(queries), "k": args.k, "threads": args.threads, "results": results}
+        Path(args.out).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\n[Sweep] Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
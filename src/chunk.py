@@ -1,22 +1,105 @@
-import json, argparse, os, re
+import json, argparse, os, re, sys, time
+from collections import deque
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+
+# Sentence ends: . ! ? (plus closing quotes/brackets) before whitespace, or a blank line
+_BOUND=re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+_TOK=re.compile(r"\S+\s*")
+
+def sentences(txt):
+    """Yield sentences (with their trailing whitespace) lazily, without splitting the whole document."""
+    start=0
+    for m in _BOUND.finditer(txt):
+        yield txt[start:m.end()]; start=m.end()
+    if start<len(txt): yield txt[start:]
+
+def units(txt, size, piece):
+    """(text, n_tokens) per sentence; run-ons over `size` tokens (tables, lists) are cut every `piece` tokens."""
+    for s in sentences(txt):
+        n=len(s.split())
+        if n<=size:
+            yield s, n; continue
+        buf=[]
+        for m in _TOK.finditer(s):
+            buf.append(m.group())
+            if len(buf)==piece:
+                yield "".join(buf), piece; buf=[]
+        if buf: yield "".join(buf), len(buf)
 
 def chunks(txt, size=800, overlap=120):
-    toks=re.findall(r"\S+\s*", txt)
-    i=0
-    while i<len(toks):
-        piece="".join(toks[i:i+size]).strip()
-        if piece: yield piece
-        i+=size-overlap
+    """
+    Chunks of at most `size` whitespace tokens made of whole sentences; each
+    chunk repeats the trailing sentences of the previous one, up to `overlap` tokens.
+    Only a sentence longer than `size` is split (into `overlap`-token pieces, so
+    its chunks still overlap).
+    """
+    buf=deque(); n=0
+    for u,k in units(txt, size, overlap if 0<overlap<size else size):
+        if n+k>size and buf:
+            piece="".join(x for x,_ in buf).strip()
+            if piece: yield piece
+            keep=deque(); m=0
+            for x,kx in reversed(buf):
+                if m+kx>overlap: break
+                keep.appendleft((x,kx)); m+=kx
+            while keep and m+k>size:
+                m-=keep.popleft()[1]
+            buf,n=keep,m
+        buf.append((u,k)); n+=k
+    piece="".join(x for x,_ in buf).strip()
+    if piece: yield piece
+
+def chunk_line(line, size=800, overlap=120):
+    """One input JSON line -> output JSON lines (runs in the worker processes)."""
+    if not line.strip(): return []
+    d=json.loads(line); meta={k:d[k] for k in d if k!="text"}
+    return [json.dumps({"text":ch, **meta, "chunk_id": f'{meta["id"]}-{i}'},ensure_ascii=False)+"\n"
+            for i, ch in enumerate(chunks(d["text"], size, overlap))]
+
+def carry_over(path, changes, out):
+    """Copy chunks of documents the crawl did not touch (changes: src/crawl_state.py) from `path` to `out`."""
+    drop=set(changes["new"])|set(changes["changed"])|set(changes["removed"]); n=0
+    with open(path,encoding="utf-8") as f:
+        for ln in f:
+            if ln.strip() and json.loads(ln)["id"] not in drop: out.write(ln); n+=1
+    return n
+
 if __name__=="__main__":
     ap=argparse.ArgumentParser()
     ap.add_argument("--in", dest="inp", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--size", type=int, default=800, help="max tokens per chunk")
+    ap.add_argument("--overlap", type=int, default=120, help="max tokens repeated from the previous chunk")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--changes", default=None,
+                    help="changed-ids JSON from ingest_playwright.py --state: --in holds only those docs, "
+                         "chunks of the other docs are kept from the existing --out")
     args=ap.parse_args()
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
-    out=open(args.out,"w",encoding="utf-8")
-    for line in open(args.inp,encoding="utf-8"):
-        d=json.loads(line); meta={k:d[k] for k in d if k!="text"}
-        for i, ch in enumerate(chunks(d["text"])):
-            rec={"text":ch, **meta, "chunk_id": f'{meta["id"]}-{i}'}
-            out.write(json.dumps(rec,ensure_ascii=False)+"\n")
-    out.close(); print("[OK] chunked ->", args.out)
+    merge=bool(args.changes) and os.path.exists(args.out)
+    target=args.out+".tmp" if merge else args.out
+    work=partial(chunk_line, size=args.size, overlap=args.overlap)
+    t0=time.perf_counter(); docs=n_chunks=n_bytes=0
+    pool=Pool(args.workers) if args.workers>1 else None
+    try:
+        with open(args.inp,encoding="utf-8") as inp, open(target,"w",encoding="utf-8") as out:
+            if merge:
+                with open(args.changes,encoding="utf-8") as f: kept=carry_over(args.out, json.load(f), out)
+                print(f"[INFO] kept {kept} chunks of unchanged docs from {args.out}")
+            # Bounded windows of input lines (Pool.imap alone would read the whole file ahead);
+            # imap keeps input order within each window
+            while True:
+                window=list(islice(inp, max(1,args.workers)*256))
+                if not window: break
+                for recs in (pool.imap(work, window, chunksize=16) if pool else map(work, window)):
+                    out.writelines(recs); docs+=1; n_chunks+=len(recs); n_bytes+=sum(len(r) for r in recs)
+                    if docs%10000==0:
+                        print(f"[INFO] {docs} docs, {n_chunks} chunks, {docs/(time.perf_counter()-t0):.0f} docs/s", file=sys.stderr)
+    finally:
+        if pool: pool.close(); pool.join()
+    if merge: os.replace(target, args.out)
+    dt=time.perf_counter()-t0
+    print(f"[OK] chunked {docs} docs -> {n_chunks} chunks in {dt:.1f}s "
+          f"({docs/dt:.0f} docs/s, {n_chunks/dt:.0f} chunks/s, {n_bytes/dt/2**20:.1f} MB/s out, {args.workers} workers) ->", args.out)
@@ -0,0 +1,69 @@
+import json, os, hashlib, datetime as dt
+
+# Per-page crawl state, keyed by sid(url):
+#   {"url", "etag", "last_modified", "text_hash", "last_seen", "last_changed"}
+# ETag / Last-Modified drive conditional requests before a browser render; the hash of the
+# cleaned text catches pages whose validators change while their content does not.
+
+def text_hash(t): return hashlib.sha1((t or "").encode("utf-8")).hexdigest()
+def now(): return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class CrawlState:
+    def __init__(self, path):
+        self.path=path; self.pages={}
+        if os.path.exists(path):
+            with open(path,encoding="utf-8") as f: self.pages=json.load(f)
+        self.new=[]; self.changed=[]; self.unchanged=[]; self.dropped=[]
+
+    def validators(self, pid):
+        """Conditional request headers for a known page ({} when there is nothing to send)."""
+        p=self.pages.get(pid) or {}; h={}
+        if p.get("etag"): h["If-None-Match"]=p["etag"]
+        if p.get("last_modified"): h["If-Modified-Since"]=p["last_modified"]
+        return h
+
+    def not_modified(self, pid, status, headers):
+        """True for a 304, or a 200 whose validators still match (servers that ignore conditionals)."""
+        p=self.pages.get(pid)
+        if not p or p.get("text_hash") is None: return False
+        if status==304: return True
+        if status!=200: return False
+        etag,lm=headers.get("etag"),headers.get("last-modified")
+        if etag and p.get("etag"): return etag==p["etag"]
+        return bool(lm and p.get("last_modified") and lm==p["last_modified"])
+
+    def seen(self, pid):
+        self.pages[pid]["last_seen"]=now(); self.unchanged.append(pid)
+
+    def update(self, pid, url, text, headers):
+        """Record a rendered page; returns "new", "changed" or "unchanged" (same cleaned text)."""
+        p=self.pages.get(pid); h=text_hash(text); t=now()
+        kind="new" if p is None else "unchanged" if p.get("text_hash")==h else "changed"
+        self.pages[pid]={"url":url,"etag":headers.get("etag"),"last_modified":headers.get("last-modified"),
+            "text_hash":h,"last_seen":t,"last_changed":(p or {}).get("last_changed") if kind=="unchanged" else t}
+        getattr(self, kind).append(pid)
+        return kind
+
+    def drop(self, pid):
+        """Forget a page that is gone (404/410) or no longer has indexable text; reported as removed."""
+        if self.pages.pop(pid, None) is not None: self.dropped.append(pid)
+
+    def removed(self, urls):
+        """Ids of known pages no longer in the seed list (dropped from the state), plus those drop()ped."""
+        keep={p for p in self.pages if self.pages[p]["url"] in urls}
+        gone=set(self.pages)-keep
+        for pid in gone: del self.pages[pid]
+        return sorted(gone|set(self.dropped))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp=self.path+".tmp"
+        with open(tmp,"w",encoding="utf-8") as w: json.dump(self.pages,w,ensure_ascii=False)
+        os.replace(tmp,self.path)
+
+    def write_changes(self, path, removed):
+        """Changed-ids list for src/chunk.py --changes (and anything else downstream)."""
+        out={"created":now(),"new":self.new,"changed":self.changed,"removed":removed,"unchanged":len(self.unchanged)}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path,"w",encoding="utf-8") as w: json.dump(out,w,indent=2)
+        return out
@@ -0,0 +1,107 @@
+import json, argparse, os, re, time, zlib
+import numpy as np
+
+# MinHash over word 5-gram shingles, LSH banding to find candidates, then the
+# estimated Jaccard against each cluster's canonical chunk (the first seen) decides.
+# Near-duplicates collapse into the canonical chunk, which keeps every source URL
+# in metadata "urls" (+ "dup_chunk_ids"), so the answer legend still lists them.
+
+P=(1<<31)-1
+_WORD=re.compile(r"\w+")
+
+def shingles(txt, k=5):
+    """uint64 hashes of lowercased word k-grams (the whole text if shorter)."""
+    toks=np.fromiter((zlib.crc32(w.encode()) for w in _WORD.findall(txt.lower())), dtype=np.uint64)
+    if len(toks)==0: return toks
+    if len(toks)<k: k=len(toks)
+    h=np.zeros(len(toks)-k+1, dtype=np.uint64)
+    for j in range(k):  # polynomial hash, wraps mod 2**64
+        h=h*np.uint64(1000003)+toks[j:len(toks)-k+1+j]
+    return np.unique(h)
+
+class MinHasher:
+    def __init__(self, num_perm=128, seed=1):
+        rng=np.random.default_rng(seed)
+        self.a=rng.integers(1, P, num_perm, dtype=np.uint64)
+        self.b=rng.integers(0, P, num_perm, dtype=np.uint64)
+    def __call__(self, sh):
+        if len(sh)==0: return np.full(len(self.a), P, dtype=np.uint64)
+        x=(sh%np.uint64(P))[None,:]
+        return ((self.a[:,None]*x+self.b[:,None])%np.uint64(P)).min(axis=1)
+
+def lsh_params(num_perm, threshold):
+    """(bands, rows) with bands*rows == num_perm whose S-curve midpoint (1/b)**(1/r) is closest to threshold."""
+    pairs=[(b, num_perm//b) for b in range(1, num_perm+1) if num_perm%b==0]
+    return min(pairs, key=lambda br: abs((1/br[0])**(1/br[1])-threshold))
+
+def dedup(records, threshold=0.85, num_perm=128, min_tokens=8):
+    """
+    records: chunk dicts in order. Returns (canonical index per record, number of clusters).
+    Chunks under `min_tokens` words are never merged (too little text to judge).
+    """
+    mh=MinHasher(num_perm); bands,rows=lsh_params(num_perm, threshold)
+    buckets=[{} for _ in range(bands)]; sigs={}; canon=np.arange(len(records))
+    for i,r in enumerate(records):
+        sh=shingles(r["text"])
+        if len(sh)<min_tokens: continue
+        sig=mh(sh); keys=[sig[b*rows:(b+1)*rows].tobytes() for b in range(bands)]
+        best=None; checked=set()
+        for b,key in enumerate(keys):
+            j=buckets[b].get(key)
+            if j is None or j in checked: continue
+            checked.add(j)
+            if np.mean(sigs[j]==sig)>=threshold:
+                best=j; break
+        if best is not None:
+            canon[i]=best; continue
+        sigs[i]=sig
+        for b,key in enumerate(keys): buckets[b].setdefault(key, i)
+    return canon, len(set(canon.tolist()))
+
+def collapse(records, canon):
+    """Canonical records (input order) with merged "urls" / "dup_chunk_ids"."""
+    members={}
+    for i,c in enumerate(canon.tolist()): members.setdefault(c, []).append(i)
+    out=[]
+    for c in sorted(members):
+        rec=dict(records[c]); group=members[c]
+        if len(group)>1:
+            urls=[]
+            for i in group:
+                u=records[i].get("url")
+                if u and u not in urls: urls.append(u)
+            rec["urls"]=urls
+            rec["dup_chunk_ids"]=[records[i]["chunk_id"] for i in group[1:]]
+        out.append(rec)
+    return out, members
+
+if __name__=="__main__":
+    ap=argparse.ArgumentParser()
+    ap.add_argument("--in", dest="inp", required=True, help="chunks from src/chunk.py")
+    ap.add_argument("--out", required=True, help="deduplicated chunks for build_index.py")
+    ap.add_argument("--threshold", type=float, default=0.85, help="estimated Jaccard to merge")
+    ap.add_argument("--num-perm", type=int, default=128)
+    ap.add_argument("--report", default=None, help="write the shrink report as JSON")
+    args=ap.parse_args()
+    t0=time.perf_counter()
+    with open(args.inp,encoding="utf-8") as f:
+        records=[json.loads(ln) for ln in f if ln.strip()]
+    canon,_=dedup(records, args.threshold, args.num_perm)
+    out,members=collapse(records, canon)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out,"w",encoding="utf-8") as w:
+        for rec in out: w.write(json.dumps(rec,ensure_ascii=False)+"\n")
+
+    tok_in=sum(len(r["text"].split()) for r in records); tok_out=sum(len(r["text"].split()) for r in out)
+    top=sorted(members.values(), key=len, reverse=True)[:10]
+    report={"chunks_in":len(records),"chunks_out":len(out),
+        "chunks_removed":len(records)-len(out),"shrink":round(1-len(out)/max(1,len(records)),4),
+        "tokens_in":tok_in,"tokens_out":tok_out,"threshold":args.threshold,"num_perm":args.num_perm,
+        "largest_clusters":[{"size":len(g),"urls":len({records[i].get("url") for i in g}),
+            "text":records[g[0]]["text"][:100]} for g in top if len(g)>1]}
+    print(f"[OK] {len(records)} -> {len(out)} chunks ({report['shrink']:.1%} fewer FAISS/BM25 rows, "
+          f"{tok_in-tok_out} fewer tokens to index) in {time.perf_counter()-t0:.1f}s ->", args.out)
+    for c in report["largest_clusters"][:5]:
+        print(f"  x{c['size']:<4} ({c['urls']} urls) {c['text']!r}")
+    if args.report:
+        with open(args.report,"w",encoding="utf-8") as w: json.dump(report, w, indent=2)
@@ -1,6 +1,18 @@
-import argparse, json, os, hashlib, re, datetime as dt
+import argparse, asyncio, json, os, hashlib, re, sys, time, datetime as dt
+from collections import OrderedDict, defaultdict, deque
 from urllib.parse import urlparse
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+try: from .crawl_state import CrawlState  # imported as src.ingest_playwright
+except ImportError: from crawl_state import CrawlState  # run as python src/ingest_playwright.py
+
+# One Chromium shared by --concurrency workers, each with its own context + page
+# (reused across URLs). Images/fonts/media are aborted at the network layer, pages are
+# read once the main content has rendered (no fixed sleeps), at most --per-host pages of
+# a host load at once with --host-delay seconds between their starts, and records are
+# written as pages complete (so output order is completion order, not seed order).
+# With --state, known pages are first checked with a conditional HEAD (ETag / Last-Modified)
+# and only new or changed pages are written, plus a changed-ids list for chunk.py --changes.
+# Known pages that now 404/410 or clean up to low-signal text are listed as removed.
 
 def sid(s): return hashlib.md5((s or "").encode()).hexdigest()[:16]
 def today(): return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d")
@@ -38,40 +50,176 @@ def drop_boiler(t):
     out=" ".join(keep)
     return re.sub(r"\s+"," ",out).strip()
 
-def fetch(url, wait_ms=2500):
-    with sync_playwright() as p:
-        b=p.chromium.launch(headless=True, args=["--no-sandbox","--disable-dev-shm-usage"])
-        ctx=b.new_context(viewport={"width":1280,"height":2000},
-                          user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                                     "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                          extra_http_headers={"Referer":"https://www.google.com/"})
-        pg=ctx.new_page(); pg.goto(url, wait_until="load", timeout=60000); pg.wait_for_timeout(wait_ms)
-        for y in (1200, 3000, 6000):
-            try: pg.mouse.wheel(0,y); pg.wait_for_timeout(200)
-            except: pass
-        title=pg.title(); text=pg.evaluate(JS_GET); html=pg.content()
-        ctx.close(); b.close()
-        return title,text,html
+# Ready when a content root JS_GET prefers holds real text (SPA shells render it late);
+# <body> is left out: nav + footer alone pass the length check before the content exists
+JS_READY = """
+() => { for(const s of ['main','article','#block-uscis-content']){
+  const e=document.querySelector(s); if(e && e.innerText && e.innerText.trim().length>200) return true;}
+  return false; }
+"""
+JS_SCROLL = "() => window.scrollTo(0, document.body ? document.body.scrollHeight : 0)"
+
+BLOCK = {"image","font","media"}
+UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+      "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+
+async def block_heavy(route):
+    if route.request.resource_type in BLOCK: await route.abort()
+    else: await route.continue_()
+
+class HostLimiter:
+    """At most `per_host` concurrent loads per host, starts spaced by `delay` seconds."""
+    def __init__(self, per_host=2, delay=0.5):
+        self.sem=defaultdict(lambda: asyncio.Semaphore(per_host)); self.delay=delay
+        self.next_start=defaultdict(float); self.lock=defaultdict(asyncio.Lock)
+    def host(self, url): return _HostSlot(self, urlparse(url).netloc)
+
+class _HostSlot:
+    def __init__(self, lim, h): self.lim=lim; self.h=h
+    async def __aenter__(self):
+        await self.lim.sem[self.h].acquire()
+        async with self.lim.lock[self.h]:
+            wait=self.lim.next_start[self.h]-time.monotonic()
+            if wait>0: await asyncio.sleep(wait)
+            self.lim.next_start[self.h]=time.monotonic()+self.lim.delay
+    async def __aexit__(self, *exc): self.lim.sem[self.h].release()
+
+def interleave(urls):
+    """Round-robin over hosts, so workers are not all queued behind one host's limit."""
+    by_host=OrderedDict()
+    for u in urls: by_host.setdefault(urlparse(u).netloc, deque()).append(u)
+    out=[]
+    while by_host:
+        for h in list(by_host):
+            out.append(by_host[h].popleft())
+            if not by_host[h]: del by_host[h]
+    return out
+
+async def first_of(*aws):
+    """Wait until the first awaitable finishes (the others are cancelled); False if none succeeded."""
+    tasks=[asyncio.ensure_future(a) for a in aws]
+    try:
+        for t in asyncio.as_completed(tasks):
+            try: await t; return True
+            except Exception: pass
+        return False
+    finally:
+        for t in tasks: t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def fetch(pg, url, ready_ms=15000, timeout_ms=60000, settle_ms=3000):
+    """(title, text, html, response headers, status) of `url` loaded in the reused page `pg`."""
+    resp=await pg.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+    # Content root rendered, or (pages without one) the network went quiet
+    if not await first_of(pg.wait_for_function(JS_READY, timeout=ready_ms, polling=100),
+                          pg.wait_for_load_state("networkidle", timeout=ready_ms)):
+        print(f"[INFO] content not ready after {ready_ms}ms, reading anyway: {url}")
+    try:  # lazy sections load on scroll: give their requests up to settle_ms to finish
+        await pg.evaluate(JS_SCROLL); await pg.wait_for_load_state("networkidle", timeout=settle_ms)
+    except Exception: pass
+    return (await pg.title(), await pg.evaluate(JS_GET), await pg.content(),
+            (resp.headers if resp else {}), (resp.status if resp else 200))
+
+async def not_modified(ctx, state, url, timeout_ms=15000):
+    """Conditional HEAD with the stored validators; True when the render can be skipped."""
+    hdrs=state.validators(sid(url))
+    if not hdrs: return False
+    try:
+        r=await ctx.request.head(url, headers=hdrs, timeout=timeout_ms, fail_on_status_code=False)
+        try: return state.not_modified(sid(url), r.status, r.headers)
+        finally: await r.dispose()
+    except Exception as e:
+        print(f"[INFO] conditional request failed ({e}), rendering: {url}"); return False
+
+def to_record(url, title, dom):
+    text=drop_boiler(dom); alpha=sum(c.isalpha() for c in text)
+    if alpha<200: return None, alpha
+    return {"id":sid(url),"url":url,"title":title or "","text":text,
+            "agency":agency(url),"last_seen":today(),"source_type":"html_browser_clean"}, alpha
+
+async def crawl(urls, out, concurrency=8, per_host=2, host_delay=0.5, retries=1, ready_ms=15000,
+                html_dir="data/raw/html_browser", state=None):
+    q=asyncio.Queue()
+    for u in interleave(urls): q.put_nowait(u)
+    lim=HostLimiter(per_host, host_delay); stats=defaultdict(int); t0=time.perf_counter()
+
+    def tally(kind):
+        stats[kind]+=1; done=sum(stats.values())
+        if done%50==0:
+            print(f"[INFO] {done}/{len(urls)} pages, {done/(time.perf_counter()-t0):.1f} pages/s", file=sys.stderr)
+
+    async def worker(browser):
+        ctx=await browser.new_context(viewport={"width":1280,"height":2000}, user_agent=UA,
+                                      extra_http_headers={"Referer":"https://www.google.com/"})
+        await ctx.route("**/*", block_heavy)
+        pg=await ctx.new_page()
+        try:
+            while True:
+                try: url=q.get_nowait()
+                except asyncio.QueueEmpty: return
+                if state:
+                    async with lim.host(url): fresh=await not_modified(ctx, state, url, ready_ms)
+                    if fresh:
+                        state.seen(sid(url)); print("[SAME]",url,"(not modified)"); tally("unchanged"); continue
+                for attempt in range(retries+1):
+                    try:
+                        async with lim.host(url): title,dom,html,hdrs,status=await fetch(pg, url, ready_ms)
+                        break
+                    except Exception as e:
+                        if attempt==retries:
+                            print("[WARN]",url,e); tally("failed"); dom=None
+                        if pg.is_closed(): pg=await ctx.new_page()
+                if dom is None: continue
+                if status in (404,410):
+                    print(f"[GONE] {status} {url}"); tally("gone")
+                    if state: state.drop(sid(url))
+                    continue
+                with open(f"{html_dir}/{sid(url)}.html","w",encoding="utf-8") as h: h.write(html)
+                rec,alpha=to_record(url, title, dom)
+                if rec is None:
+                    print(f"[SKIP] low-signal alpha={alpha} {url}"); tally("skipped")
+                    if state: state.drop(sid(url))  # its old chunks must not stay indexed
+                    continue
+                if state and state.update(rec["id"], url, rec["text"], hdrs)=="unchanged":
+                    print("[SAME]",url,"(same text)"); tally("unchanged"); continue
+                out.write(json.dumps(rec,ensure_ascii=False)+"\n"); out.flush()
+                print("[OK]",url,f"(alpha={alpha})"); tally("ok")
+        finally:
+            await ctx.close()
+
+    async with async_playwright() as p:
+        browser=await p.chromium.launch(headless=True, args=["--no-sandbox","--disable-dev-shm-usage"])
+        try: await asyncio.gather(*(worker(browser) for _ in range(max(1,min(concurrency,len(urls))))))
+        finally: await browser.close()
+    return stats, time.perf_counter()-t0
 
 if __name__=="__main__":
     ap=argparse.ArgumentParser()
     ap.add_argument("--url-file", required=True)
     ap.add_argument("--out", required=True)
+    ap.add_argument("--concurrency", type=int, default=8, help="pages loading at once (one browser context each)")
+    ap.add_argument("--per-host", type=int, default=2, help="max concurrent pages per host")
+    ap.add_argument("--host-delay", type=float, default=0.5, help="min seconds between page starts on one host")
+    ap.add_argument("--retries", type=int, default=1)
+    ap.add_argument("--ready-ms", type=int, default=15000, help="max wait for the main content to render")
+    ap.add_argument("--state", default=None, help="crawl state JSON (e.g. data/raw/crawl_state.json): write only new/changed pages")
+    ap.add_argument("--changes", default=None, help="changed-ids JSON (default: <out>.changes.json, with --state)")
     args=ap.parse_args()
     os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
     os.makedirs("data/raw/html_browser", exist_ok=True)
 
-    with open(args.out,"w",encoding="utf-8") as w, open(args.url_file) as f:
-        for url in [u.strip() for u in f if u.strip() and not u.startswith("#")]:
-            try:
-                title,dom,html=fetch(url)
-                open(f"data/raw/html_browser/{sid(url)}.html","w",encoding="utf-8").write(html)
-                text=drop_boiler(dom); alpha=sum(c.isalpha() for c in text)
-                if alpha<200:
-                    print(f"[SKIP] low-signal alpha={alpha} {url}"); continue
-                rec={"id":sid(url),"url":url,"title":title or "","text":text,
-                     "agency":agency(url),"last_seen":today(),"source_type":"html_browser_clean"}
-                w.write(json.dumps(rec,ensure_ascii=False)+"\n")
-                print("[OK]",url,f"(alpha={alpha})")
-            except Exception as e:
-                print("[WARN]",url,e)
+    with open(args.url_file) as f:
+        urls=list(dict.fromkeys(u.strip() for u in f if u.strip() and not u.startswith("#")))
+    state=CrawlState(args.state) if args.state else None
+    try:
+        with open(args.out,"w",encoding="utf-8") as w:
+            stats,dt_s=asyncio.run(crawl(urls, w, args.concurrency, args.per_host, args.host_delay,
+                                         args.retries, args.ready_ms, state=state))
+    finally:
+        if state:  # also after an interrupted run: the records already written are in the changes
+            removed=state.removed(set(urls)); state.save()
+            changes=state.write_changes(args.changes or os.path.splitext(args.out)[0]+".changes.json", removed)
+            print(f"[OK] state: {len(changes['new'])} new, {len(changes['changed'])} changed, "
+                  f"{len(removed)} removed, {changes['unchanged']} unchanged ->", args.state)
+    print(f"[OK] {len(urls)} urls in {dt_s:.1f}s ({len(urls)/max(dt_s,1e-9):.1f} pages/s): "
+          f"{stats['ok']} written, {stats['unchanged']} unchanged, {stats['skipped']} low-signal, {stats['gone']} gone, {stats['failed']} failed ->", args.out)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from llama_index.core.schema import TextNode
+from llama_index.retrievers.bm25 import BM25Retriever
+
+from rag_llamaindex.bm25_index import (
+    MmapBM25,
+    MmapBM25Retriever,
+    SparseBM25,
+    tokenize_query,
+    write_bm25_index,
+)
+from rag_llamaindex.engine import embed_text
+
+CORPUS = [
+    "Form I-765 is the application for employment authorization.",
+    "Employment authorization documents are issued to asylum applicants after 150 days.",
+    "Naturalization applicants take an English and civics test at their interview.",
+    "Green card holders renew with Form I-90 six months before the card expires.",
+    "The civics test has 100 questions; applicants answer up to 10 of them.",
+    "Fee waivers use Form I-912 and depend on household income.",
+    "Asylum applications are filed on Form I-589 within one year of arrival.",
+    "A replacement green card is also requested on Form I-90.",
+]
+QUESTIONS = [
+    "employment authorization for asylum applicants",
+    "renew green card",
+    "civics test questions",
+    "fee waiver form",
+    "nothing matches zebra",
+]
+
+
+@pytest.fixture
+def nodes():
+    return [TextNode(id_=f"c{i}", text=t) for i, t in enumerate(CORPUS)]
+
+
+@pytest.fixture
+def bm25_path(tmp_path, nodes):
+    return write_bm25_index((embed_text(n) for n in nodes), tmp_path / "bm25_index.bin")
+
+
+@pytest.mark.parametrize("question", QUESTIONS)
+def test_mmap_matches_bm25_retriever(nodes, bm25_path, question):
+    k = len(nodes)
+    expected = BM25Retriever.from_defaults(nodes=nodes, similarity_top_k=k).retrieve(question)
+    got = MmapBM25Retriever(MmapBM25(bm25_path), nodes, similarity_top_k=k).retrieve(question)
+
+    assert [h.node.node_id for h in got] == [h.node.node_id for h in expected]
+    assert [h.score for h in got] == pytest.approx([h.score for h in expected], rel=1e-6)
+
+
+def test_rejects_index_built_from_other_text(nodes, bm25_path):
+    nodes[2] = TextNode(id_="c2", text=nodes[2].text + " Edited.")
+    with pytest.raises(ValueError, match="other text"):
+        MmapBM25Retriever(MmapBM25(bm25_path), nodes)
+
+
+def test_rejects_index_for_another_node_count(nodes, bm25_path):
+    with pytest.raises(ValueError, match="covers 8 docs"):
+        MmapBM25Retriever(MmapBM25(bm25_path), nodes[:-1])
+
+
+# ---------- SparseBM25: MaxScore top-k against brute force ----------
+@pytest.fixture
+def random_bm25_path(tmp_path):
+    rng = np.random.default_rng(7)
+    # Zipf-ish term frequencies, so a few terms have long postings and most are rare
+    vocab = np.array([f"term{i}x" for i in range(60)])
+    p = 1.0 / np.arange(1, len(vocab) + 1)
+    docs = [" ".join(rng.choice(vocab, size=rng.integers(5, 40), p=p / p.sum())) for _ in range(400)]
+    queries = [" ".join(rng.choice(vocab, size=rng.integers(1, 6))) for _ in range(40)]
+    return write_bm25_index(docs, tmp_path / "bm25_index.bin"), queries
+
+
+def _brute_top_k(index: MmapBM25, question: str, k: int):
+    scores = index.get_scores(tokenize_query(question))
+    rows = np.flatnonzero(scores > 0)
+    rows = rows[np.lexsort((rows, -scores[rows]))][:k]
+    return rows, scores[rows]
+
+
+@pytest.mark.parametrize("prune_min_postings", [0, 10**9])  # always / never MaxScore
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_sparse_top_k_matches_brute_force(random_bm25_path, prune_min_postings, k):
+    path, queries = random_bm25_path
+    brute = MmapBM25(path)
+    sparse = SparseBM25(path, prune_min_postings=prune_min_postings)
+    for q in queries:
+        exp_rows, exp_scores = _brute_top_k(brute, q, k)
+        rows, scores = sparse.top_k(q, k)
+        # Same top-k scores (no document missed by pruning), each one correctly scored
+        assert scores == pytest.approx(exp_scores, rel=1e-5)
+        assert brute.get_scores(tokenize_query(q))[rows] == pytest.approx(scores, rel=1e-5)
+        assert len(set(rows.tolist())) == len(rows)
+
+
+def test_sparse_top_k_batch_matches_brute_force(random_bm25_path):
+    path, queries = random_bm25_path
+    brute = MmapBM25(path)
+    for q, (rows, scores) in zip(queries, SparseBM25(path).top_k_batch(queries, 10)):
+        assert scores == pytest.approx(_brute_top_k(brute, q, 10)[1], rel=1e-5)
+        assert brute.get_scores(tokenize_query(q))[rows] == pytest.approx(scores, rel=1e-5)
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from src.chunk import chunks
+
+SIZE, OVERLAP = 50, 10
+
+
+def make_doc(lengths):
+    """Sentences of the given word counts; every word is unique so token positions are recoverable."""
+    words = iter(f"w{i}" for i in range(sum(lengths)))
+    return [" ".join(next(words) for _ in range(n)) + "." for n in lengths]
+
+
+def overlap_of(prev, cur):
+    """Longest j <= OVERLAP such that cur starts with the last j tokens of prev."""
+    for j in range(min(OVERLAP, len(prev), len(cur)), 0, -1):
+        if prev[-j:] == cur[:j]:
+            return j
+    return 0
+
+
+def check_invariants(sentences, out):
+    tokens = " ".join(sentences).split()
+    parts = [c.split() for c in out]
+    assert all(len(p) <= SIZE for p in parts)
+    rebuilt = list(parts[0])
+    for prev, cur in zip(parts, parts[1:]):
+        rebuilt += cur[overlap_of(prev, cur):]
+    assert rebuilt == tokens  # nothing lost, nothing repeated beyond the overlap
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunks_respect_size_overlap_and_sentences(seed):
+    rng = random.Random(seed)
+    sentences = make_doc([rng.randint(3, 30) for _ in range(60)])
+    out = list(chunks(" ".join(sentences), SIZE, OVERLAP))
+
+    check_invariants(sentences, out)
+    # Sentences up to the chunk size are never split across chunks
+    for s in sentences:
+        assert any(s in c for c in out)
+    # Each chunk starts on a sentence boundary
+    starts = {s.split()[0] for s in sentences}
+    assert all(c.split()[0] in starts for c in out)
+
+
+def test_sentence_longer_than_overlap_stays_whole():
+    sentences = make_doc([40, 40, 40])
+    out = list(chunks(" ".join(sentences), SIZE, OVERLAP))
+    assert out == sentences  # each one fits a chunk; no room (or need) to cut it at the overlap
+
+
+def test_run_on_longer_than_size_is_split_with_overlap():
+    sentences = make_doc([5, 3 * SIZE, 5])
+    out = list(chunks(" ".join(sentences), SIZE, OVERLAP))
+    assert len(out) > 3
+    check_invariants(sentences, out)
+    parts = [c.split() for c in out]
+    assert all(overlap_of(p, c) > 0 for p, c in zip(parts, parts[1:]))
+
+
+def test_short_and_empty_text():
+    assert list(chunks("One sentence.", SIZE, OVERLAP)) == ["One sentence."]
+    assert list(chunks("   ", SIZE, OVERLAP)) == []
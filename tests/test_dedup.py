@@ -0,0 +1,51 @@
+import random
+
+from src.dedup import collapse, dedup
+
+rng = random.Random(3)
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def text(n=200):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def rec(i, url, body):
+    return {"chunk_id": f"c{i}", "url": url, "text": body}
+
+
+def test_exact_and_near_duplicates_collapse_into_the_first_chunk():
+    alert, other = text(), text()
+    near = alert.split()
+    near[100] = "changed"  # one word in 200: Jaccard of 5-gram shingles ~0.95
+    records = [
+        rec(0, "https://x/i-765", alert),
+        rec(1, "https://x/i-131", other),
+        rec(2, "https://x/i-90", alert),
+        rec(3, "https://x/i-765", alert),  # same page twice: url kept once
+        rec(4, "https://x/n-400", " ".join(near)),
+    ]
+    canon, clusters = dedup(records)
+    assert canon.tolist() == [0, 1, 0, 0, 0]
+    assert clusters == 2
+
+    out, members = collapse(records, canon)
+    assert [r["chunk_id"] for r in out] == ["c0", "c1"]
+    assert out[0]["text"] == alert
+    assert out[0]["urls"] == ["https://x/i-765", "https://x/i-90", "https://x/n-400"]
+    assert out[0]["dup_chunk_ids"] == ["c2", "c3", "c4"]
+    assert "urls" not in out[1] and "dup_chunk_ids" not in out[1]
+    assert members == {0: [0, 2, 3, 4], 1: [1]}
+
+
+def test_distinct_chunks_are_kept():
+    records = [rec(i, f"https://x/{i}", text()) for i in range(20)]
+    canon, clusters = dedup(records)
+    assert clusters == 20
+    assert collapse(records, canon)[0] == records
+
+
+def test_short_chunks_are_never_merged():
+    records = [rec(0, "https://x/a", "Apply online."), rec(1, "https://x/b", "Apply online.")]
+    canon, _ = dedup(records)
+    assert canon.tolist() == [0, 1]
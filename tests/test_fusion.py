@@ -0,0 +1,61 @@
+import pytest
+
+from rag_llamaindex.fusion import RRF_K, fuse
+
+BM25 = [("a", 12.0), ("b", 7.0), ("c", 1.0)]
+DENSE = [("b", 0.91), ("d", 0.80), ("a", 0.35)]
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(fuse([BM25, DENSE], method="rrf"))
+    assert fused["a"] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 3))
+    assert fused["b"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert fused["d"] == pytest.approx(1 / (RRF_K + 2))
+    assert [k for k, _ in fuse([BM25, DENSE], method="rrf")] == ["b", "a", "d", "c"]
+
+
+def test_minmax_scales_each_list_to_unit_range():
+    fused = dict(fuse([BM25, DENSE], method="minmax"))
+    assert fused["a"] == pytest.approx(1.0 + 0.0)
+    assert fused["b"] == pytest.approx((7 - 1) / (12 - 1) + 1.0)
+    assert fused["c"] == pytest.approx(0.0)  # bottom of BM25, missing from dense
+    assert fused["d"] == pytest.approx((0.80 - 0.35) / (0.91 - 0.35))
+
+
+def test_zscore_missing_keys_get_the_lowest_z():
+    fused = dict(fuse([BM25, DENSE], method="zscore"))
+    dense_z = dict(fuse([DENSE], method="zscore"))
+    bm25_z = dict(fuse([BM25], method="zscore"))
+    assert fused["c"] == pytest.approx(bm25_z["c"] + min(dense_z.values()))
+    assert fused["d"] == pytest.approx(dense_z["d"] + min(bm25_z.values()))
+    assert sum(bm25_z.values()) == pytest.approx(0.0, abs=1e-9)
+
+
+@pytest.mark.parametrize("method", ["rrf", "minmax", "zscore"])
+def test_single_hit(method):
+    fused = fuse([[("a", 3.0)], []], method=method)
+    assert [k for k, _ in fused] == ["a"]
+    assert fused[0][1] == {"rrf": 1 / (RRF_K + 1), "minmax": 1.0, "zscore": 0.0}[method]
+
+
+@pytest.mark.parametrize("method, value", [("minmax", 1.0), ("zscore", 0.0)])
+def test_constant_scores_do_not_divide_by_zero(method, value):
+    fused = fuse([[("a", 0.5), ("b", 0.5), ("c", 0.5)]], method=method)
+    assert [k for k, _ in fused] == ["a", "b", "c"]  # ties keep first-seen order
+    assert [s for _, s in fused] == [value] * 3
+
+
+def test_repeated_key_counts_once_at_its_best_position():
+    fused = dict(fuse([[("a", 5.0), ("b", 4.0), ("a", 1.0)]], method="rrf"))
+    assert fused == pytest.approx({"a": 1 / (RRF_K + 1), "b": 1 / (RRF_K + 2)})
+
+
+def test_weights_scale_each_list():
+    fused = dict(fuse([BM25, DENSE], method="minmax", weights=[0.0, 1.0]))
+    assert fused["b"] == pytest.approx(1.0)
+    assert fused["a"] == pytest.approx(0.0)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError, match="Unknown fusion method"):
+        fuse([BM25], method="borda")
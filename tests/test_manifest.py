@@ -0,0 +1,84 @@
+import zlib
+
+import faiss
+import numpy as np
+
+from rag_llamaindex import build_index, manifest
+from rag_llamaindex.engine import embed_text, node_from_record
+from rag_llamaindex.faiss_index import IndexSpec, build
+
+DIM = 8
+
+
+def vec(text):
+    """Deterministic stand-in for an embedding."""
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return rng.standard_normal(DIM).astype("float32")
+
+
+def test_diff_classifies_chunks():
+    previous = {c: {"hash": h, "vid": i} for i, (c, h) in enumerate([("a", "1"), ("b", "2"), ("c", "3")])}
+    d = manifest.diff(previous, {"a": "1", "b": "2*", "d": "4"})
+    assert (d.added, d.changed, d.removed, d.unchanged) == (["d"], ["b"], ["c"], ["a"])
+    assert d.counts() == {"added": 1, "changed": 1, "removed": 1, "unchanged": 1}
+
+
+def test_content_hash_ignores_last_seen():
+    def record(**meta):
+        return {"text": "Form I-90 replaces a green card.", "metadata": {"chunk_id": "x-0", "url": "u", **meta}}
+
+    def hash_of(rec):
+        return manifest.content_hash(embed_text(node_from_record(rec)))
+
+    assert hash_of(record(last_seen="2026-01-01")) == hash_of(record(last_seen="2026-02-01"))
+    assert hash_of(record(last_seen="2026-01-01")) != hash_of(record(title="Renew"))
+
+
+def test_write_versions_and_prunes(tmp_path):
+    for n in range(4):
+        manifest.write({"next_vid": n}, root=tmp_path, keep=2)
+    latest = manifest.load_latest(tmp_path)
+    assert (latest["version"], latest["previous"], latest["next_vid"]) == (4, 3, 3)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["manifest-00003.json", "manifest-00004.json"]
+
+
+def test_update_faiss_keeps_vids_of_unchanged_chunks(tmp_path, monkeypatch):
+    old = {"a": "alpha", "b": "bravo", "c": "charlie", "d": "delta"}
+    index, _ = build(np.stack([vec(t) for t in old.values()]), IndexSpec(), ids=np.arange(4, dtype="int64"))
+    path = tmp_path / "faiss.index"
+    faiss.write_index(index, str(path))
+    monkeypatch.setattr(build_index, "FAISS_IDX", path)
+    embedded = []
+
+    def embed_texts(texts):
+        embedded.extend(texts)
+        return np.stack([vec(t) for t in texts])
+
+    monkeypatch.setattr(build_index, "embed_texts", embed_texts)
+
+    prev = {
+        "embed_model": build_index._model_name(),
+        "faiss_spec": "flat",
+        "next_vid": 4,
+        "chunks": {c: {"hash": manifest.content_hash(t), "vid": i} for i, (c, t) in enumerate(old.items())},
+    }
+    new = {"a": "alpha", "e": "echo", "b": "bravo v2", "c": "charlie"}  # d removed, b changed, e added
+    ids, texts = list(new), list(new.values())
+    idx, vids, d, next_vid = build_index.update_faiss(
+        prev, ids, [manifest.content_hash(t) for t in texts], texts, "flat"
+    )
+
+    assert (d.added, d.changed, d.removed) == (["e"], ["b"], ["d"])
+    assert embedded == ["echo", "bravo v2"]  # only new / changed text is embedded
+    assert vids == [0, 4, 5, 2]  # a and c keep theirs; e and b get fresh ids in store order
+    assert next_vid == 6
+    assert idx.ntotal == 4
+    for vid, text in zip(vids, texts):
+        assert np.allclose(idx.reconstruct(vid), vec(text))
+
+
+def test_update_faiss_needs_full_build_on_spec_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_index, "FAISS_IDX", tmp_path / "faiss.index")
+    (tmp_path / "faiss.index").write_bytes(b"")
+    prev = {"embed_model": build_index._model_name(), "faiss_spec": "flat", "next_vid": 0, "chunks": {}}
+    assert build_index.update_faiss(prev, [], [], [], "hnsw:hnsw_m=32,ef_construction=200,ef_search=64") is None